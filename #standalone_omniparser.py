@@ -1,198 +1,451 @@
-"""
-Standalone OmniParser Server for UFO2 Integration
-
-This script runs a FastAPI server that provides OmniParser functionality
-without the Gradio UI, making it more efficient and reliable for UFO2 integration.
-"""
-
-import os
-import sys
-import base64
-import io
-from typing import Optional, Dict, Any, List
-import uvicorn
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
-import logging
-from PIL import Image
-import numpy as np
-
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-# Add the omni directory to the path so we can import from it
-omni_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "omni")
-sys.path.append(omni_path)
-
-try:
-    # Import OmniParser utilities
-    from util.utils import check_ocr_box, get_yolo_model, get_caption_model_processor, get_som_labeled_img
-except ImportError:
-    logger.error(f"Failed to import OmniParser utilities from {omni_path}")
-    logger.error("Make sure the OmniParser code is available at ../omni")
-    sys.exit(1)
-
-# Initialize FastAPI app
-app = FastAPI(title="OmniParser API", description="Standalone OmniParser API for UFO2")
-
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Initialize models (will be loaded on first use)
-_MODELS = {
-    'yolo': None,
-    'caption': None
-}
-
-def initialize_models():
-    """Lazy initialization of models"""
-    try:
-        if _MODELS['yolo'] is None:
-            _MODELS['yolo'] = get_yolo_model(model_path=os.path.join(omni_path, 'weights/icon_detect/model.pt'))
-            logger.info("YOLO model loaded successfully")
-        
-        if _MODELS['caption'] is None:
-            _MODELS['caption'] = get_caption_model_processor(
-                model_name="florence2", 
-                model_name_or_path="microsoft/Florence-2-large"
-            )
-            logger.info("Caption model loaded successfully")
-            
-        return True
-    except Exception as e:
-        logger.error(f"Model initialization failed: {e}")
-        return False
-
-class ProcessRequest(BaseModel):
-    """Request model for processing an image"""
-    image_base64: str
-    box_threshold: float = 0.05
-    iou_threshold: float = 0.1
-    use_paddleocr: bool = True
-    imgsz: int = 640
-
-class ProcessResponse(BaseModel):
-    """Response model for processing an image"""
-    processed_image_base64: Optional[str] = None
-    parsed_elements: List[str] = []
-    error: Optional[str] = None
-
-@app.get("/")
-async def root():
-    """Root endpoint to check if the server is running"""
-    return {"status": "OmniParser API is running", "version": "1.0.0"}
-
-@app.post("/process", response_model=ProcessResponse)
-async def process_image(request: ProcessRequest):
-    """Process an image through OmniParser pipeline"""
-    try:
-        # Initialize models if not loaded
-        if not initialize_models():
-            return ProcessResponse(error="Models failed to load")
-        
-        # Decode base64 image
-        try:
-            image_data = base64.b64decode(request.image_base64)
-            image_input = Image.open(io.BytesIO(image_data))
-        except Exception as e:
-            return ProcessResponse(error=f"Invalid image data: {str(e)}")
-        
-        # Calculate dynamic drawing parameters
-        box_overlay_ratio = image_input.size[0] / 3200
-        draw_bbox_config = {
-            'text_scale': 0.8 * box_overlay_ratio,
-            'text_thickness': max(int(2 * box_overlay_ratio), 1),
-            'text_padding': max(int(3 * box_overlay_ratio), 1),
-            'thickness': max(int(3 * box_overlay_ratio), 1),
-        }
-
-        # Run OCR
-        ocr_bbox_rslt, _ = check_ocr_box(
-            image_input,
-            display_img=False,
-            output_bb_format='xyxy',
-            goal_filtering=None,
-            easyocr_args={'paragraph': False, 'text_threshold': 0.9},
-            use_paddleocr=request.use_paddleocr
-        )
-        
-        # Safely unpack OCR results
-        text = ocr_bbox_rslt[0] if ocr_bbox_rslt else []
-        ocr_bbox = ocr_bbox_rslt[1] if ocr_bbox_rslt else []
-        
-        # Process through full pipeline
-        dino_labeled_img, _, parsed_content_list = get_som_labeled_img(
-            image_input,
-            _MODELS['yolo'],
-            BOX_TRESHOLD=request.box_threshold,
-            output_coord_in_ratio=True,
-            ocr_bbox=ocr_bbox,
-            draw_bbox_config=draw_bbox_config,
-            caption_model_processor=_MODELS['caption'],
-            ocr_text=text,
-            iou_threshold=request.iou_threshold,
-            imgsz=request.imgsz
-        )
-        
-        # Format parsed elements
-        parsed_elements = [f'element {i}: {v}' for i, v in enumerate(parsed_content_list)]
-        
-        logger.info("Processing completed successfully")
-        return ProcessResponse(
-            processed_image_base64=dino_labeled_img,
-            parsed_elements=parsed_elements
-        )
-        
-    except Exception as e:
-        logger.error(f"Processing error: {e}", exc_info=True)
-        return ProcessResponse(error=f"Error during processing: {str(e)}")
-
-@app.post("/upload_and_process")
-async def upload_and_process(
-    file: UploadFile = File(...),
-    box_threshold: float = Form(0.05),
-    iou_threshold: float = Form(0.1),
-    use_paddleocr: bool = Form(True),
-    imgsz: int = Form(640)
-):
-    """Process an uploaded image through OmniParser pipeline"""
-    try:
-        # Read the uploaded file
-        image_data = await file.read()
-        image_input = Image.open(io.BytesIO(image_data))
-        
-        # Convert to base64
-        buffered = io.BytesIO()
-        image_input.save(buffered, format="PNG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
-        
-        # Create request object
-        request = ProcessRequest(
-            image_base64=img_base64,
-            box_threshold=box_threshold,
-            iou_threshold=iou_threshold,
-            use_paddleocr=use_paddleocr,
-            imgsz=imgsz
-        )
-        
-        # Process the image
-        return await process_image(request)
-        
-    except Exception as e:
-        logger.error(f"Upload and process error: {e}", exc_info=True)
-        return ProcessResponse(error=f"Error during upload and processing: {str(e)}")
-
-if __name__ == "__main__":
-    # Run the server
-    port = 7860  # Use port 7860 as expected by UFO2
-    logger.info(f"Starting OmniParser API server on port {port}")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+"""
+Standalone OmniParser Server for UFO2 Integration
+
+This script runs a FastAPI server that provides OmniParser functionality
+without the Gradio UI, making it more efficient and reliable for UFO2 integration.
+"""
+
+import os
+import sys
+import asyncio
+import atexit
+import base64
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+import uvicorn
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+import logging
+from PIL import Image
+import numpy as np
+from caption_cache import CaptionCache
+from result_cache import ResultCache, content_key
+from screen_diff import dhash, hamming
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Add the omni directory to the path so we can import from it
+omni_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "omni")
+sys.path.append(omni_path)
+
+try:
+    # Import OmniParser utilities
+    from util.utils import check_ocr_box, get_yolo_model, get_caption_model_processor, get_som_labeled_img
+    import util.utils as omni_utils
+except ImportError:
+    logger.error(f"Failed to import OmniParser utilities from {omni_path}")
+    logger.error("Make sure the OmniParser code is available at ../omni")
+    sys.exit(1)
+
+# Initialize FastAPI app
+app = FastAPI(title="OmniParser API", description="Standalone OmniParser API for UFO2")
+
+# Add CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Initialize models (will be loaded on first use)
+_MODELS = {
+    'yolo': None,
+    'caption': None
+}
+
+def initialize_models():
+    """Lazy initialization of models"""
+    try:
+        if _MODELS['yolo'] is None:
+            _MODELS['yolo'] = get_yolo_model(model_path=os.path.join(omni_path, 'weights/icon_detect/model.pt'))
+            logger.info("YOLO model loaded successfully")
+        
+        if _MODELS['caption'] is None:
+            _MODELS['caption'] = get_caption_model_processor(
+                model_name="florence2", 
+                model_name_or_path="microsoft/Florence-2-large"
+            )
+            logger.info("Caption model loaded successfully")
+            
+        return True
+    except Exception as e:
+        logger.error(f"Model initialization failed: {e}")
+        return False
+
+# Inference queue: the pipeline never runs on the event loop. Requests that
+# arrive within BATCH_WINDOW seconds of each other form one batch: identical
+# images in a batch are parsed once, OCR (CPU) runs on OCR_WORKERS threads, and
+# each image goes on to detection + captioning on the single model thread that
+# owns YOLO/Florence as soon as its OCR is done, so the GPU runs the batch back
+# to back while OCR of the remaining images overlaps with it. Beyond MAX_QUEUE
+# waiting requests the server answers 503 with Retry-After instead of queueing
+# without bound.
+OCR_WORKERS = int(os.environ.get('OMNI_OCR_WORKERS', 1))
+BATCH_WINDOW = float(os.environ.get('OMNI_BATCH_WINDOW', 0.01))
+MAX_BATCH = int(os.environ.get('OMNI_MAX_BATCH', 8))
+MAX_QUEUE = int(os.environ.get('OMNI_MAX_QUEUE', 32))
+RETRY_AFTER = int(os.environ.get('OMNI_RETRY_AFTER', 2))
+
+# Parse cache: results keyed by image bytes + parse parameters, answered before
+# the queue. CACHE_ITEMS=0 turns it off; CACHE_DIR='' keeps it memory-only.
+# PHASH_DISTANCE > 0 also reuses the result of a screen whose 64-bit dHash is
+# within that many bits (same parameters); off by default because a small
+# change such as a clock or a typed character can hide under the threshold.
+CACHE_ITEMS = int(os.environ.get('OMNI_CACHE_ITEMS', 128))
+CACHE_DIR = os.environ.get('OMNI_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'omniparser_cache'))
+CACHE_MAX_BYTES = int(os.environ.get('OMNI_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+PHASH_DISTANCE = int(os.environ.get('OMNI_PHASH_DISTANCE', 0))
+
+# Icon caption cache: get_som_labeled_img captions every detected icon with
+# Florence-2 through util.utils.get_parsed_content_icon. Wrapping that function
+# sends only icons not seen before (by crop pixels, or dHash within
+# CAPTION_PHASH_DISTANCE bits) to the caption model. CAPTION_CACHE_ITEMS=0
+# turns it off; CAPTION_CACHE_PATH='' keeps it memory-only.
+CAPTION_CACHE_ITEMS = int(os.environ.get('OMNI_CAPTION_CACHE_ITEMS', 4096))
+CAPTION_CACHE_PATH = os.environ.get('OMNI_CAPTION_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp', 'omniparser_captions.json'))
+CAPTION_PHASH_DISTANCE = int(os.environ.get('OMNI_CAPTION_PHASH_DISTANCE', 0))
+
+caption_cache = None
+if CAPTION_CACHE_ITEMS:
+    caption_cache = CaptionCache(CAPTION_CACHE_ITEMS, CAPTION_CACHE_PATH or None, CAPTION_PHASH_DISTANCE)
+    omni_utils.get_parsed_content_icon = caption_cache.wrap(omni_utils.get_parsed_content_icon)
+    atexit.register(caption_cache.save)
+
+class QueueFull(Exception):
+    """Too many requests are already waiting for inference"""
+
+def run_ocr(image_data, params):
+    """Stage 1 (OCR thread): decode and run OCR"""
+    image_input = Image.open(io.BytesIO(image_data))
+    image_input.load()
+    ocr_bbox_rslt, _ = check_ocr_box(
+        image_input,
+        display_img=False,
+        output_bb_format='xyxy',
+        goal_filtering=None,
+        easyocr_args={'paragraph': False, 'text_threshold': 0.9},
+        use_paddleocr=params['use_paddleocr']
+    )
+    # Safely unpack OCR results
+    text = ocr_bbox_rslt[0] if ocr_bbox_rslt else []
+    ocr_bbox = ocr_bbox_rslt[1] if ocr_bbox_rslt else []
+    return image_input, text, ocr_bbox
+
+def run_labeling(image_input, text, ocr_bbox, params):
+    """Stage 2 (model thread): YOLO detection and Florence captioning"""
+    # Calculate dynamic drawing parameters
+    box_overlay_ratio = image_input.size[0] / 3200
+    draw_bbox_config = {
+        'text_scale': 0.8 * box_overlay_ratio,
+        'text_thickness': max(int(2 * box_overlay_ratio), 1),
+        'text_padding': max(int(3 * box_overlay_ratio), 1),
+        'thickness': max(int(3 * box_overlay_ratio), 1),
+    }
+    dino_labeled_img, _, parsed_content_list = get_som_labeled_img(
+        image_input,
+        _MODELS['yolo'],
+        BOX_TRESHOLD=params['box_threshold'],
+        output_coord_in_ratio=True,
+        ocr_bbox=ocr_bbox,
+        draw_bbox_config=draw_bbox_config,
+        caption_model_processor=_MODELS['caption'],
+        ocr_text=text,
+        iou_threshold=params['iou_threshold'],
+        imgsz=params['imgsz']
+    )
+    return dino_labeled_img, parsed_content_list
+
+def label(ocr_result, params):
+    """Stage 2 entry point on the model thread; loads the models on first use"""
+    if not initialize_models():
+        raise RuntimeError("Models failed to load")
+    return run_labeling(*ocr_result, params)
+
+class InferenceQueue:
+    """Micro-batching front of the inference executors (see above)"""
+
+    def __init__(self):
+        self.ocr_pool = ThreadPoolExecutor(max_workers=OCR_WORKERS, thread_name_prefix='omni-ocr')
+        self.model_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='omni-model')
+        self._queue = None
+        self.depth = 0
+        self.stats = {'requests': 0, 'batches': 0, 'deduplicated': 0, 'rejected': 0, 'max_batch': 0,
+                      'cache_hits': 0, 'near_hits': 0}
+        self.cache = ResultCache(CACHE_ITEMS, CACHE_DIR or None, CACHE_MAX_BYTES) if CACHE_ITEMS else None
+        self._hashes = OrderedDict()  # cache key -> (params, dHash), newest last
+
+    async def submit(self, image_data, params):
+        """Parse result for one request; raises QueueFull when saturated"""
+        loop = asyncio.get_running_loop()
+        key = content_key(image_data, *sorted(params.items()))
+        screen_hash = None
+        if self.cache:
+            result = await loop.run_in_executor(None, self.cache.get, key, len(image_data))  # Disk tier reads a file
+            if result is not None:
+                self.stats['cache_hits'] += 1
+                return result
+            if PHASH_DISTANCE:
+                screen_hash = await loop.run_in_executor(None, self._dhash, image_data)
+                for near_key in self._near(params, screen_hash):
+                    result = await loop.run_in_executor(None, self.cache.get, near_key, len(image_data))
+                    if result is not None:
+                        self.stats['near_hits'] += 1
+                        return result
+                    self._hashes.pop(near_key, None)  # Evicted from both tiers
+        if self.depth >= MAX_QUEUE:
+            self.stats['rejected'] += 1
+            raise QueueFull(f"{self.depth} requests already waiting")
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            loop.create_task(self._collect())
+        self.stats['requests'] += 1
+        self.depth += 1
+        try:
+            future = loop.create_future()
+            await self._queue.put((key, image_data, params, future))
+            result = await future
+        finally:
+            self.depth -= 1
+        if screen_hash is not None:
+            self._hashes.pop(key, None)
+            self._hashes[key] = (params, screen_hash)
+            while len(self._hashes) > CACHE_ITEMS:
+                self._hashes.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _dhash(image_data):
+        return dhash(Image.open(io.BytesIO(image_data)))
+
+    def _near(self, params, screen_hash):
+        """Keys of earlier screens with the same parameters within PHASH_DISTANCE bits, closest first"""
+        candidates = [(hamming(screen_hash, h), key) for key, (p, h) in self._hashes.items() if p == params]
+        return [key for distance, key in sorted(candidates) if distance <= PHASH_DISTANCE]
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + BATCH_WINDOW
+            while len(batch) < MAX_BATCH:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            self.stats['batches'] += 1
+            self.stats['max_batch'] = max(self.stats['max_batch'], len(batch))
+            loop.create_task(self._run_batch(batch))  # Keep collecting while this batch runs
+
+    async def _run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        groups = {}
+        for key, image_data, params, future in batch:
+            groups.setdefault(key, (key, image_data, params, []))[3].append(future)
+        self.stats['deduplicated'] += len(batch) - len(groups)
+        jobs = list(groups.values())
+
+        results = await asyncio.gather(*(self._parse(key, image_data, params) for key, image_data, params, _ in jobs),
+                                       return_exceptions=True)
+        for result, (_, _, _, futures) in zip(results, jobs):
+            for future in futures:
+                if future.done():
+                    continue  # Client went away
+                if isinstance(result, BaseException):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    async def _parse(self, key, image_data, params):
+        """OCR on the OCR pool, then straight into the model thread's FIFO"""
+        loop = asyncio.get_running_loop()
+        ocr_result = await loop.run_in_executor(self.ocr_pool, run_ocr, image_data, params)
+        result = await loop.run_in_executor(self.model_pool, label, ocr_result, params)
+        if self.cache:
+            await loop.run_in_executor(None, self.cache.put, key, list(result))  # The disk tier writes a file
+        return result
+
+inference_queue = InferenceQueue()
+
+class ProcessRequest(BaseModel):
+    """Request model for processing an image"""
+    image_base64: str
+    box_threshold: float = 0.05
+    iou_threshold: float = 0.1
+    use_paddleocr: bool = True
+    imgsz: int = 640
+    render: bool = True  # False leaves the annotated image out of the response
+
+class ParsedElement(BaseModel):
+    """One detected element; bbox is [x1, y1, x2, y2] as fractions of the image size"""
+    type: Optional[str] = None
+    bbox: Optional[List[float]] = None
+    text: str = ''
+    interactivity: bool = False
+
+class ProcessResponse(BaseModel):
+    """Response model for processing an image"""
+    processed_image_base64: Optional[str] = None
+    parsed_elements: List[str] = []
+    elements: List[ParsedElement] = []
+    error: Optional[str] = None
+
+def structure_elements(parsed_content_list):
+    """ParsedElement dicts from OmniParser output (dicts in v2, plain strings in v1)"""
+    elements = []
+    for item in parsed_content_list:
+        if isinstance(item, dict):
+            bbox = item.get('bbox')
+            elements.append({
+                'type': item.get('type'),
+                'bbox': [float(v) for v in bbox] if bbox is not None else None,
+                'text': str(item.get('content') or ''),
+                'interactivity': bool(item.get('interactivity', False))
+            })
+        else:
+            elements.append({'type': None, 'bbox': None, 'text': str(item), 'interactivity': False})
+    return elements
+
+def busy_response(error):
+    return JSONResponse(
+        status_code=503,
+        headers={'Retry-After': str(RETRY_AFTER)},
+        content={'error': f"Server busy: {error}"}
+    )
+
+async def parse_and_respond(image_data, params, render):
+    """Shared tail of /process and /upload_and_process"""
+    try:
+        dino_labeled_img, parsed_content_list = await inference_queue.submit(image_data, params)
+    except QueueFull as e:
+        return busy_response(e)
+
+    # Format parsed elements
+    parsed_elements = [f'element {i}: {v}' for i, v in enumerate(parsed_content_list)]
+
+    logger.info("Processing completed successfully")
+    return ProcessResponse(
+        processed_image_base64=dino_labeled_img if render else None,
+        parsed_elements=parsed_elements,
+        elements=structure_elements(parsed_content_list)
+    )
+
+@app.get("/")
+async def root():
+    """Root endpoint to check if the server is running"""
+    return {
+        "status": "OmniParser API is running",
+        "version": "1.0.0",
+        "queue": {**inference_queue.stats, "depth": inference_queue.depth, "max_queue": MAX_QUEUE},
+        "cache": inference_queue.cache.stats() if inference_queue.cache else None,
+        "caption_cache": caption_cache.stats() if caption_cache else None
+    }
+
+@app.post("/process", response_model=ProcessResponse)
+async def process_image(request: ProcessRequest):
+    """Process an image through OmniParser pipeline"""
+    try:
+        # Decode base64 image
+        try:
+            image_data = base64.b64decode(request.image_base64)
+        except Exception as e:
+            return ProcessResponse(error=f"Invalid image data: {str(e)}")
+
+        params = {
+            'box_threshold': request.box_threshold,
+            'iou_threshold': request.iou_threshold,
+            'use_paddleocr': request.use_paddleocr,
+            'imgsz': request.imgsz
+        }
+        return await parse_and_respond(image_data, params, request.render)
+        
+    except Exception as e:
+        logger.error(f"Processing error: {e}", exc_info=True)
+        return ProcessResponse(error=f"Error during processing: {str(e)}")
+
+@app.post("/upload_and_process")
+async def upload_and_process(
+    file: UploadFile = File(...),
+    box_threshold: float = Form(0.05),
+    iou_threshold: float = Form(0.1),
+    use_paddleocr: bool = Form(True),
+    imgsz: int = Form(640),
+    render: bool = Form(True)
+):
+    """Process an uploaded image through OmniParser pipeline"""
+    try:
+        # The uploaded bytes go straight to the pipeline, which decodes them once
+        image_data = await file.read()
+        params = {
+            'box_threshold': box_threshold,
+            'iou_threshold': iou_threshold,
+            'use_paddleocr': use_paddleocr,
+            'imgsz': imgsz
+        }
+        return await parse_and_respond(image_data, params, render)
+        
+    except Exception as e:
+        logger.error(f"Upload processing error: {e}", exc_info=True)
+        return ProcessResponse(error=f"Error during upload processing: {str(e)}")
+
+@app.post("/process_raw")
+async def process_raw(
+    request: Request,
+    box_threshold: float = 0.05,
+    iou_threshold: float = 0.1,
+    use_paddleocr: bool = True,
+    imgsz: int = 640,
+    render: bool = False,
+    format: str = 'json'
+):
+    """Lean path: encoded image bytes (PNG/JPEG/...) as the request body, parameters
+    in the query string. Returns {"elements": [...], "image": ...}; the annotated
+    image is only included with render=true. format=msgpack (or Accept:
+    application/x-msgpack) answers in msgpack with the image as raw PNG bytes."""
+    image_data = await request.body()
+    if not image_data:
+        return JSONResponse(status_code=400, content={'error': 'Request body must contain the image bytes'})
+    params = {
+        'box_threshold': box_threshold,
+        'iou_threshold': iou_threshold,
+        'use_paddleocr': use_paddleocr,
+        'imgsz': imgsz
+    }
+    as_msgpack = format == 'msgpack' or 'application/x-msgpack' in request.headers.get('accept', '')
+    if as_msgpack:
+        try:
+            import msgpack  # Optional dependency
+        except ImportError:
+            return JSONResponse(status_code=406, content={'error': 'msgpack is not installed on the server'})
+    try:
+        dino_labeled_img, parsed_content_list = await inference_queue.submit(image_data, params)
+    except QueueFull as e:
+        return busy_response(e)
+    except Exception as e:
+        logger.error(f"Raw processing error: {e}", exc_info=True)
+        return JSONResponse(status_code=500, content={'error': f"Error during processing: {str(e)}"})
+
+    payload = {'elements': structure_elements(parsed_content_list)}
+    if as_msgpack:
+        if render:
+            payload['image'] = base64.b64decode(dino_labeled_img)
+        return Response(content=msgpack.packb(payload, use_bin_type=True), media_type='application/x-msgpack')
+    if render:
+        payload['image'] = dino_labeled_img
+    return JSONResponse(content=payload)
+
+if __name__ == "__main__":
+    # Run the server
+    port = 7860  # Use port 7860 as expected by UFO2
+    logger.info(f"Starting OmniParser API server on port {port}")
+    uvicorn.run(app, host="0.0.0.0", port=port)
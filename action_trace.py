@@ -0,0 +1,158 @@
+# Eva Action Trace - record the UI actions of a successful UFO2 step and replay them
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from config import PIPELINE, TRACES, UFO_WORKERS
+from screen_diff import dhash, hamming
+
+SELECTED_MARKER = "Selected item🕹️:"
+ACTION_MARKER = "Action applied⚒️:"
+
+# UFO2 actions that are pywinauto calls on the selected control (or plain
+# mouse/keyboard input), so they can run again without any planning
+REPLAYABLE = {'click_input', 'click_on_coordinates', 'drag_on_coordinates', 'set_edit_text',
+              'keyboard_input', 'type_keys', 'wheel_mouse_input'}
+# Actions that do not touch the UI
+NO_OP = {'', 'texts', 'summary', 'annotation', 'no_action'}
+
+
+def fingerprint(image):
+    """256-bit dHash of a screenshot as hex"""
+    return f'{dhash(image, hash_size=16):064x}'
+
+def fingerprint_distance(a, b):
+    return hamming(int(a, 16), int(b, 16))
+
+
+def parse_action(text):
+    """{'action', 'args', 'kwargs'} from UFO2's `name(arg=value, ...)`, or None"""
+    if not text:
+        return {'action': '', 'args': [], 'kwargs': {}}
+    try:
+        call = ast.parse(text, mode='eval').body
+        if isinstance(call, ast.Name):
+            return {'action': call.id, 'args': [], 'kwargs': {}}
+        if not isinstance(call, ast.Call) or not isinstance(call.func, ast.Name):
+            return None
+        return {
+            'action': call.func.id,
+            'args': [ast.literal_eval(arg) for arg in call.args],
+            'kwargs': {kw.arg: ast.literal_eval(kw.value) for kw in call.keywords}
+        }
+    except (SyntaxError, ValueError):
+        return None
+
+
+def extract_actions(output):
+    """The concrete actions of one step from its UFO2 output, or None if any of
+    them cannot be replayed (the step then always goes through planning)"""
+    actions, control = [], None
+    for line in output.split('\n'):
+        if SELECTED_MARKER in line:
+            item = line.split(SELECTED_MARKER)[-1].strip()
+            control = item.rsplit(', Label:', 1)[0].strip() or None
+        elif ACTION_MARKER in line:
+            call = parse_action(line.split(ACTION_MARKER)[-1].strip())
+            if call is None:
+                return None
+            if call['action'] in NO_OP:
+                control = None
+                continue
+            if call['action'] not in REPLAYABLE:
+                return None
+            actions.append({**call, 'control': control})
+            control = None
+    return actions
+
+
+class TraceStore:
+    """Recorded traces, one per (project, instruction), in one JSON file.
+
+    A trace holds the actions and the fingerprints of the screen before and
+    after the step. It is dropped after max_failures replays in a row that did
+    not reach the recorded after-screen, and replaced whenever the step is
+    recorded again.
+    """
+
+    def __init__(self, path='action_traces.json', max_failures=2):
+        self.path = path
+        self.max_failures = max_failures
+        self._lock = threading.Lock()
+        self._traces = {}
+        self.replays = 0
+        self.fallbacks = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._traces = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @staticmethod
+    def key(project, instruction):
+        return hashlib.sha256(f'{project}\x00{instruction}'.encode('utf-8')).hexdigest()
+
+    def get(self, project, instruction):
+        with self._lock:
+            trace = self._traces.get(self.key(project, instruction))
+            return dict(trace) if trace else None
+
+    def record(self, project, instruction, before, after, actions):
+        with self._lock:
+            self._traces[self.key(project, instruction)] = {
+                'project': project, 'instruction': instruction, 'before': before, 'after': after,
+                'actions': actions, 'recorded_at': time.time(), 'replays': 0, 'failures': 0
+            }
+            self._save()
+
+    def replayed(self, project, instruction, ok):
+        """Count a replay; a trace that keeps failing is dropped"""
+        key = self.key(project, instruction)
+        with self._lock:
+            trace = self._traces.get(key)
+            if ok:
+                self.replays += 1
+            else:
+                self.fallbacks += 1
+            if trace is None:
+                return
+            if ok:
+                trace['replays'] += 1
+                trace['failures'] = 0
+            else:
+                trace['failures'] += 1
+                if trace['failures'] >= self.max_failures:
+                    del self._traces[key]
+            self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.traces-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(self._traces, f, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {'traces': len(self._traces), 'replays': self.replays, 'fallbacks': self.fallbacks}
+
+
+def from_config(logger=None):
+    """Trace store for TRACES["mode"] "record" or "replay", or None when off"""
+    if TRACES.get('mode', 'off') == 'off':
+        return None
+    if logger and TRACES['mode'] == 'replay' and not UFO_WORKERS.get('enabled') and not PIPELINE.get('standby_worker'):
+        # Replay drives a resident interpreter (ufo_messenger.prepare); with a one-shot
+        # `python -m ufo` per step there is none, so every step would be planned
+        logger('TRACES_WARNING', 'TRACES["mode"] is "replay" but neither UFO_WORKERS["enabled"] nor '
+                                 'PIPELINE["standby_worker"] is set: traces are recorded, never replayed')
+    return TraceStore(TRACES['path'], TRACES['max_failures'])
@@ -0,0 +1,192 @@
+# Eva - ASGI Serving Mode
+#
+# Serves the long-lived SSE endpoints (/api/chat_stream, /api/runs/<id>/resume,
+# /api/analyze_document, /api/prompt_logs/stream) on an asyncio event loop so
+# an open stream costs a coroutine instead of an OS thread. Everything else is handed to the existing
+# Flask app unchanged.
+#
+#   python asgi_app.py            (or: uvicorn asgi_app:app --port 5000)
+#
+# On Windows keep a single process without --reload/--workers: uvicorn then
+# uses the Proactor loop, the only one that can spawn UFO2 subprocesses.
+import threading
+import uvicorn
+from a2wsgi import WSGIMiddleware
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
+from config import ASGI
+from session_pool import SessionLimitError, valid_session_id
+import main
+import metrics
+
+app = FastAPI(title="Eva", docs_url=None, redoc_url=None, openapi_url=None)
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'X-Accel-Buffering': 'no',  # Disable Nginx buffering
+    'Connection': 'keep-alive'
+}
+
+def request_session(request, data=None, create=True, hold=False):
+    """asyncio twin of main.request_session"""
+    session_id = request.headers.get('x-session-id') or request.query_params.get('session_id') or (data or {}).get('session_id')
+    if not valid_session_id(session_id):
+        return None, JSONResponse({'error': 'Invalid session id'}, status_code=400)
+    try:
+        return main.session_pool.get(session_id, create=create, hold=hold), None
+    except SessionLimitError as e:
+        return None, JSONResponse({'error': str(e)}, status_code=503)
+
+def release_on_close(session):
+    """Background task that releases a held session once the response is done"""
+    return BackgroundTask(main.session_pool.release, session)
+
+@app.post('/api/chat_stream')
+async def chat_stream(request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    if not data:
+        return JSONResponse({'error': 'Invalid data'}, status_code=400)
+    message = data.get('message', '')
+    project = data.get('project')
+    chat_history = data.get('chat_history', [])
+
+    if not message:
+        return JSONResponse({'error': 'No message'}, status_code=400)
+
+    session, error = request_session(request, data, hold=True)
+    if error:
+        return error
+    main.clear_prompt_logs(session)
+
+    stream = metrics.StreamMeter('chat_stream')
+
+    async def generate():
+        with stream:
+            try:
+                session.prompt_log.log('USER_MESSAGE', message, {'project': project.get('name') if project else 'None', 'trace_id': stream.trace_id})
+                async for response_chunk in session.engine.process_streaming_async(message, project, chat_history):
+                    yield stream.event(response_chunk)
+            except Exception as e:
+                session.prompt_log.log('ERROR', str(e))
+                yield stream.event({'type': 'error', 'content': str(e)})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={**SSE_HEADERS, 'X-Trace-Id': stream.trace_id},
+                             background=release_on_close(session))
+
+@app.post('/api/runs/{run_id}/resume')
+async def resume_run(run_id: str, request: Request):
+    try:
+        data = await request.json()
+    except ValueError:
+        data = None
+    data = data if isinstance(data, dict) else {}
+    from_step = data.get('from_step')
+    invalid = main.resume_error(run_id, from_step)
+    if invalid:
+        return JSONResponse({'error': invalid[0]}, status_code=invalid[1])
+
+    session, error = request_session(request, data, hold=True)
+    if error:
+        return error
+    main.clear_prompt_logs(session)
+
+    stream = metrics.StreamMeter('resume')
+
+    async def generate():
+        with stream:
+            try:
+                session.prompt_log.log('USER_MESSAGE', f'Resume run {run_id}', {'from_step': from_step, 'trace_id': stream.trace_id})
+                async for response_chunk in session.engine.resume_streaming_async(run_id, from_step):
+                    yield stream.event(response_chunk)
+            except Exception as e:
+                session.prompt_log.log('ERROR', str(e))
+                yield stream.event({'type': 'error', 'content': str(e)})
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={**SSE_HEADERS, 'X-Trace-Id': stream.trace_id},
+                             background=release_on_close(session))
+
+@app.post('/api/analyze_document')
+async def analyze_document(request: Request):
+    try:
+        data = await request.json()
+        message = data.get('message', '')
+        file_data = data.get('file')
+        system_prompt = data.get('systemPrompt', '')
+
+        if not file_data:
+            return JSONResponse({'error': 'No file data provided'}, status_code=400)
+
+        session, error = request_session(request, data, hold=True)
+        if error:
+            return error
+
+        stream = metrics.StreamMeter('analyze_document')
+
+        async def generate():
+            cancelled = threading.Event()
+            with stream:
+                try:
+                    # The Gemini stream blocks, so each step of the generator runs on the threadpool
+                    updates = session.engine.analyze_document_streaming(message, file_data, system_prompt, cancelled)
+                    async for update in iterate_in_threadpool(updates):
+                        yield stream.event(update)
+
+                    yield stream.raw("data: [DONE]\n\n")
+
+                except Exception as e:
+                    yield stream.event({'type': 'error', 'content': str(e)})
+                finally:
+                    cancelled.set()  # Client disconnected: stop generating at the next chunk
+
+        return StreamingResponse(
+            generate(),
+            media_type='text/event-stream',
+            headers={
+                **SSE_HEADERS,
+                'X-Trace-Id': stream.trace_id,
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST',
+                'Access-Control-Allow-Headers': 'Content-Type'
+            },
+            background=release_on_close(session)
+        )
+
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+@app.get('/api/prompt_logs/stream')
+async def stream_prompt_logs(request: Request):
+    # Live tail without parking a thread per open debug panel
+    try:
+        since = int(request.headers.get('last-event-id') or request.query_params.get('since', 0))
+    except ValueError:
+        since = 0
+
+    session, error = request_session(request, create=False)
+    if error:
+        return error
+    if session is None:
+        return Response(main.NO_SESSION_STREAM, media_type='text/event-stream')
+
+    stream = metrics.StreamMeter('prompt_logs')
+
+    async def generate():
+        with stream:
+            async for entries in session.prompt_log.tail_async(since):
+                if not entries:
+                    yield ": keepalive\n\n"  # SSE comment, not an event
+                for entry in entries:
+                    yield stream.event(entry, id=entry['seq'])
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={**SSE_HEADERS, 'X-Trace-Id': stream.trace_id})
+
+# Everything else (index, projects, prompts, log polling) stays on the Flask app
+app.mount('/', WSGIMiddleware(main.app))
+
+if __name__ == '__main__':
+    uvicorn.run(app, host=ASGI['host'], port=ASGI['port'], limit_concurrency=ASGI['limit_concurrency'])
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Icon caption cache on a repeated-screen sequence, with a stub caption model
+
+Builds --screens 1920x1080 screens that share --fixed toolbar/taskbar icons
+and each add --changing icons of their own; every third screen also
+highlights one toolbar icon (hover), which changes its pixels but not its
+dHash. A stub shaped like util.utils.get_parsed_content_icon costs
+--call-ms per invocation plus --icon-ms per icon, and a stub detection stage
+costs --detect-ms per screen.
+
+Runs the sequence without the cache, with a fresh cache, and with the cache
+reloaded from disk (a server restart), reporting caption-model invocations,
+icons captioned, and mean latency per screen.
+
+    python benchmarks/bench_caption_cache.py --screens 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from caption_cache import CaptionCache
+
+WIDTH, HEIGHT, ICON = 1920, 1080, 32
+
+
+class StubCaptionModel:
+    def __init__(self, call_ms, icon_ms):
+        self.call_ms, self.icon_ms = call_ms, icon_ms
+        self.calls = self.icons = 0
+
+    def __call__(self, filtered_boxes, starting_idx, image_source, caption_model_processor, prompt=None, batch_size=128):
+        boxes = filtered_boxes[starting_idx:] if starting_idx else filtered_boxes
+        self.calls += 1
+        self.icons += len(boxes)
+        time.sleep((self.call_ms + self.icon_ms * len(boxes)) / 1000)
+        return [f'icon {int(box[0] * WIDTH)},{int(box[1] * HEIGHT)}' for box in boxes]
+
+
+def icon(rng):
+    return rng.integers(0, 256, (ICON, ICON, 3), dtype=np.uint8)
+
+
+def screens(count, fixed, changing, seed=1):
+    rng = np.random.default_rng(seed)
+    toolbar = [((40 + i * 48) % (WIDTH - ICON), 8 if i < 38 else HEIGHT - 40, icon(rng)) for i in range(fixed)]
+    sequence = []
+    for n in range(count):
+        image = np.full((HEIGHT, WIDTH, 3), 240, dtype=np.uint8)
+        placed = list(toolbar)
+        if n % 3 == 2:  # Hover highlight on one toolbar icon: new pixels, same shape
+            x, y, pixels = placed[n % fixed]
+            placed[n % fixed] = (x, y, np.clip(pixels.astype(np.int16) + 12, 0, 255).astype(np.uint8))
+        for i in range(changing):
+            placed.append((rng.integers(0, WIDTH - ICON), rng.integers(60, HEIGHT - 80), icon(rng)))
+        boxes = []
+        for x, y, pixels in placed:
+            image[y:y + ICON, x:x + ICON] = pixels
+            boxes.append([x / WIDTH, y / HEIGHT, (x + ICON) / WIDTH, (y + ICON) / HEIGHT])
+        sequence.append((image, boxes))
+    return sequence
+
+
+def run(label, sequence, captioner, model, detect_ms):
+    latencies, outputs = [], []
+    for image, boxes in sequence:
+        started = time.perf_counter()
+        time.sleep(detect_ms / 1000)  # YOLO + OCR stand-in
+        outputs.append(captioner(boxes, 0, image, {'model': None, 'processor': None}))
+        latencies.append((time.perf_counter() - started) * 1000)
+    print(f"{label:14s} model calls={model.calls:3d} icons captioned={model.icons:5d} "
+          f"mean latency={statistics.mean(latencies):7.1f}ms (first {latencies[0]:6.1f}ms, "
+          f"rest {statistics.mean(latencies[1:]):6.1f}ms)")
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--screens', type=int, default=30)
+    parser.add_argument('--fixed', type=int, default=60, help='Icons on every screen')
+    parser.add_argument('--changing', type=int, default=8, help='New icons per screen')
+    parser.add_argument('--detect-ms', type=float, default=80)
+    parser.add_argument('--call-ms', type=float, default=40)
+    parser.add_argument('--icon-ms', type=float, default=6)
+    parser.add_argument('--phash-distance', type=int, default=0)
+    args = parser.parse_args()
+
+    sequence = screens(args.screens, args.fixed, args.changing)
+    print(f"{args.screens} screens, {args.fixed} shared + {args.changing} new icons each")
+
+    model = StubCaptionModel(args.call_ms, args.icon_ms)
+    baseline = run('no cache', sequence, model, model, args.detect_ms)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='eva_captions_'), 'captions.json')
+    cache = CaptionCache(path=path, phash_distance=args.phash_distance)
+    model = StubCaptionModel(args.call_ms, args.icon_ms)
+    cached = run('cache', sequence, cache.wrap(model), model, args.detect_ms)
+    print(f"               {cache.stats()}")
+    cache.save()
+
+    restarted = CaptionCache(path=path, phash_distance=args.phash_distance)
+    model = StubCaptionModel(args.call_ms, args.icon_ms)
+    run('after restart', sequence, restarted.wrap(model), model, args.detect_ms)
+
+    same = sum(a == b for a, b in zip(baseline, cached))
+    print(f"captions identical to uncached run on {same}/{len(sequence)} screens "
+          f"(hovered icons reuse the plain icon's caption)")
+
+
+if __name__ == '__main__':
+    main()
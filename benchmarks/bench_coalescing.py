@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Per-line SSE frames vs CoalescingWriter
+
+Replays a synthetic UFO2 step (many short lines arriving in bursts) through the
+old per-line path (one dict + json.dumps per line, `+=` accumulation) and through
+CoalescingWriter, and reports frames, bytes and CPU time for each.
+
+    python benchmarks/bench_coalescing.py --lines 200000 --line-bytes 120
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from stream_writer import CoalescingWriter
+
+
+class FakeClock:
+    """Advances a fixed amount per line so both paths see the same arrival times"""
+
+    def __init__(self, step):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        return self.now
+
+
+def per_line(lines):
+    full_output = ""
+    frames = 0
+    sent = 0
+    for line in lines:
+        sent += len(f"data: {json.dumps({'type': 'ufo_output', 'content': line})}\n\n")
+        frames += 1
+        full_output += line
+    return frames, sent, len(full_output)
+
+
+def coalesced(lines, clock, flush_interval, flush_bytes):
+    writer = CoalescingWriter(flush_interval, flush_bytes, clock=clock)
+    sent = 0
+    for line in lines:
+        clock.now += clock.step
+        frame = writer.write(line)
+        if frame:
+            sent += len(f"data: {json.dumps({'type': 'ufo_output', 'content': frame})}\n\n")
+    frame = writer.flush()
+    if frame:
+        sent += len(f"data: {json.dumps({'type': 'ufo_output', 'content': frame})}\n\n")
+    return writer.frames, sent, len(writer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--line-bytes', type=int, default=120)
+    parser.add_argument('--line-gap-ms', type=float, default=1.0, help='Simulated time between lines')
+    parser.add_argument('--flush-interval', type=float, default=0.05)
+    parser.add_argument('--flush-bytes', type=int, default=8192)
+    args = parser.parse_args()
+
+    lines = [f"Round {i}: ".ljust(args.line_bytes - 1, '.') + "\n" for i in range(args.lines)]
+
+    started = time.process_time()
+    frames, sent, total = per_line(lines)
+    old_cpu = time.process_time() - started
+    print(f"per-line   frames={frames:8d} sse_bytes={sent:11d} output={total:11d} cpu={old_cpu:.3f}s")
+
+    started = time.process_time()
+    frames, sent, total = coalesced(lines, FakeClock(args.line_gap_ms / 1000), args.flush_interval, args.flush_bytes)
+    new_cpu = time.process_time() - started
+    print(f"coalesced  frames={frames:8d} sse_bytes={sent:11d} output={total:11d} cpu={new_cpu:.3f}s")
+    print(f"speedup    {old_cpu / new_cpu:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
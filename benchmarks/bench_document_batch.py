@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Batch document analysis: wall-clock time vs pool size for a multi-page document
+
+Builds a multi-page TIFF (50 pages by default), then runs
+ChatEngine.analyze_batch_streaming against the offline fake model once per pool
+size. Reports total time, speedup over one worker, time to the first page
+result, and how many results arrived out of page order.
+
+    python benchmarks/bench_document_batch.py --pages 50 --workers 1 2 4 8 16
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+config.SCREENSHOT['backend'] = 'fake'
+
+from PIL import Image, ImageDraw
+from chat_engine import ChatEngine
+from fake_model import FakeModel
+
+
+def multipage_tiff(pages):
+    frames = []
+    for i in range(pages):
+        page = Image.new('L', (1275, 1650), 255)  # Letter size at 150 dpi
+        ImageDraw.Draw(page).text((100, 100), f'Page {i + 1}', fill=0)
+        frames.append(page)
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format='TIFF', save_all=True, append_images=frames[1:], compression='tiff_deflate')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--ttft', type=float, default=0.3, help='Fake model seconds to first token')
+    parser.add_argument('--tokens', type=int, default=60, help='Fake model output tokens per page')
+    args = parser.parse_args()
+
+    document = multipage_tiff(args.pages)
+    engine = ChatEngine(model=FakeModel(ttft=args.ttft, tokens=args.tokens))  # Bare model: no quota limits
+    print(f"{args.pages}-page TIFF, {len(document) / 1e6:.1f} MB, "
+          f"~{args.ttft + args.tokens / engine.model.tokens_per_sec:.2f}s per page")
+
+    baseline = None
+    for workers in args.workers:
+        config.BATCH['workers'] = workers
+        started = time.perf_counter()
+        first, order, result = None, [], None
+        for event in engine.analyze_batch_streaming('bench', [('doc.tiff', io.BytesIO(document))], 'Extract the text'):
+            if event['type'] == 'page_result':
+                first = first or time.perf_counter() - started
+                order.append(event['page'])
+            elif event['type'] == 'batch_result':
+                result = event
+        elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        out_of_order = sum(1 for a, b in zip(order, order[1:]) if b < a)
+        print(f"workers={workers:3d} total={elapsed:6.2f}s speedup={baseline / elapsed:5.1f}x "
+              f"first page={first:5.2f}s out-of-order={out_of_order:3d} pages={result['pages']} errors={len(result['errors'])}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Document analysis: time until the client sees text, blocking vs streamed
+
+Runs analyze_document_streaming against the offline fake model and compares
+when the first text (message_chunk event) reaches the client with the old
+behaviour (one blocking generate_content call, a single message at the end).
+Then closes a stream after its first text, as a client disconnect does, and
+exits non-zero unless generation was recorded as cancelled.
+
+    python benchmarks/bench_document_stream.py --tokens 2000 --tokens-per-sec 150
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+config.SCREENSHOT['backend'] = 'fake'
+
+from PIL import Image
+from chat_engine import ChatEngine
+from fake_model import FakeModel
+
+
+def document():
+    buffer = io.BytesIO()
+    Image.new('RGB', (850, 1100), (255, 255, 255)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tokens', type=int, default=1000)
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0)
+    parser.add_argument('--ttft', type=float, default=0.4)
+    args = parser.parse_args()
+
+    model = FakeModel(tokens=args.tokens, tokens_per_sec=args.tokens_per_sec, ttft=args.ttft)
+    engine = ChatEngine(model=model)
+    file_data = document()
+
+    started = time.perf_counter()
+    model.generate_content(['prompt', None])
+    blocking = time.perf_counter() - started
+    print(f"blocking call:  first text after {blocking * 1000:7.0f}ms (= whole generation)")
+
+    started = time.perf_counter()
+    first = None
+    for event in engine.analyze_document_streaming('bench', file_data, 'Extract the text'):
+        if first is None and event['type'] == 'message_chunk':
+            first = time.perf_counter() - started
+    stats = engine.last_generation_stats
+    print(f"streamed:       first text after {first * 1000:7.0f}ms, done after {stats['total_ms']}ms, "
+          f"{stats['tokens_per_sec']} tok/s")
+
+    engine.last_generation_stats = None
+    started = time.perf_counter()
+    updates = engine.analyze_document_streaming('bench', file_data, 'Extract the text')
+    for event in updates:
+        if event['type'] == 'message_chunk':
+            break
+    updates.close()  # What a client disconnect does to the generator
+    stats = engine.last_generation_stats
+    print(f"closed early:   generation stopped after {(time.perf_counter() - started) * 1000:7.0f}ms, "
+          f"cancelled={stats and stats['cancelled']}")
+    if not stats or not stats['cancelled']:
+        sys.exit('closing the stream did not cancel generation')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+Gemini client under bursty load: quota, injected 429/500s, and duplicate requests
+
+A fake endpoint (fake_model.FakeModel) enforces a quota of --quota requests
+per second, rejecting the excess with 429, and fails --fail-500 of calls with
+500. A burst of --requests calls from --threads threads is sent three ways:
+
+  bare        straight to the model, no retries
+  naive       immediate retries (up to 4) with no limiter: the error storm
+  client      through GeminiClient (token bucket at the quota, jittered backoff)
+
+Then --duplicates identical requests are fired at once to show single-flight.
+
+Last, a scripted fake transport checks the client's guarantees and the script
+exits non-zero if any fails (--checks-only runs just these):
+
+  retries      429/500s are retried and the call succeeds within max_retries;
+               one more failure than max_retries surfaces the error
+  deadline     no call runs past its deadline, retrying or waiting for quota
+  rpm / tpm    calls and estimated tokens per second stay within the limits
+  single-flight identical concurrent requests make one model call
+
+    python benchmarks/bench_gemini_client.py --quota 20 --requests 200
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_model import FakeAPIError, FakeModel, FakeResponse
+from gemini_client import DeadlineExceeded, GeminiClient, retryable
+
+
+class ScriptedModel:
+    """Fake transport: call n raises script[n] if it is an HTTP status, else
+    answers (after `latency` seconds). Records when each call arrived."""
+
+    def __init__(self, script=(), latency=0.0):
+        self.script = list(script)
+        self.latency = latency
+        self.arrivals = []
+        self._lock = threading.Lock()
+
+    @property
+    def calls(self):
+        return len(self.arrivals)
+
+    def generate_content(self, parts, request_options=None, **kwargs):
+        with self._lock:
+            n = len(self.arrivals)
+            self.arrivals.append(time.monotonic())
+        time.sleep(self.latency)
+        if n < len(self.script) and isinstance(self.script[n], int):
+            raise FakeAPIError(self.script[n], 'scripted failure')
+        return FakeResponse(f'reply {n}')
+
+
+def busiest_second(times):
+    """Most events inside any one-second window"""
+    return max(sum(1 for t in times if start <= t < start + 1.0) for start in times)
+
+
+def naive(model, parts):
+    for attempt in range(5):
+        try:
+            return model.generate_content(parts)
+        except Exception as e:
+            if attempt == 4 or not retryable(e):
+                raise
+
+
+def burst(label, call, model, requests, threads, quota):
+    ok = failed = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal ok, failed
+        try:
+            call([f'request {i}'])
+            result = 1
+        except Exception:
+            result = 0
+        with lock:
+            ok += result
+            failed += 1 - result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    print(f"{label:7s} ok={ok:4d} failed={failed:4d} endpoint calls={model.calls:5d} rejected={model.rejected:5d} "
+          f"elapsed={elapsed:5.1f}s ok/s={ok / elapsed:5.1f} (quota {quota}/s)")
+
+
+def check_retries():
+    errors = []
+    model = ScriptedModel([429, 500, 503])
+    client = GeminiClient(model, rpm=6000, max_retries=3, base_delay=0.01, max_delay=0.05, burst=5.0)
+    try:
+        client.generate_content(['retry me'])
+    except Exception as e:
+        errors.append(f'retries: 3 failures with max_retries=3 raised {e!r}')
+    if model.calls != 4 or client.stats['retries'] != 3:
+        errors.append(f"retries: expected 4 model calls / 3 retries, got {model.calls} / {client.stats['retries']}")
+
+    model = ScriptedModel([429, 429, 429])
+    client = GeminiClient(model, rpm=6000, max_retries=2, base_delay=0.01, max_delay=0.05, burst=5.0)
+    try:
+        client.generate_content(['give up'])
+        errors.append('retries: 3 failures with max_retries=2 did not raise')
+    except FakeAPIError as e:
+        if e.code != 429 or model.calls != 3:
+            errors.append(f'retries: expected the 429 after 3 calls, got {e!r} after {model.calls}')
+    return errors
+
+
+def check_deadline():
+    errors = []
+    # Failing for good: retries stop at the deadline, not at max_retries
+    model = ScriptedModel([500] * 1000, latency=0.05)
+    client = GeminiClient(model, rpm=60000, max_retries=1000, base_delay=0.05, max_delay=0.1, deadline=0.5, burst=5.0)
+    started = time.monotonic()
+    try:
+        client.generate_content(['never works'])
+        errors.append('deadline: a call that always fails returned')
+    except Exception:
+        pass
+    elapsed = time.monotonic() - started
+    if elapsed > 0.5 + 0.15:
+        errors.append(f'deadline: gave up after {elapsed:.2f}s, deadline 0.5s')
+
+    # Waiting for quota past the deadline raises DeadlineExceeded straight away
+    client = GeminiClient(ScriptedModel(), rpm=60, deadline=0.2, burst=0)  # One request per second
+    client.generate_content(['first'])
+    started = time.monotonic()
+    try:
+        client.generate_content(['second'])
+        errors.append('deadline: a call that had to wait 1s for quota ran with a 0.2s deadline')
+    except DeadlineExceeded:
+        if time.monotonic() - started > 0.1:
+            errors.append('deadline: waited for quota before raising DeadlineExceeded')
+    return errors
+
+
+def check_throttling():
+    errors = []
+    calls, rate = 21, 10  # rpm 600
+    model = ScriptedModel()
+    client = GeminiClient(model, rpm=rate * 60, max_in_flight=calls, burst=0)
+    with ThreadPoolExecutor(calls) as pool:
+        list(pool.map(lambda i: client.generate_content([f'rpm {i}']), range(calls)))
+    busiest = busiest_second(model.arrivals)
+    if busiest > rate + 1:  # The rate plus the one request the bucket holds
+        errors.append(f'rpm: {busiest} calls in one second at {rate}/s')
+
+    calls, tokens, rate = 11, 101, 1000  # tpm 60000, each request estimated at 101 tokens
+    model = ScriptedModel()
+    client = GeminiClient(model, rpm=60000, tpm=rate * 60, max_in_flight=calls, burst=0.1)
+    started = time.monotonic()
+    with ThreadPoolExecutor(calls) as pool:
+        list(pool.map(lambda i: client.generate_content([f'{i:04d}' + 'x' * 396]), range(calls)))
+    elapsed = time.monotonic() - started
+    expected = (calls * tokens - 100) / rate  # Everything beyond the 100-token bucket waits for refill
+    if elapsed < expected * 0.95:
+        errors.append(f'tpm: {calls * tokens} tokens in {elapsed:.2f}s at {rate} tokens/s (expected >= {expected:.2f}s)')
+    return errors
+
+
+def check_single_flight(duplicates=10):
+    model = ScriptedModel(latency=0.3)
+    client = GeminiClient(model, rpm=60000, max_in_flight=duplicates)
+    with ThreadPoolExecutor(duplicates) as pool:
+        replies = list(pool.map(lambda _: client.generate_content(['same prompt']).text, range(duplicates)))
+    if model.calls != 1 or len(set(replies)) != 1 or client.stats['coalesced'] != duplicates - 1:
+        return [f"single-flight: {duplicates} identical requests -> {model.calls} model calls, "
+                f"{client.stats['coalesced']} coalesced"]
+    return []
+
+
+def run_checks():
+    failures = []
+    for name, check in (('retries', check_retries), ('deadline', check_deadline),
+                        ('rpm/tpm', check_throttling), ('single-flight', check_single_flight)):
+        errors = check()
+        print(f"check {name:13s} {'ok' if not errors else 'FAILED'}")
+        for error in errors:
+            print(f"  {error}")
+        failures += errors
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quota', type=int, default=20, help='Requests per second the fake endpoint accepts')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--fail-500', type=float, default=0.05)
+    parser.add_argument('--duplicates', type=int, default=20)
+    parser.add_argument('--checks-only', action='store_true', help='Skip the load runs, only run the checks')
+    args = parser.parse_args()
+
+    if not args.checks_only:
+        load(args)
+    failures = run_checks()
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+
+
+def load(args):
+    def endpoint():
+        return FakeModel(tokens=5, ttft=0.05, quota=args.quota, quota_window=1.0, fail_500=args.fail_500)
+
+    model = endpoint()
+    burst('bare', model.generate_content, model, args.requests, args.threads, args.quota)
+
+    model = endpoint()
+    burst('naive', lambda parts: naive(model, parts), model, args.requests, args.threads, args.quota)
+
+    model = endpoint()
+    client = GeminiClient(model, rpm=args.quota * 60, max_in_flight=args.threads, max_retries=6,
+                          base_delay=0.1, max_delay=2.0, timeout=5, deadline=60, burst=0)  # Quota is per second
+    burst('client', client.generate_content, model, args.requests, args.threads, args.quota)
+    print(f"        client stats: {client.stats}")
+
+    model = FakeModel(tokens=5, ttft=0.5)
+    client = GeminiClient(model, rpm=6000, max_in_flight=args.duplicates)
+    with ThreadPoolExecutor(args.duplicates) as pool:
+        list(pool.map(lambda _: client.generate_content(['same prompt', {'mime_type': 'image/jpeg', 'data': b'page'}]),
+                      range(args.duplicates)))
+    print(f"single-flight: {args.duplicates} identical requests -> {model.calls} model call(s), "
+          f"{client.stats['coalesced']} coalesced")
+
+
+if __name__ == '__main__':
+    main()
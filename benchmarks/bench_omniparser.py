@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+OmniParser server under concurrent load, with a stub model (no GPU needed)
+
+Loads #standalone_omniparser.py with a stub `util.utils` whose OCR and
+labeling steps sleep for --ocr-ms and --label-ms (OCR releases the GIL like
+the real EasyOCR/PaddleOCR calls do). For each concurrency level, fires that
+many /process requests at once and compares:
+
+  inline      the old handler: OCR + labeling run on the event loop
+  queue       InferenceQueue: OCR pool, one model thread, micro-batches
+
+--duplicate-ratio makes that share of requests reuse one screenshot, which the
+queue parses once per batch. Requests beyond OMNI_MAX_QUEUE get 503s. The
+parse cache is off for this part.
+
+Then request/response I/O through the ASGI app at --screen resolution: the
+old /upload_and_process re-encode (PIL decode, PNG encode, base64 round
+trip) that the upload path no longer does, and response sizes of /process
+with the annotated image vs /process_raw without it (JSON, and msgpack when
+installed).
+
+Then the parse cache: latency of a miss, a memory hit, a disk hit after a
+restart (fresh queue, same cache directory), and a near-duplicate hit (one
+changed pixel) with OMNI_PHASH_DISTANCE set.
+
+    python benchmarks/bench_omniparser.py --concurrency 1 4 16 64
+"""
+import argparse
+import asyncio
+import base64
+import importlib.util
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from PIL import Image
+
+STUB = {'ocr': 0.05, 'label': 0.1}
+
+
+def check_ocr_box(image, **kwargs):
+    time.sleep(STUB['ocr'])
+    return (['text'], [[0, 0, 10, 10]]), None
+
+
+def get_som_labeled_img(image, model, **kwargs):
+    time.sleep(STUB['label'])
+    buffer = io.BytesIO()
+    image.convert('RGB').save(buffer, format='PNG')  # The real function returns the annotated screen as base64 PNG
+    elements = [{'type': 'icon' if i % 3 else 'text', 'bbox': [i / 100, i / 200, i / 100 + 0.05, i / 200 + 0.02],
+                 'interactivity': bool(i % 3), 'content': f'element {i}', 'source': 'box_yolo_content_yolo'}
+                for i in range(60)]
+    return base64.b64encode(buffer.getvalue()).decode(), {}, elements
+
+
+def load_server():
+    os.environ['OMNI_CACHE_ITEMS'] = '0'  # Throughput runs reuse screenshots; the cache is measured separately
+    os.environ['OMNI_CAPTION_CACHE_ITEMS'] = '0'  # See bench_caption_cache.py
+    utils = types.ModuleType('util.utils')
+    utils.check_ocr_box = check_ocr_box
+    utils.get_som_labeled_img = get_som_labeled_img
+    utils.get_parsed_content_icon = lambda *args, **kwargs: []
+    utils.get_yolo_model = lambda model_path: object()
+    utils.get_caption_model_processor = lambda **kwargs: object()
+    sys.modules['util'] = types.ModuleType('util')
+    sys.modules['util.utils'] = utils
+    spec = importlib.util.spec_from_file_location('omniparser', os.path.join(REPO, '#standalone_omniparser.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.logger.setLevel('WARNING')
+    return module
+
+
+def screenshot(seed, touched=False):
+    image = Image.new('RGB', (640, 360), (seed % 256, 40, 90))
+    if touched:
+        image.putpixel((5, 5), (255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+async def asgi_post(app, path, body, query='', content_type='application/octet-stream'):
+    """Minimal in-process HTTP client: (status, response body bytes)"""
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+             'root_path': '', 'client': ('127.0.0.1', 1), 'server': ('127.0.0.1', 7860),
+             'headers': [(b'content-type', content_type.encode()), (b'content-length', str(len(body)).encode())]}
+    sent, status, chunks = False, None, []
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif message['type'] == 'http.response.body':
+            chunks.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return status, b''.join(chunks)
+
+
+def old_upload_reencode(data):
+    """What /upload_and_process used to do before handing the bytes to /process"""
+    buffered = io.BytesIO()
+    Image.open(io.BytesIO(data)).save(buffered, format='PNG')
+    return base64.b64decode(base64.b64encode(buffered.getvalue()).decode('utf-8'))
+
+
+async def io_run(server, width, height):
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 40).convert('RGB').save(buffer, format='PNG')
+    data = buffer.getvalue()
+    started = time.perf_counter()
+    old_upload_reencode(data)
+    print(f"I/O at {width}x{height} ({len(data) / 1e6:.1f} MB PNG): removed upload re-encode "
+          f"{(time.perf_counter() - started) * 1000:.0f}ms per call")
+
+    body = json.dumps({'image_base64': base64.b64encode(data).decode()}).encode()
+    status, full = await asgi_post(server.app, '/process', body, content_type='application/json')
+    print(f"  /process (base64 in, annotated image out)      status={status} response={len(full) / 1e3:8.1f} KB")
+    for label, query in (('json', 'render=false'), ('json + image', 'render=true'),
+                         ('msgpack', 'render=false&format=msgpack'), ('msgpack + image', 'render=true&format=msgpack')):
+        status, lean = await asgi_post(server.app, '/process_raw', data, query)
+        note = '  (msgpack not installed)' if status == 406 else ''
+        print(f"  /process_raw {label:16s} (raw bytes in)     status={status} response={len(lean) / 1e3:8.1f} KB{note}")
+
+
+async def timed(server, image_base64):
+    started = time.perf_counter()
+    await server.process_image(server.ProcessRequest(image_base64=image_base64))
+    return (time.perf_counter() - started) * 1000
+
+
+async def cache_run(server, phash_distance):
+    server.CACHE_ITEMS, server.CACHE_DIR, server.PHASH_DISTANCE = 128, tempfile.mkdtemp(prefix='omni_cache_'), phash_distance
+    server.inference_queue = server.InferenceQueue()
+    image = screenshot(7)
+    miss = await timed(server, image)
+    memory_hit = await timed(server, image)
+    near_hit = await timed(server, screenshot(7, touched=True))
+    server.inference_queue = server.InferenceQueue()  # Restart: empty memory tier, same directory
+    disk_hit = await timed(server, image)
+    print(f"cache: miss={miss:7.1f}ms memory hit={memory_hit:6.2f}ms disk hit={disk_hit:6.2f}ms "
+          f"near-duplicate ({phash_distance or 'off'})={near_hit:7.2f}ms")
+
+
+async def inline(server, request):
+    """The pre-queue handler: the whole pipeline on the event loop"""
+    params = {'box_threshold': request.box_threshold, 'iou_threshold': request.iou_threshold,
+              'use_paddleocr': request.use_paddleocr, 'imgsz': request.imgsz}
+    server.initialize_models()
+    ocr = server.run_ocr(base64.b64decode(request.image_base64), params)
+    return server.run_labeling(*ocr, params)
+
+
+async def fire(handler, requests):
+    started = time.perf_counter()
+    latencies, rejected = [], 0
+
+    async def one(request):
+        nonlocal rejected
+        response = await handler(request)
+        if getattr(response, 'status_code', 200) == 503:
+            rejected += 1
+        else:
+            latencies.append(time.perf_counter() - started)  # All requests arrive at once
+
+    await asyncio.gather(*(one(r) for r in requests))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    return elapsed, len(latencies), rejected, p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 64])
+    parser.add_argument('--ocr-ms', type=float, default=50)
+    parser.add_argument('--label-ms', type=float, default=100)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.25)
+    parser.add_argument('--screen', type=int, nargs=2, default=[1920, 1080], metavar=('WIDTH', 'HEIGHT'))
+    args = parser.parse_args()
+    STUB['ocr'], STUB['label'] = args.ocr_ms / 1000, args.label_ms / 1000
+
+    server = load_server()
+    print(f"stub OCR {args.ocr_ms:.0f}ms, labeling {args.label_ms:.0f}ms, "
+          f"OCR workers={server.OCR_WORKERS} window={server.BATCH_WINDOW * 1000:.0f}ms "
+          f"max batch={server.MAX_BATCH} max queue={server.MAX_QUEUE}")
+
+    async def run():
+        shared = screenshot(0)
+        for n in args.concurrency:
+            duplicates = int(n * args.duplicate_ratio)
+            requests = [server.ProcessRequest(image_base64=shared if i < duplicates else screenshot(i + 1))
+                        for i in range(n)]
+            for label, handler in (('inline', lambda r: inline(server, r)), ('queue', server.process_image)):
+                elapsed, ok, rejected, p95 = await fire(handler, requests)
+                print(f"n={n:3d} {label:6s} total={elapsed:6.2f}s ok={ok:3d} 503={rejected:3d} "
+                      f"req/s={ok / elapsed:6.1f} p95={p95 * 1000:6.0f}ms")
+        print(f"queue stats: {server.inference_queue.stats}")
+        await io_run(server, *args.screen)
+        await cache_run(server, 0)
+        await cache_run(server, 4)
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
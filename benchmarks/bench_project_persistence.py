@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Project persistence at scale: a global prompt change across N projects
+
+Compares the legacy path (one full indent=4 rewrite of projects.json per
+save_project call, i.e. O(N^2) bytes) with ProjectStore write-behind batching
+on the JSON backend and on the SQLite backend. The legacy path is timed on a
+sample of saves and extrapolated to N. It also times the slowest get + put
+made while a background flush of the JSON file is running.
+
+    python benchmarks/bench_project_persistence.py --projects 10000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from project_backends import JsonFileBackend, SqliteBackend
+from project_store import ProjectStore
+from bench_project_store import synthetic_projects
+
+
+def legacy_global_update(path, projects, sample):
+    """What api_save_prompts used to do: save_project -> full rewrite, once per project"""
+    started = time.perf_counter()
+    for p in projects[:sample]:
+        p['system_prompt'] = 'updated'
+        with open(path, 'w') as f:
+            json.dump(projects, f, indent=4)
+    per_save = (time.perf_counter() - started) / sample
+    return per_save * len(projects), os.path.getsize(path) * len(projects)
+
+
+def store_global_update(store):
+    started = time.perf_counter()
+    with store.batch():
+        for p in store.all():
+            p['system_prompt'] = 'updated'
+            store.put(p)
+    store.flush()
+    return time.perf_counter() - started
+
+
+def single_update(store, name):
+    started = time.perf_counter()
+    project = dict(store.get(name), description='touched')
+    store.put(project)
+    store.flush()
+    return time.perf_counter() - started
+
+
+def update_during_flush(store, name, seconds=1.0):
+    """Slowest get + put while write-behind flushes run; the flush must not hold them up"""
+    slowest = 0
+    ends = time.perf_counter() + seconds
+    while time.perf_counter() < ends:
+        started = time.perf_counter()
+        store.put(dict(store.get(name), description=str(started)))
+        slowest = max(slowest, time.perf_counter() - started)
+    store.flush()
+    return slowest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, default=10000)
+    parser.add_argument('--legacy-sample', type=int, default=10)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='eva_persist_')
+    json_path = os.path.join(workdir, 'projects.json')
+    with open(json_path, 'w') as f:
+        json.dump(synthetic_projects(args.projects), f, indent=4)
+
+    legacy_s, legacy_bytes = legacy_global_update(json_path, synthetic_projects(args.projects), args.legacy_sample)
+    print(f"legacy  global update ~{legacy_s:9.2f}s  ~{legacy_bytes / 1e9:8.2f} GB written (extrapolated)")
+
+    json_store = ProjectStore(backend=JsonFileBackend(json_path), flush_delay=0)
+    json_store.all()
+    print(f"json    global update  {store_global_update(json_store):9.3f}s  "
+          f"{os.path.getsize(json_path) / 1e6:8.2f} MB written, {json_store.flushes} flush")
+    print(f"json    one project    {single_update(json_store, 'Project 7') * 1000:9.1f}ms")
+    json_store.flush_delay = 0.01
+    print(f"json    put in a flush {update_during_flush(json_store, 'Project 7') * 1000:9.1f}ms (slowest)")
+
+    sqlite_store = ProjectStore(backend=SqliteBackend(os.path.join(workdir, 'projects.db'), import_json=json_path), flush_delay=0)
+    sqlite_store.all()
+    print(f"sqlite  global update  {store_global_update(sqlite_store):9.3f}s  {sqlite_store.flushes} flush")
+    print(f"sqlite  one project    {single_update(sqlite_store, 'Project 7') * 1000:9.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Project lookup in the chat hot path: re-reading projects.json vs ProjectStore
+
+Writes a synthetic projects.json with N projects and times looking a project up
+by name the old way (open + json.load + linear scan) and through ProjectStore.
+
+    python benchmarks/bench_project_store.py --projects 10 1000 10000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from project_store import ProjectStore
+
+
+def synthetic_projects(count):
+    return [{
+        'name': f'Project {i}',
+        'description': 'Synthetic benchmark project',
+        'system_prompt': 'x' * 2000,
+        'use_custom_prompt': False,
+        'steps': [{'instructions': f'Step {s} of project {i}'} for s in range(5)]
+    } for i in range(count)]
+
+
+def old_lookup(path, name):
+    with open(path, 'r') as f:
+        all_projects = json.load(f)
+    for p in all_projects:
+        if p.get('name') == name:
+            return p
+    return None
+
+
+def timed(fn, names):
+    started = time.perf_counter()
+    for name in names:
+        assert fn(name) is not None
+    return (time.perf_counter() - started) / len(names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--projects', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--lookups', type=int, default=200)
+    args = parser.parse_args()
+
+    for count in args.projects:
+        path = os.path.join(tempfile.mkdtemp(prefix='eva_store_'), 'projects.json')
+        with open(path, 'w') as f:
+            json.dump(synthetic_projects(count), f, indent=4)
+        names = [f'Project {random.randrange(count)}' for _ in range(args.lookups)]
+
+        old = timed(lambda name: old_lookup(path, name), names)
+        store = ProjectStore(path)
+        store.all()  # First load is paid once at startup
+        new = timed(store.get, names)
+        print(f"projects={count:6d} reparse={old * 1e6:10.1f}us/lookup store={new * 1e6:8.2f}us/lookup "
+              f"reloads={store.reloads}")
+
+
+if __name__ == '__main__':
+    main()
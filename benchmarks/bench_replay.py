@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Replaying recorded action traces vs planning every step with UFO2
+
+A --steps project runs through ChatEngine.process_streaming on one warm pool
+worker of the fake UFO2 in benchmarks/fake_ufo. A planned step costs --rounds
+UFO2 rounds of --round-ms each (each round is an LLM call in the real UFO2)
+and reports --actions UI actions; a replayed step runs those actions through
+the fake executor (benchmarks/fake_ufo/ufo/fake_replay.py) at --action-ms each.
+
+  record            TRACES "record": every step planned, traces recorded
+  replay            TRACES "replay" on the recorded screen: every step replayed
+  replay fails      the executor cannot find a control: replay, then planning
+  changed screen    the screen no longer matches the traces: every step planned
+
+    python benchmarks/bench_replay.py --steps 5 --rounds 6 --round-ms 400
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import config
+config.SCREENSHOT['backend'] = 'fake'
+
+from action_trace import TraceStore
+from chat_engine import ChatEngine
+from fake_model import FakeModel
+from ufo_pool import UFOWorkerPool, worker_env
+
+
+class Screen:
+    """A fixed screen: a gradient, or noise from `seed` for a screen that changed"""
+
+    def __init__(self, seed=None):
+        import numpy as np
+        from PIL import Image
+        if seed is None:
+            pixels = np.tile(np.linspace(0, 255, 1920, dtype=np.uint8), (1080, 1))
+        else:
+            pixels = np.random.default_rng(seed).integers(0, 256, (1080, 1920), dtype=np.uint8)
+        self.image = Image.fromarray(pixels).convert('RGB')
+
+    def grab(self):
+        return self.image.copy()
+
+
+def run(label, engine, project, store):
+    before = store.stats()
+    step_times, last = [], time.perf_counter()
+    started = last
+    rounds = replayed = 0
+    for event in engine.process_streaming('run', project, []):
+        if event['type'] == 'ufo_output':
+            rounds += event['content'].count('Round ')
+        if event['type'] == 'eva2_conclusion':
+            replayed += bool(event.get('replayed'))
+            now = time.perf_counter()
+            step_times.append((now - last) * 1000)
+            last = now
+    elapsed = time.perf_counter() - started
+    after = store.stats()
+    print(f"{label:15s} total={elapsed:6.2f}s step p50={statistics.median(step_times):7.1f}ms "
+          f"replayed={replayed}/{len(project['steps'])} fallbacks={after['fallbacks'] - before['fallbacks']} "
+          f"UFO2 rounds (LLM calls)={rounds}")
+    return elapsed
+
+
+def start_pool(fake_ufo):
+    """Pool workers take their environment when they start"""
+    pool = UFOWorkerPool(sys.executable, fake_ufo, worker_env(), size=1, max_tasks=1000).start()
+    while pool.stats()['idle'] < 1:
+        time.sleep(0.05)
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=6, help='UFO2 planning rounds per step')
+    parser.add_argument('--round-ms', type=float, default=400, help='Milliseconds per planning round')
+    parser.add_argument('--actions', type=int, default=3, help='UI actions per step')
+    parser.add_argument('--action-ms', type=float, default=50, help='Milliseconds per replayed action')
+    args = parser.parse_args()
+
+    fake_ufo = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+    config.PATHS['ufo2'] = fake_ufo
+    config.PATHS['ufo2_python'] = sys.executable
+    config.RUNS['enabled'] = False
+    os.environ['FAKE_UFO_LINES'] = str(args.rounds)
+    os.environ['FAKE_UFO_INTERVAL'] = str(args.round_ms / 1000)
+    os.environ['FAKE_UFO_ACTIONS'] = str(args.actions)
+    os.environ['FAKE_REPLAY_ACTION_MS'] = str(args.action_ms)
+    os.environ['EVA_REPLAY_EXECUTOR'] = 'ufo.fake_replay:execute'
+    os.chdir(tempfile.mkdtemp(prefix='eva_replay_'))
+
+    pool = start_pool(fake_ufo)
+    store = TraceStore('traces.json')
+    engine = ChatEngine(ufo_pool=pool, model=FakeModel(), capture=Screen(), trace_store=store)
+    project = {'name': 'bench', 'steps': [{'instructions': f'Open record {i + 1} and verify it'} for i in range(args.steps)]}
+    print(f"{args.steps} steps, {args.rounds} planning rounds x {args.round_ms:.0f}ms, "
+          f"{args.actions} actions x {args.action_ms:.0f}ms")
+
+    config.TRACES['mode'] = 'record'
+    planned = run('record', engine, project, store)
+    print(f"                {store.stats()['traces']} traces recorded")
+
+    config.TRACES['mode'] = 'replay'
+    replayed = run('replay', engine, project, store)
+    print(f"                {planned / replayed:.1f}x faster than planning")
+
+    os.environ['FAKE_REPLAY_FAIL'] = 'click_input'
+    pool.close()
+    pool = engine.messenger.pool = start_pool(fake_ufo)
+    run('replay fails', engine, project, store)
+    del os.environ['FAKE_REPLAY_FAIL']
+    print(f"                failing traces are re-recorded by the planned run: {store.stats()['traces']} traces")
+
+    engine.capture = Screen(seed=1)
+    run('changed screen', engine, project, store)
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Resuming a failed run vs running the project again from step 1
+
+A --steps project runs through ChatEngine.process_streaming against the fake
+UFO2 in benchmarks/fake_ufo, with step --fail-at failing (FAKE_UFO_FAIL_ON).
+After the "fix", the project is run again two ways: from step 1 as before,
+and with resume_streaming from the failed step, reusing the recorded results
+of the steps before it. Also reports what a checkpoint costs (one append per
+step start and finish, with --output-kb of UFO2 output).
+
+    python benchmarks/bench_resume.py --steps 10 --fail-at 7
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import config
+config.SCREENSHOT['backend'] = 'fake'
+
+from chat_engine import ChatEngine
+from fake_model import FakeModel
+from run_store import RunStore
+
+
+def timed(label, events):
+    started = time.perf_counter()
+    events = list(events)
+    elapsed = time.perf_counter() - started
+    run_id = next((e['run_id'] for e in events if e['type'] == 'run_started'), None)
+    errors = [e['content'] for e in events if e['type'] == 'error']
+    restored = sum(1 for e in events if e['type'] == 'step_restored')
+    print(f"{label:22s} {elapsed:6.2f}s  restored={restored:2d} errors={errors or 'none'}")
+    return run_id, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--fail-at', type=int, default=7)
+    parser.add_argument('--import-cost', type=float, default=1.0, help='Simulated UFO2 start-up seconds')
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between UFO2 output lines')
+    parser.add_argument('--output-kb', type=int, default=16, help='UFO2 output per step for the checkpoint cost')
+    args = parser.parse_args()
+
+    config.PATHS['ufo2'] = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+    config.PATHS['ufo2_python'] = sys.executable
+    os.environ['FAKE_UFO_IMPORT_COST'] = str(args.import_cost)
+    os.environ['FAKE_UFO_LINES'] = str(args.lines)
+    os.environ['FAKE_UFO_INTERVAL'] = str(args.interval)
+    os.chdir(tempfile.mkdtemp(prefix='eva_resume_'))
+
+    store = RunStore('runs')
+    engine = ChatEngine(model=FakeModel(), run_store=store)
+    project = {'name': 'bench', 'steps': [{'instructions': f'Open record {i + 1} and verify it'} for i in range(args.steps)]}
+
+    os.environ['FAKE_UFO_FAIL_ON'] = f'record {args.fail_at} '
+    failed_run, _ = timed(f'run, fails at {args.fail_at}', engine.process_streaming('run', project, []))
+    print(f"  {store.list()[0]}")
+    del os.environ['FAKE_UFO_FAIL_ON']
+
+    _, rerun = timed('rerun from step 1', engine.process_streaming('run', project, []))
+    resumed_run, resumed = timed(f'resume from step {store.resume_point(store.get(failed_run))}',
+                                 engine.resume_streaming(failed_run))
+    statuses = [s['status'] for s in store.get(resumed_run)['steps']]
+    print(f"  resumed run steps: {statuses}")
+    print(f"saved {rerun - resumed:.2f}s of {rerun:.2f}s ({(rerun - resumed) / rerun:.0%})")
+
+    output = 'x' * (args.output_kb * 1024)
+    run_id = store.start('checkpoint-cost', ['step'] * 200)
+    costs = []
+    for i in range(200):
+        started = time.perf_counter()
+        store.step_started(run_id, i, 'step')
+        store.step_finished(run_id, i, 'succeeded', output, 'observed', 'FINISH', 0.0, 1000)
+        costs.append((time.perf_counter() - started) * 1000)
+    store.finish(run_id, 'succeeded')
+    started = time.perf_counter()
+    store.get(run_id)
+    print(f"checkpoint cost per step ({args.output_kb} KB output): p50={statistics.median(costs):.3f}ms "
+          f"max={max(costs):.3f}ms; loading a 200-step record: {(time.perf_counter() - started) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Screen change detection: how much vision work a screenshot sequence really needs
+
+Replays a recorded screenshot sequence (a directory of images, in name order)
+through ChatEngine.take_screenshot / analyze_screen with the fake capture
+backend. A simulated vision call (--model-latency) runs only when the screen
+changed. The report shows the detector cost per frame, how many frames were
+unchanged, partially changed (dirty tiles only) or fully changed, and the
+analysis hit rate.
+
+It then checks that a slow fade (one gray level per frame, below the tile
+threshold between neighbouring frames) still invalidates the analysis once
+the drift adds up, and exits non-zero if it does not.
+
+Without --source a synthetic session is generated: mostly idle frames with a
+blinking caret, typing in one region and an occasional full window switch.
+
+    python benchmarks/bench_screen_diff.py --source recordings/session1/
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+from chat_engine import ChatEngine
+from screen_capture import FakeCapture
+
+
+def synthetic_sequence(directory, frames, size):
+    backgrounds = [Image.effect_noise(size, 40).convert('RGB') for _ in range(3)]
+    background = 0
+    for i in range(frames):
+        if i and i % 25 == 0:
+            background = (background + 1) % len(backgrounds)  # Window switch
+        image = backgrounds[background].copy()
+        draw = ImageDraw.Draw(image)
+        typed = (i % 25) // 5  # Typing advances every fifth frame
+        draw.rectangle((200, 300, 200 + 60 * typed, 340), fill=(255, 255, 255))
+        if typed % 2:
+            draw.rectangle((200 + 60 * typed, 300, 204 + 60 * typed, 340), fill=(0, 0, 0))  # Caret
+        image.save(os.path.join(directory, f'{i:05d}.png'))
+    return directory
+
+
+def check_drift(frames=60, size=(640, 360)):
+    """A fade from black to gray: every frame is 'unchanged' against the one
+    before it, but the screen as a whole moves by `frames` gray levels"""
+    class Fade:
+        level = 0
+
+        def grab(self):
+            image = Image.new('RGB', size, (self.level,) * 3)
+            self.level += 1
+            return image
+
+    engine = ChatEngine(model=object(), capture=Fade())
+    analyses = 0
+
+    def analyze(frame):
+        nonlocal analyses
+        analyses += 1
+        return analyses
+
+    for _ in range(frames):
+        engine.take_screenshot()
+        engine.analyze_screen(analyze)
+    step = engine.screen_diff.tile_threshold
+    expected = frames // (int(step) + 1)  # A new analysis whenever the drift passes the threshold
+    print(f"drift: fade 0->{frames - 1} over {frames} frames -> {analyses} analyses (expected >= {expected})")
+    return analyses >= expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', help='Directory of recorded screenshots')
+    parser.add_argument('--frames', type=int, default=100, help='Synthetic sequence length')
+    parser.add_argument('--model-latency', type=float, default=1.5, help='Seconds per simulated vision call')
+    args = parser.parse_args()
+
+    source = args.source or synthetic_sequence(tempfile.mkdtemp(prefix='eva_screens_'), args.frames, (1920, 1080))
+    capture = FakeCapture(source=source)
+    engine = ChatEngine(model=object(), capture=capture)
+
+    def analyze(frame):
+        time.sleep(args.model_latency / 1000)  # Scaled down 1000x; the report scales it back up
+        return {'frame': frame.id}
+
+    detect_ms, kinds = [], {'first': 0, 'unchanged': 0, 'partial': 0, 'full': 0}
+    observe = engine.screen_diff.observe
+
+    def timed_observe(image):
+        started = time.perf_counter()
+        change = observe(image)
+        detect_ms.append((time.perf_counter() - started) * 1000)
+        return change
+
+    engine.screen_diff.observe = timed_observe
+    tiles = engine.screen_diff.rows * engine.screen_diff.cols
+    for _ in capture.paths:
+        engine.take_screenshot()
+        change = engine.latest_screenshot().change
+        kind = ('first' if change.first else 'unchanged' if change.unchanged
+                else 'full' if len(change.dirty_tiles) == tiles else 'partial')
+        kinds[kind] += 1
+        engine.analyze_screen(analyze)
+
+    stats = engine.screen_stats()
+    calls = stats['misses']
+    print(f"frames={len(capture.paths)} detector p50={statistics.median(detect_ms):.2f}ms max={max(detect_ms):.2f}ms")
+    print(f"first={kinds['first']} unchanged={kinds['unchanged']} partial={kinds['partial']} full={kinds['full']}")
+    print(f"analysis hits={stats['hits']} misses={calls} hit_rate={stats['hit_rate']:.1%} "
+          f"vision time {len(capture.paths) * args.model_latency:.0f}s -> {calls * args.model_latency:.0f}s")
+    if not check_drift():
+        sys.exit('drift check failed: analysis reused across a screen that kept changing')
+
+
+if __name__ == '__main__':
+    main()
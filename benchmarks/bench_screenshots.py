@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Screenshot pipeline: full-size PNG to disk vs in-memory frames
+
+The legacy path saved every capture as a full-resolution PNG in the working
+directory before returning. The in-memory path keeps the frame in a ring and
+encodes it (downscaled JPEG/WebP) only when the bytes are asked for. This reports, per step,
+the time until take_screenshot() returns, the time until encoded bytes are
+ready, and the encoded size. Uses the fake capture backend so it runs headless.
+
+    python benchmarks/bench_screenshots.py --steps 20 --source screenshots/
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from screen_capture import FakeCapture, Frame, ScreenshotRing
+
+
+def legacy_step(capture, workdir, i):
+    started = time.perf_counter()
+    image = capture.grab()
+    path = os.path.join(workdir, f'temp_screenshot_{i}.png')
+    image.save(path)
+    returned = time.perf_counter() - started
+    return returned, returned, os.path.getsize(path)
+
+
+def ring_step(capture, ring, fmt, quality, max_edge):
+    started = time.perf_counter()
+    frame = Frame(capture.grab(), fmt, quality, max_edge)
+    ring.add(frame)
+    returned = time.perf_counter() - started
+    data = frame.encode()
+    return returned, time.perf_counter() - started, len(data)
+
+
+def report(label, results):
+    returned, ready, size = zip(*results)
+    print(f"{label:28s} returned p50={statistics.median(returned) * 1000:7.1f}ms  "
+          f"bytes ready p50={statistics.median(ready) * 1000:7.1f}ms  size={statistics.mean(size) / 1024:7.0f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=20)
+    parser.add_argument('--source', help='Image file or directory to replay (default: synthetic noise frames)')
+    parser.add_argument('--size', type=int, nargs=2, default=[1920, 1080])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='eva_screens_')
+    source = args.source
+    if not source:
+        # Noise compresses about as badly as a busy desktop, so sizes are a fair upper bound
+        from PIL import Image
+        source = os.path.join(workdir, 'noise.png')
+        Image.effect_noise(tuple(args.size), 64).convert('RGB').save(source)
+    capture = FakeCapture(args.size, source)
+
+    report('legacy PNG to disk', [legacy_step(capture, workdir, i) for i in range(args.steps)])
+    for fmt, quality, max_edge in [('PNG', None, None), ('JPEG', 80, None), ('JPEG', 80, 1568), ('WEBP', 80, 1568)]:
+        ring = ScreenshotRing(2)
+        label = f"ring {fmt} q={quality} edge={max_edge}"
+        report(label, [ring_step(capture, ring, fmt, quality, max_edge) for _ in range(args.steps)])
+
+
+if __name__ == '__main__':
+    main()
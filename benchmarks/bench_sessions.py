@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Concurrent sessions: N workflows at once, each in its own session
+
+Runs N simulated client sessions in parallel through SessionPool, each streaming
+a one-step project against the fake UFO2, and reports per-session latency for
+each N. It also checks, and exits non-zero if any check fails:
+
+  isolation    every session's prompt log holds only its own request and its
+               screenshots only its own screen (each session captures a
+               different solid colour)
+  p99          p99 latency at each N stays within --max-p99-ratio of the p99
+               at the first N, i.e. sessions run side by side, not in turn
+  busy         a session handed out by get(hold=True) is never evicted, even
+               when the pool is full
+
+    python benchmarks/bench_sessions.py --sessions 1 4 8 16
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import config
+from chat_engine import ChatEngine
+from project_store import ProjectStore
+from prompt_log import PromptLog
+from session_pool import Session, SessionLimitError, SessionPool
+
+
+class SolidScreen:
+    """A screen of one colour, derived from the session id"""
+
+    def __init__(self, session_id):
+        self.colour = session_colour(session_id)
+
+    def grab(self):
+        from PIL import Image
+        return Image.new('RGB', (320, 180), self.colour)
+
+
+def session_colour(session_id):
+    n = int(session_id[1:])
+    return (n * 37 % 256, n * 91 % 256, n * 13 % 256)
+
+
+def run_session(pool, session_id, latencies, errors):
+    session = pool.get(session_id, hold=True)
+    project = {'name': f'bench-{session_id}', 'steps': [{'instructions': f'step for {session_id}'}]}
+    started = time.perf_counter()
+    try:
+        session.prompt_log.log('USER_MESSAGE', session_id)
+        session.engine.take_screenshot()
+        events = list(session.engine.process_streaming(session_id, project, []))
+        session.engine.take_screenshot()
+    finally:
+        pool.release(session)
+    latencies.append(time.perf_counter() - started)
+
+    if not any(e['type'] == 'eva2_conclusion' for e in events):
+        errors.append(f'{session_id}: step did not complete')
+    foreign = [e for e in session.prompt_log.since(0)
+               if e['type'] in ('USER_MESSAGE', 'UFO2_COMMAND') and session_id not in e['content']]
+    if foreign:
+        errors.append(f'{session_id}: saw {len(foreign)} log entries from other sessions')
+    colours = {frame.image.getpixel((0, 0)) for frame in session.engine.screenshots}
+    if colours != {session_colour(session_id)}:
+        errors.append(f'{session_id}: screenshots show {sorted(colours)}, expected {session_colour(session_id)}')
+
+
+def p99(values):
+    return statistics.quantiles(values, n=100, method='inclusive')[98] if len(values) > 1 else values[0]
+
+
+def check_busy(factory):
+    """Sessions held by get(hold=True) survive a full pool"""
+    pool = SessionPool(factory, max_sessions=3)
+    held = [pool.get(session_id, hold=True) for session_id in ('s1', 's2')]
+    pool.get('default')  # Fills the pool; the default session is never evicted
+    try:
+        pool.get('s3')
+        return ['busy: a held session was evicted to make room']
+    except SessionLimitError:
+        pass
+    pool.release(held[0])
+    pool.get('s3')
+    if pool.get('s1', create=False) is not None:
+        return ['busy: the released session was not the one evicted']
+    return []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--max-p99-ratio', type=float, default=1.5,
+                        help='Largest allowed p99 at N sessions / p99 at the first N')
+    args = parser.parse_args()
+
+    config.PATHS['ufo2'] = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+    config.PATHS['ufo2_python'] = sys.executable
+    os.environ['FAKE_UFO_LINES'] = str(args.lines)
+    os.environ['FAKE_UFO_INTERVAL'] = str(args.interval)
+    os.chdir(tempfile.mkdtemp(prefix='eva_sessions_'))
+
+    store = ProjectStore('projects.json')
+
+    def factory(session_id):
+        log = PromptLog()
+        engine = ChatEngine(prompt_logger=log.log, project_store=store, model=object(), session_id=session_id,
+                            capture=SolidScreen(session_id) if session_id[1:].isdigit() else None)
+        return Session(session_id, engine, log)
+
+    failures, baseline = check_busy(factory), None
+    print(f"busy sessions survive a full pool: {'ok' if not failures else 'FAILED'}")
+    for error in failures:
+        print(f"  {error}")
+    for count in args.sessions:
+        pool = SessionPool(factory, max_sessions=count + 1)
+        latencies, errors = [], []
+        threads = [threading.Thread(target=run_session, args=(pool, f's{i}', latencies, errors)) for i in range(count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        tail = p99(latencies)
+        baseline = baseline or tail
+        if tail > baseline * args.max_p99_ratio:
+            errors.append(f'p99: {tail:.2f}s is more than {args.max_p99_ratio}x the p99 at {args.sessions[0]} '
+                          f'session(s) ({baseline:.2f}s)')
+        print(f"sessions={count:3d} p50={statistics.median(latencies):6.2f}s p99={tail:6.2f}s "
+              f"max={max(latencies):6.2f}s checks={'ok' if not errors else 'FAILED'}")
+        for error in errors:
+            print(f"  {error}")
+        failures += errors
+
+    if failures:
+        sys.exit(f'{len(failures)} check(s) failed')
+
+
+if __name__ == '__main__':
+    main()
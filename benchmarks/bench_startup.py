@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Startup: import cost of main and time until the first request is answered
+
+1. Runs `python -X importtime -c "import main"` and reports the total import
+   time and the slowest modules, and checks that the heavy modules listed in
+   the budget (genai, pyautogui, Pillow, numpy) are not imported at startup.
+2. Starts the Flask server headless (EVA_HEADLESS=1) and polls
+   /api/projects until it answers: time-to-first-request from process spawn.
+
+Results are checked against benchmarks/startup_budget.json and the script
+exits non-zero on a regression. Timings depend on the machine; refresh the
+budget on the machine that enforces it with --write-budget.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_FILE = os.path.join(REPO, 'benchmarks', 'startup_budget.json')
+PRELUDE = f"import sys; sys.path.insert(0, {REPO!r}); "
+
+
+def child_env():
+    env = os.environ.copy()
+    env['EVA_HEADLESS'] = '1'
+    return env
+
+
+def import_profile(workdir):
+    """(total ms for `import main`, {module: cumulative ms})"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PRELUDE + 'import main'],
+                            cwd=workdir, env=child_env(), capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f'import main failed:\n{result.stderr[-2000:]}')
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative_us, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        if cumulative_us.isdigit():  # Skips the header row
+            cumulative[name] = int(cumulative_us) / 1000
+    return cumulative.get('main', 0.0), cumulative
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def first_request(workdir, timeout=30):
+    """Milliseconds from spawning the server to the first 200 from /api/projects"""
+    port = free_port()
+    code = PRELUDE + f"import main; main.app.run(host='127.0.0.1', port={port}, use_reloader=False)"
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, '-c', code], cwd=workdir, env=child_env(),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/projects', timeout=1) as response:
+                    if response.status == 200:
+                        return (time.perf_counter() - started) * 1000
+            except OSError:
+                time.sleep(0.005)
+        raise SystemExit('Server did not answer within the timeout')
+    finally:
+        server.kill()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--write-budget', action='store_true', help='Store current timings (+50%%) as the budget')
+    args = parser.parse_args()
+
+    with open(BUDGET_FILE) as f:
+        budget = json.load(f)
+    workdir = tempfile.mkdtemp(prefix='eva_startup_')
+
+    imports = [import_profile(workdir) for _ in range(args.runs)]
+    import_ms = statistics.median(total for total, _ in imports)
+    modules = imports[-1][1]
+    print(f"import main: {import_ms:.0f}ms (median of {args.runs})")
+    top_level = sorted(((ms, name) for name, ms in modules.items() if '.' not in name and name != 'main'), reverse=True)
+    for ms, name in top_level[:args.top]:
+        print(f"  {ms:8.1f}ms  {name}")
+
+    eager = [name for name in budget['lazy_modules'] if name in modules]
+    print(f"heavy modules imported at startup: {', '.join(eager) or 'none'}")
+
+    request_ms = statistics.median(first_request(workdir) for _ in range(args.runs))
+    print(f"time to first request: {request_ms:.0f}ms (median of {args.runs})")
+
+    if args.write_budget:
+        budget['import_main_ms'] = round(import_ms * 1.5)
+        budget['first_request_ms'] = round(request_ms * 1.5)
+        with open(BUDGET_FILE, 'w') as f:
+            json.dump(budget, f, indent=4)
+            f.write('\n')
+        print(f"budget written to {BUDGET_FILE}")
+        return
+
+    failures = []
+    if import_ms > budget['import_main_ms']:
+        failures.append(f"import main {import_ms:.0f}ms > budget {budget['import_main_ms']}ms")
+    if request_ms > budget['first_request_ms']:
+        failures.append(f"first request {request_ms:.0f}ms > budget {budget['first_request_ms']}ms")
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
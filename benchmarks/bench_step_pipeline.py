@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Inter-step gap on a multi-step project, with and without step pipelining
+
+Runs a --steps project through ChatEngine.process_streaming against the fake
+UFO2 in benchmarks/fake_ufo (FAKE_UFO_IMPORT_COST stands in for UFO2's
+start-up). The gap is the time from the end of one step to the first UFO2
+output of the next (ChatEngine.last_pipeline_stats). Four setups:
+
+  spawn              a cold `python -m ufo` per step
+  spawn+pipeline     the next step's interpreter starts while the current runs (a
+                     standby worker: PIPELINE["standby_worker"], off by default)
+  pool               one warm worker, recycled every --max-tasks steps
+  pool+pipeline      the same pool, with a standby interpreter for the busy/recycled case
+
+Then a project whose first step fails, to show the interpreter prepared for
+step 2 is discarded rather than left running.
+
+    python benchmarks/bench_step_pipeline.py --steps 6 --import-cost 1.5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import config
+config.SCREENSHOT['backend'] = 'fake'
+config.PIPELINE['standby_worker'] = True  # Off by default; the spawn+pipeline setup measures it
+
+from chat_engine import ChatEngine
+from fake_model import FakeModel
+from ufo_pool import UFOWorkerPool, worker_env
+
+
+def run(label, engine, steps):
+    project = {'steps': [{'instructions': f'benchmark step {i}'} for i in range(steps)]}
+    started = time.perf_counter()
+    events = list(engine.process_streaming('run', project, []))
+    elapsed = time.perf_counter() - started
+    stats = engine.last_pipeline_stats or {'mean_gap_ms': 0.0, 'gaps_ms': []}
+    failed = sum(1 for e in events if e['type'] == 'error' or 'failed' in str(e.get('content', '')).lower())
+    print(f"{label:15s} total={elapsed:6.2f}s mean gap={stats['mean_gap_ms']:7.1f}ms "
+          f"gaps={stats['gaps_ms']} failure events={failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=6)
+    parser.add_argument('--import-cost', type=float, default=1.5, help='Simulated UFO2 start-up seconds')
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.1, help='Seconds between UFO2 output lines')
+    parser.add_argument('--max-tasks', type=int, default=2, help='Pool worker recycling')
+    args = parser.parse_args()
+
+    fake_ufo = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+    config.PATHS['ufo2'] = fake_ufo
+    config.PATHS['ufo2_python'] = sys.executable
+    os.environ['FAKE_UFO_IMPORT_COST'] = str(args.import_cost)
+    os.environ['FAKE_UFO_LINES'] = str(args.lines)
+    os.environ['FAKE_UFO_INTERVAL'] = str(args.interval)
+    os.chdir(tempfile.mkdtemp(prefix='eva_pipeline_'))
+    print(f"{args.steps} steps, UFO2 start-up {args.import_cost}s, "
+          f"~{args.lines * args.interval:.1f}s of output per step")
+
+    for pipelined in (False, True):
+        config.PIPELINE['enabled'] = pipelined
+        run('spawn' + ('+pipeline' if pipelined else ''), ChatEngine(model=FakeModel()), args.steps)
+
+    for pipelined in (False, True):
+        config.PIPELINE['enabled'] = pipelined
+        pool = UFOWorkerPool(sys.executable, fake_ufo, worker_env(), size=1, max_tasks=args.max_tasks).start()
+        while pool.stats()['idle'] < 1:
+            time.sleep(0.05)
+        run('pool' + ('+pipeline' if pipelined else ''), ChatEngine(ufo_pool=pool, model=FakeModel()), args.steps)
+        pool.close()
+
+    os.environ['FAKE_UFO_OUTCOME'] = 'failed'
+    config.PIPELINE['enabled'] = True
+    engine = ChatEngine(model=FakeModel())
+    run('failing step', engine, args.steps)
+    time.sleep(args.import_cost + 0.5)
+    print(f"                standby interpreters left running: {len(engine.messenger._standby)}")
+
+
+if __name__ == '__main__':
+    main()
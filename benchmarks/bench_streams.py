@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Concurrent SSE stream benchmark: threaded Flask vs ASGI serving mode
+
+Starts the app in each mode against the fake UFO2 in benchmarks/fake_ufo, opens
+N concurrent /api/chat_stream requests, each from its own client session
+(X-Session-ID, so each has its own ChatEngine and prompt log), and reports how
+many streams completed
+and the latency of each ufo_output event (time printed by the fake UFO2 to
+time received by the client).
+
+    python benchmarks/bench_streams.py --streams 25 50 100 --lines 20 --interval 0.05
+
+Each stream spawns its own UFO2 process. ASGI mode spawns on the event loop, so
+a burst of spawns delays every open stream (see "Async Start" in README.md).
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_UFO = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+
+
+def serve(mode, port, workdir):
+    """Run the app in-process, pointed at the fake UFO2 (used as a child process)"""
+    os.chdir(workdir)
+    sys.path.insert(0, REPO)
+    import config
+    config.PATHS['ufo2'] = FAKE_UFO
+    config.PATHS['ufo2_python'] = sys.executable
+    config.SESSIONS['max_sessions'] = 100000  # One session per stream; the pool must not turn any away
+
+    if mode == 'threaded':
+        from werkzeug.serving import make_server
+        import main
+        make_server('127.0.0.1', port, main.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        import asgi_app
+        uvicorn.run(asgi_app.app, host='127.0.0.1', port=port, log_level='warning',
+                    limit_concurrency=config.ASGI['limit_concurrency'])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def one_stream(port, payload, session_id, latencies):
+    """POST /api/chat_stream over HTTP/1.0 and read events until the server closes"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(payload).encode()
+    writer.write(
+        b"POST /api/chat_stream HTTP/1.0\r\n"
+        b"Host: 127.0.0.1\r\n"
+        b"Content-Type: application/json\r\n"
+        + f"X-Session-ID: {session_id}\r\n".encode()
+        + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+    completed = False
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.startswith(b'data: '):
+                continue
+            received = time.time()
+            event = json.loads(line[6:])
+            if event.get('type') == 'ufo_output':
+                # A frame may carry several fake UFO2 lines
+                for part in event['content'].split('ts=')[1:]:
+                    latencies.append(received - float(part.split()[0]))
+            elif event.get('type') == 'eva2_conclusion':
+                completed = True
+    finally:
+        writer.close()
+    return completed
+
+
+async def run_level(port, streams, timeout):
+    payload = {
+        'message': 'run',
+        'project': {'name': 'bench', 'steps': [{'instructions': 'benchmark step'}]},
+    }
+    latencies = []
+    started = time.perf_counter()
+    tasks = [asyncio.create_task(one_stream(port, payload, f'bench-{streams}-{i}', latencies)) for i in range(streams)]
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    completed = sum(1 for t in done if not t.cancelled() and t.exception() is None and t.result())
+    return {
+        'streams': streams,
+        'completed': completed,
+        'wall_s': round(time.perf_counter() - started, 3),
+        'events': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def bench_mode(mode, levels, env, timeout):
+    workdir = tempfile.mkdtemp(prefix=f'eva_bench_{mode}_')
+    with open(os.path.join(workdir, 'projects.json'), 'w') as f:
+        f.write('[]')
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode, '--port', str(port), '--workdir', workdir],
+        env=env,
+    )
+    try:
+        if not wait_for_port(port):
+            raise RuntimeError(f'{mode} server did not start')
+        return [asyncio.run(run_level(port, n, timeout)) for n in levels]
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--streams', type=int, nargs='+', default=[25, 50, 100])
+    parser.add_argument('--modes', nargs='+', default=['threaded', 'asgi'], choices=['threaded', 'asgi'])
+    parser.add_argument('--lines', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--serve', choices=['threaded', 'asgi'], help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.workdir)
+        return
+
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    env = os.environ.copy()
+    env['FAKE_UFO_LINES'] = str(args.lines)
+    env['FAKE_UFO_INTERVAL'] = str(args.interval)
+
+    results = {}
+    for mode in args.modes:
+        results[mode] = bench_mode(mode, args.streams, env, args.timeout)
+        for row in results[mode]:
+            print(f"{mode:9s} streams={row['streams']:5d} completed={row['completed']:5d} "
+                  f"wall={row['wall_s']:7.2f}s p50={row['p50_ms']}ms p99={row['p99_ms']}ms")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite: the whole server against fake UFO2 and fake Gemini
+
+Runs on any machine (no Windows, no UFO2 install, no API key). Each scenario
+starts the app in its own server process (threaded Flask, or --server asgi)
+pointed at the fake UFO2 in benchmarks/fake_ufo and a FakeModel, drives it
+over HTTP and records the server's memory high-water mark (VmHWM; Linux only,
+UFO2 child processes not included):
+
+  sse        --streams concurrent /api/chat_stream requests, UFO2 printing
+             --lines lines of --line-bytes every --interval seconds: events
+             and MB per second, UFO2-line-to-client latency
+  steps      one --steps project: step duration, step start to first UFO2
+             output, compared with the fake's scripted --step-lines x
+             --step-interval
+  document   --documents concurrent /api/analyze_document requests, the fake
+             model answering --tokens tokens after --ttft at
+             --tokens-per-sec: time to first chunk, total time, chunks/sec
+             (the Gemini client's rate limit is raised to --rpm)
+  crud       for each --projects size, a synthetic projects.json: startup to
+             first answer, GET /api/projects, POST update, POST create
+
+Results are written as JSON (--output, default benchmarks/results/) and can
+be compared with an earlier file: --compare exits non-zero when a latency or
+memory figure grew, or a throughput figure fell, by more than --tolerance
+(latency and memory changes under --floor ms/MB are ignored as noise).
+
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --scenarios crud --projects 10 1000 10000
+    python benchmarks/bench_suite.py --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import base64
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_UFO = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+RESULTS_DIR = os.path.join(REPO, 'benchmarks', 'results')
+SCENARIOS = ('sse', 'steps', 'document', 'crud')
+
+
+# --- Server side (runs in the child process) ---
+
+def serve(settings):
+    """Run the app against the fakes until killed"""
+    os.chdir(settings['workdir'])
+    sys.path.insert(0, REPO)
+    import config
+    config.PATHS['ufo2'] = FAKE_UFO
+    config.PATHS['ufo2_python'] = sys.executable
+    config.LLM['provider'] = 'fake'
+    config.UFO_WORKERS['enabled'] = settings['ufo_workers'] > 0
+    config.UFO_WORKERS['size'] = max(1, settings['ufo_workers'])
+    config.GEMINI_CLIENT['rpm'] = settings['rpm']
+
+    import main
+    from fake_model import FakeModel
+    from gemini_client import from_config as gemini_client_from_config
+    model = settings['model']
+    main.shared_model = gemini_client_from_config(
+        lambda: FakeModel(tokens=model['tokens'], ttft=model['ttft'], tokens_per_sec=model['tokens_per_sec']),
+        config.GEMINI_CLIENT, config.LLM)
+
+    if settings['server'] == 'asgi':
+        import uvicorn
+        import asgi_app
+        uvicorn.run(asgi_app.app, host='127.0.0.1', port=settings['port'], log_level='warning',
+                    limit_concurrency=config.ASGI['limit_concurrency'])
+    else:
+        from werkzeug.serving import make_server
+        make_server('127.0.0.1', settings['port'], main.app, threaded=True).serve_forever()
+
+
+# --- Client side ---
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+class Server:
+    """The app in a child process. startup_ms runs from spawn to the first answer
+    from /api/projects, so it includes loading projects.json."""
+
+    def __init__(self, args, ufo_env, projects=None):
+        self.workdir = tempfile.mkdtemp(prefix='eva_suite_')
+        with open(os.path.join(self.workdir, 'projects.json'), 'w') as f:
+            json.dump(projects or [], f, indent=4)
+        self.port = free_port()
+        settings = {
+            'workdir': self.workdir, 'port': self.port, 'server': args.server, 'ufo_workers': args.ufo_workers,
+            'rpm': args.rpm,
+            'model': {'tokens': args.tokens, 'ttft': args.ttft, 'tokens_per_sec': args.tokens_per_sec}
+        }
+        env = {**os.environ, 'EVA_HEADLESS': '1', **{k: str(v) for k, v in ufo_env.items()}}
+        self.started = time.perf_counter()
+        self.process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', json.dumps(settings)],
+                                        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.startup_ms = self._wait()
+
+    def _wait(self, timeout=60):
+        while time.perf_counter() - self.started < timeout:
+            if self.process.poll() is not None:
+                raise RuntimeError('Server exited during startup')
+            try:
+                with urllib.request.urlopen(self.url('/api/projects'), timeout=30):
+                    return ms(time.perf_counter() - self.started)
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('Server did not answer within the timeout')
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.port}{path}'
+
+    def max_rss_mb(self):
+        """Peak resident memory of the server process (Linux), or None"""
+        try:
+            with open(f'/proc/{self.process.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def close(self):
+        self.process.kill()
+        self.process.wait()
+
+
+async def sse(port, path, payload):
+    """POST `payload` and read the SSE response: [(received at, event)], bytes read"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=16 * 1024 * 1024)
+    body = json.dumps(payload).encode()
+    writer.write(f"POST {path} HTTP/1.0\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    events, received = [], 0
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            received += len(line)
+            if line.startswith(b'data: '):
+                data = line[6:].strip()
+                events.append((time.perf_counter(), {'type': 'done'} if data == b'[DONE]' else json.loads(data)))
+    finally:
+        writer.close()
+    return events, received
+
+
+async def gather_sse(port, path, payloads):
+    return await asyncio.gather(*(sse(port, path, payload) for payload in payloads))
+
+
+def chat_payload(steps, name='bench'):
+    return {'message': 'run', 'project': {'name': name, 'steps': [{'instructions': f'Benchmark step {i + 1}'}
+                                                                  for i in range(steps)]}}
+
+
+def bench_sse(args):
+    ufo_env = {'FAKE_UFO_LINES': args.lines, 'FAKE_UFO_INTERVAL': args.interval, 'FAKE_UFO_LINE_BYTES': args.line_bytes}
+    server = Server(args, ufo_env)
+    try:
+        started = time.perf_counter()
+        streams = asyncio.run(gather_sse(server.port, '/api/chat_stream', [chat_payload(1)] * args.streams))
+        wall = time.perf_counter() - started
+        offset = time.time() - time.perf_counter()  # The fake UFO2 stamps lines with epoch seconds
+        latencies, events, received, lines, completed = [], 0, 0, 0, 0
+        for stream, size in streams:
+            events += len(stream)
+            received += size
+            completed += any(event['type'] == 'eva2_conclusion' for _, event in stream)
+            for at, event in stream:
+                if event['type'] == 'ufo_output':
+                    for part in event['content'].split('ts=')[1:]:
+                        lines += 1
+                        latencies.append(at + offset - float(part.split()[0]))
+        return {
+            'params': {'streams': args.streams, 'lines': args.lines, 'interval': args.interval,
+                       'line_bytes': args.line_bytes, 'completed': completed, 'events': events, 'ufo_lines': lines},
+            'metrics': {
+                'wall_ms': ms(wall),
+                'events_per_sec': round(events / wall, 1),
+                'ufo_lines_per_sec': round(lines / wall, 1),
+                'mb_per_sec': round(received / wall / 1e6, 3),
+                'line_latency_p50_ms': ms(percentile(latencies, 50)),
+                'line_latency_p99_ms': ms(percentile(latencies, 99)),
+                'max_rss_mb': server.max_rss_mb()
+            }
+        }
+    finally:
+        server.close()
+
+
+def bench_steps(args):
+    ufo_env = {'FAKE_UFO_LINES': args.step_lines, 'FAKE_UFO_INTERVAL': args.step_interval}
+    server = Server(args, ufo_env)
+    try:
+        started = time.perf_counter()
+        [(events, _)] = asyncio.run(gather_sse(server.port, '/api/chat_stream', [chat_payload(args.steps)]))
+        run = time.perf_counter() - started
+        durations, first_output = [], []
+        step_started = seen_output = None
+        for at, event in events:
+            if event['type'] == 'assistant_response':
+                step_started, seen_output = at, False
+            elif event['type'] == 'ufo_output' and step_started is not None and not seen_output:
+                seen_output = True
+                first_output.append(at - step_started)
+            elif event['type'] == 'eva2_conclusion' and step_started is not None:
+                durations.append(at - step_started)
+                step_started = None
+        scripted = args.step_lines * args.step_interval
+        return {
+            'params': {'steps': args.steps, 'completed_steps': len(durations), 'scripted_step_ms': ms(scripted),
+                       'ufo_workers': args.ufo_workers},
+            'metrics': {
+                'run_ms': ms(run),
+                'step_p50_ms': ms(percentile(durations, 50)),
+                'step_p95_ms': ms(percentile(durations, 95)),
+                'step_overhead_p50_ms': ms(percentile(durations, 50) - scripted) if durations else None,
+                'first_output_p50_ms': ms(percentile(first_output, 50)),
+                'max_rss_mb': server.max_rss_mb()
+            }
+        }
+    finally:
+        server.close()
+
+
+def document_payload(size):
+    from PIL import Image
+    pixels = bytes(random.Random(1).getrandbits(8) for _ in range(size * size * 3))
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (size, size), pixels).save(buffer, 'PNG')
+    return {'message': 'Read this document', 'systemPrompt': 'Extract the text.',
+            'file': 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()}
+
+
+def bench_document(args):
+    server = Server(args, {})
+    try:
+        payload = document_payload(args.image_size)
+        started = time.perf_counter()
+        streams = asyncio.run(gather_sse(server.port, '/api/analyze_document', [payload] * args.documents))
+        wall = time.perf_counter() - started
+        first_chunk, totals, chunks = [], [], 0
+        for events, _ in streams:
+            stream_chunks = [at for at, event in events if event['type'] == 'message_chunk']
+            chunks += len(stream_chunks)
+            if stream_chunks:
+                first_chunk.append(stream_chunks[0] - started)
+            if events:
+                totals.append(events[-1][0] - started)
+        return {
+            'params': {'documents': args.documents, 'image_size': args.image_size, 'tokens': args.tokens,
+                       'ttft': args.ttft, 'tokens_per_sec': args.tokens_per_sec, 'chunks': chunks},
+            'metrics': {
+                'first_chunk_p50_ms': ms(percentile(first_chunk, 50)),
+                'total_p50_ms': ms(percentile(totals, 50)),
+                'chunks_per_sec': round(chunks / wall, 1),
+                'max_rss_mb': server.max_rss_mb()
+            }
+        }
+    finally:
+        server.close()
+
+
+def synthetic_projects(count, steps=5):
+    return [{
+        'name': f'Project {i}',
+        'description': 'Synthetic benchmark project',
+        'system_prompt': 'x' * 2000,
+        'use_custom_prompt': True,
+        'steps': [{'instructions': f'Step {s + 1} of project {i}'} for s in range(steps)]
+    } for i in range(count)]
+
+
+def request(url, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else None
+    started = time.perf_counter()
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req, timeout=120) as response:
+        body = response.read()
+    return time.perf_counter() - started, len(body)
+
+
+def bench_crud(args, count):
+    server = Server(args, {}, synthetic_projects(count))
+    try:
+        rng = random.Random(count)
+        listed = [request(server.url('/api/projects')) for _ in range(args.crud_repeats)]
+        updated = [request(server.url('/api/projects'), {**synthetic_projects(1)[0], 'name': f'Project {rng.randrange(count)}'})[0]
+                   for _ in range(args.crud_repeats)]
+        created = [request(server.url('/api/projects'), {**synthetic_projects(1)[0], 'name': f'New project {i}'})[0]
+                   for i in range(args.crud_repeats)]
+        return {
+            'params': {'projects': count, 'list_bytes': listed[0][1]},
+            'metrics': {
+                'startup_ms': server.startup_ms,
+                'list_p50_ms': ms(statistics.median(t for t, _ in listed)),
+                'update_p50_ms': ms(statistics.median(updated)),
+                'create_p50_ms': ms(statistics.median(created)),
+                'max_rss_mb': server.max_rss_mb()
+            }
+        }
+    finally:
+        server.close()
+
+
+# --- Results ---
+
+def flatten(results, prefix=''):
+    """{'crud.1000.list_p50_ms': value, ...} for every metric"""
+    flat = {}
+    for key, value in results.items():
+        if key == 'metrics':
+            flat.update({f'{prefix}{name}': v for name, v in value.items() if v is not None})
+        elif isinstance(value, dict) and key != 'params':
+            flat.update(flatten(value, f'{prefix}{key}.'))
+    return flat
+
+
+def compare(current, baseline, tolerance, floor):
+    """Print every shared metric with its change; return the regressions (worse
+    by more than `tolerance`, relative, and more than `floor`, in the metric's unit)"""
+    regressions = []
+    now, before = flatten(current['results']), flatten(baseline['results'])
+    for name in sorted(set(now) & set(before)):
+        old, new = before[name], now[name]
+        if not old:
+            continue
+        change = (new - old) / abs(old)
+        if name.endswith('_per_sec'):
+            worse = change < -tolerance
+        elif name.endswith(('_ms', '_mb')):
+            worse = change > tolerance and new - old > floor
+        else:
+            worse = False
+        print(f"  {name:40s} {old:12.2f} -> {new:12.2f}  {change:+7.1%}{'  REGRESSION' if worse else ''}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--server', choices=('threaded', 'asgi'), default='threaded')
+    parser.add_argument('--ufo-workers', type=int, default=0, help='Warm UFO2 workers (0: a process per step)')
+    parser.add_argument('--streams', type=int, default=8)
+    parser.add_argument('--lines', type=int, default=500, help='UFO2 lines per stream (sse)')
+    parser.add_argument('--interval', type=float, default=0.0, help='Seconds between UFO2 lines (sse)')
+    parser.add_argument('--line-bytes', type=int, default=120)
+    parser.add_argument('--steps', type=int, default=5)
+    parser.add_argument('--step-lines', type=int, default=20)
+    parser.add_argument('--step-interval', type=float, default=0.05)
+    parser.add_argument('--documents', type=int, default=4)
+    parser.add_argument('--image-size', type=int, default=512, help='Pixels per side of the test document')
+    parser.add_argument('--tokens', type=int, default=400)
+    parser.add_argument('--ttft', type=float, default=0.3)
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0)
+    parser.add_argument('--rpm', type=int, default=6000,
+                        help="Gemini client request quota (the fake has none; pass your tier's rpm to include throttling)")
+    parser.add_argument('--projects', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--crud-repeats', type=int, default=20)
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/suite-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed relative regression')
+    parser.add_argument('--floor', type=float, default=5.0,
+                        help='Latency/memory changes below this many ms/MB are noise, never regressions')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(json.loads(args.serve))
+        return
+
+    results = {}
+    for scenario in args.scenarios:
+        started = time.perf_counter()
+        if scenario == 'crud':
+            results['crud'] = {str(count): bench_crud(args, count) for count in args.projects}
+        else:
+            results[scenario] = globals()[f'bench_{scenario}'](args)
+        print(f"{scenario} ({time.perf_counter() - started:.1f}s)")
+        for name, value in flatten({scenario: results[scenario]}).items():
+            print(f"  {name:40s} {value}")
+
+    report = {
+        'suite': 'eva-offline',
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'args': {k: v for k, v in vars(args).items() if k not in ('serve', 'output', 'compare')},
+        'results': results
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"suite-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=4)
+        f.write('\n')
+    print(f"results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"compared with {args.compare} ({baseline.get('created')}), tolerance {args.tolerance:.0%}:")
+        # Scenario selection and comparison settings do not affect the figures
+        changed = sorted(k for k in report['args'] if k not in ('scenarios', 'projects', 'tolerance', 'floor')
+                         and baseline.get('args', {}).get(k) != report['args'][k])
+        if changed:
+            print(f"  note: run with different settings ({', '.join(changed)}); differences may not be regressions")
+        regressions = compare(report, baseline, args.tolerance, args.floor)
+        if regressions:
+            raise SystemExit(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
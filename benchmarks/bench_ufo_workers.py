@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Per-step dispatch latency: cold `python -m ufo` spawn vs warm UFO2 workers
+
+Runs the same steps through UFOMessenger against the fake UFO2 in
+benchmarks/fake_ufo, once spawning a fresh interpreter per step and once through
+a warm UFOWorkerPool. FAKE_UFO_IMPORT_COST stands in for UFO2's import graph and
+config loading. Dispatch latency is the time from send_command() to the first
+line of UFO2 output.
+
+    python benchmarks/bench_ufo_workers.py --steps 10 --import-cost 1.5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+import config
+from ufo_messenger import UFOMessenger
+from ufo_pool import UFOWorkerPool
+
+
+def run_steps(messenger, steps):
+    dispatch, total = [], []
+    for i in range(steps):
+        started = time.perf_counter()
+        first = None
+        for line in messenger.send_command(f'benchmark step {i}'):
+            if first is None and line:
+                first = time.perf_counter() - started
+        dispatch.append(first)
+        total.append(time.perf_counter() - started)
+    return dispatch, total
+
+
+def report(name, dispatch, total):
+    print(f"{name:5s} dispatch p50={statistics.median(dispatch) * 1000:8.1f}ms "
+          f"max={max(dispatch) * 1000:8.1f}ms  step p50={statistics.median(total) * 1000:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--import-cost', type=float, default=1.5, help='Simulated UFO2 start-up seconds')
+    parser.add_argument('--lines', type=int, default=5)
+    args = parser.parse_args()
+
+    fake_ufo = os.path.join(REPO, 'benchmarks', 'fake_ufo')
+    config.PATHS['ufo2'] = fake_ufo
+    config.PATHS['ufo2_python'] = sys.executable
+    os.environ['FAKE_UFO_IMPORT_COST'] = str(args.import_cost)
+    os.environ['FAKE_UFO_LINES'] = str(args.lines)
+    os.environ['FAKE_UFO_INTERVAL'] = '0'
+
+    cold = UFOMessenger()
+    report('cold', *run_steps(cold, args.steps))
+
+    env = cold._build_env()
+    env['PYTHONUNBUFFERED'] = '1'
+    env['EVA_WORKER_PRELOAD'] = ','.join(config.UFO_WORKERS['preload'])
+    env['EVA_WORKER_FRESH'] = ','.join(config.UFO_WORKERS['fresh_modules'])
+    pool = UFOWorkerPool(sys.executable, fake_ufo, env, size=1, max_tasks=args.steps + 1).start()
+    deadline = time.time() + args.import_cost + 30
+    while pool.stats()['idle'] < 1 and time.time() < deadline:
+        time.sleep(0.05)
+
+    warm = UFOMessenger(pool=pool)
+    report('warm', *run_steps(warm, args.steps))
+    print(f"pool  {pool.stats()}")
+    pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+# Fake UFO2 package for offline benchmarks - see __main__.py
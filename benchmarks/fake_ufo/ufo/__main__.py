@@ -0,0 +1,5 @@
+# Mirrors UFO2's entry point: python -m ufo -> ufo.ufo.main()
+from ufo import ufo
+
+if __name__ == '__main__':
+    ufo.main()
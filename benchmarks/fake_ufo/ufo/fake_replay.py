@@ -0,0 +1,10 @@
+# Fake replay executor for offline benchmarks (EVA_REPLAY_EXECUTOR=ufo.fake_replay:execute)
+#   FAKE_REPLAY_ACTION_MS  milliseconds per replayed action (default 50)
+#   FAKE_REPLAY_FAIL       action name that raises, as a control that is no longer there would
+import os
+import time
+
+def execute(action):
+    if action['action'] == os.environ.get('FAKE_REPLAY_FAIL'):
+        raise LookupError(f"control not found: {action.get('control')}")
+    time.sleep(float(os.environ.get('FAKE_REPLAY_ACTION_MS', 50)) / 1000)
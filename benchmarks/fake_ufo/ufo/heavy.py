@@ -0,0 +1,6 @@
+# Stands in for UFO2's import graph and config loading (agents, automator, LLM clients).
+# FAKE_UFO_IMPORT_COST seconds are spent once per interpreter, when this is first imported.
+import os
+import time
+
+time.sleep(float(os.environ.get('FAKE_UFO_IMPORT_COST', 0)))
@@ -0,0 +1,59 @@
+# Fake UFO2 main module for offline benchmarks
+#
+# Accepts the same command line as the real thing (python -m ufo --task eva_task -r "...")
+# and prints UFO2-shaped output. Behaviour is driven by environment variables:
+#   FAKE_UFO_LINES       output lines per step (default 20)
+#   FAKE_UFO_INTERVAL    seconds between lines (default 0.05)
+#   FAKE_UFO_LINE_BYTES  padded length of each line (default 80)
+#   FAKE_UFO_OUTCOME     "succeeded" or "failed" (default succeeded)
+#   FAKE_UFO_FAIL_ON     requests containing this text fail regardless of FAKE_UFO_OUTCOME
+#   FAKE_UFO_ACTIONS     UI actions reported per step, as UFO2's "Selected item"/"Action applied" lines (default 0)
+#   FAKE_UFO_TEARDOWN    seconds spent after the session cost line (default 0)
+#   FAKE_UFO_IMPORT_COST one-off start-up cost per interpreter (see heavy.py, default 0)
+# Every progress line carries ts=<epoch seconds> so clients can measure event latency.
+import argparse
+import os
+import sys
+import time
+
+from ufo import heavy  # noqa: F401 - simulated import/config cost
+
+def main():
+    parser = argparse.ArgumentParser(prog='ufo')
+    parser.add_argument('--task', default='eva_task')
+    parser.add_argument('-r', '--request', default='')
+    args, _ = parser.parse_known_args()
+
+    lines = int(os.environ.get('FAKE_UFO_LINES', 20))
+    interval = float(os.environ.get('FAKE_UFO_INTERVAL', 0.05))
+    line_bytes = int(os.environ.get('FAKE_UFO_LINE_BYTES', 80))
+    outcome = os.environ.get('FAKE_UFO_OUTCOME', 'succeeded')
+    fail_on = os.environ.get('FAKE_UFO_FAIL_ON')
+    if fail_on and fail_on in args.request:
+        outcome = 'failed'
+    teardown = float(os.environ.get('FAKE_UFO_TEARDOWN', 0))
+    actions = int(os.environ.get('FAKE_UFO_ACTIONS', 0))
+
+    out = sys.stdout
+    out.write(f"Welcome to use UFO🛸, task: {args.task}\n")
+    out.write(f"Request: {args.request}\n")
+    out.flush()
+    for i in range(lines):
+        if interval:
+            time.sleep(interval)
+        line = f"Round {i}: ts={time.time():.6f} "
+        out.write(line.ljust(line_bytes, '.') + "\n")
+        out.flush()
+    for i in range(actions):
+        out.write(f"Selected item🕹️: Button {i}, Label: {i + 1}\n")
+        out.write("Action applied⚒️: click_input(button='left', double=False)\n")
+        out.flush()
+
+    out.write("Observations👀: The requested window is open and focused.\n")
+    out.write("Status📊: FINISH\n")
+    out.write("EVALUATION_AGENT: evaluating the completed task\n")
+    out.write(f"Evaluation result🧐: the task has {outcome}.\n")
+    out.write("Total request cost of the session: $0.0000\n")
+    out.flush()
+    if teardown:
+        time.sleep(teardown)
@@ -0,0 +1,181 @@
+# Eva Caption Cache - reuse OmniParser icon captions for icons seen before
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from screen_diff import dhash, hamming
+
+
+class CaptionCache:
+    """Captions of cropped icons, keyed two ways:
+
+    exact       SHA-256 of the crop pixels (+ caption prompt)
+    perceptual  64-bit dHash of the crop; a hash within `phash_distance` bits
+                of a stored one reuses its caption (0 = equal hashes only).
+                Lookup splits the hash into phash_distance + 1 bands; two
+                hashes that close must agree on at least one whole band.
+
+    At most `max_items` captions are kept (least recently used go first).
+    With `path` set the cache is loaded at start and saved (atomically) at
+    most every `save_interval` seconds after it changes, and on save().
+    """
+
+    def __init__(self, max_items=4096, path=None, phash_distance=0, save_interval=5.0):
+        self.max_items = max_items
+        self.path = path
+        self.phash_distance = phash_distance
+        self.save_interval = save_interval
+        self._entries = OrderedDict()  # exact key -> [caption, dHash, prompt]
+        self._bands = {}  # (band index, band value) -> set of exact keys
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._counts = {'crops': 0, 'exact_hits': 0, 'phash_hits': 0, 'misses': 0, 'model_calls': 0}
+        if path:
+            self._load()
+
+    def _band_keys(self, icon_hash):
+        bands = self.phash_distance + 1
+        width = -(-64 // bands)
+        mask = (1 << width) - 1
+        return [(i, (icon_hash >> (i * width)) & mask) for i in range(bands)]
+
+    @staticmethod
+    def exact_key(crop, prompt=None):
+        digest = hashlib.sha256(str(crop.shape).encode())
+        digest.update(crop.tobytes())
+        digest.update(str(prompt).encode())
+        return digest.hexdigest()
+
+    def lookup(self, key, icon_hash, prompt=None):
+        """Cached caption or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._counts['exact_hits'] += 1
+                return entry[0]
+            best = None
+            for band in self._band_keys(icon_hash):
+                for other in self._bands.get(band, ()):
+                    caption, other_hash, other_prompt = self._entries[other]
+                    distance = hamming(icon_hash, other_hash)
+                    if other_prompt == prompt and distance <= self.phash_distance and (best is None or distance < best[0]):
+                        best = (distance, other, caption)
+            if best is None:
+                self._counts['misses'] += 1
+                return None
+            self._entries.move_to_end(best[1])
+            self._counts['phash_hits'] += 1
+            return best[2]
+
+    def store(self, key, icon_hash, caption, prompt=None):
+        with self._lock:
+            self._insert(key, [caption, icon_hash, prompt])
+            self._dirty = True
+
+    def _insert(self, key, entry):
+        if key in self._entries:
+            self._unindex(key)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        for band in self._band_keys(entry[1]):
+            self._bands.setdefault(band, set()).add(key)
+        while len(self._entries) > self.max_items:
+            self._unindex(next(iter(self._entries)))
+            self._entries.popitem(last=False)
+
+    def _unindex(self, key):
+        for band in self._band_keys(self._entries[key][1]):
+            keys = self._bands.get(band)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._bands[band]
+
+    def wrap(self, get_parsed_content_icon):
+        """Drop-in replacement for util.utils.get_parsed_content_icon that only
+        sends icons missing from the cache to the caption model"""
+        def cached_get_parsed_content_icon(filtered_boxes, starting_idx, image_source, caption_model_processor,
+                                           *args, **kwargs):
+            from PIL import Image
+            prompt = kwargs.get('prompt', args[0] if args else None)
+            boxes = filtered_boxes[starting_idx:] if starting_idx else filtered_boxes
+            height, width = image_source.shape[:2]
+            captions, missing, repeats = [], [], {}  # missing: (slot, box, key, dHash); repeats: key -> more slots
+            for coord in boxes:
+                # Same crop as OmniParser; boxes it cannot crop get no caption there either
+                xmin, xmax = int(coord[0] * width), int(coord[2] * width)
+                ymin, ymax = int(coord[1] * height), int(coord[3] * height)
+                crop = image_source[ymin:ymax, xmin:xmax, :]
+                if crop.size == 0:
+                    continue
+                key = self.exact_key(crop, prompt)
+                icon_hash = dhash(Image.fromarray(crop))
+                self._counts['crops'] += 1
+                if key in repeats:  # Same unseen icon twice on one screen: caption it once
+                    repeats[key].append(len(captions))
+                    captions.append(None)
+                    continue
+                caption = self.lookup(key, icon_hash, prompt)
+                if caption is None:
+                    missing.append((len(captions), coord, key, icon_hash))
+                    repeats[key] = []
+                captions.append(caption)
+            if missing:
+                self._counts['model_calls'] += 1
+                generated = get_parsed_content_icon([coord for _, coord, _, _ in missing], 0, image_source,
+                                                    caption_model_processor, *args, **kwargs)
+                for (slot, _, key, icon_hash), caption in zip(missing, generated):
+                    captions[slot] = caption
+                    for repeat in repeats[key]:
+                        captions[repeat] = caption
+                    self.store(key, icon_hash, caption, prompt)
+                self.save_if_due()
+            return captions
+        cached_get_parsed_content_icon.__wrapped__ = get_parsed_content_icon
+        return cached_get_parsed_content_icon
+
+    def save_if_due(self):
+        if self.path and self._dirty and time.monotonic() - self._saved_at >= self.save_interval:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            entries = [[key, *entry] for key, entry in self._entries.items()]
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.captions-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': 1, 'entries': entries}, f)
+            os.replace(temp_path, self.path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return  # No cache yet, or unreadable: start empty
+        for key, caption, icon_hash, prompt in data.get('entries', []):
+            self._insert(key, [caption, icon_hash, prompt])
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counts['exact_hits'] + self._counts['phash_hits'] + self._counts['misses']
+            hits = self._counts['exact_hits'] + self._counts['phash_hits']
+            return {**self._counts, 'items': len(self._entries),
+                    'hit_rate': round(hits / lookups, 3) if lookups else 0.0}
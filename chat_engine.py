@@ -1,23 +1,85 @@
-import google.generativeai as genai
+import asyncio
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
 from ufo_messenger import UFOMessenger
+from stream_writer import CoalescingWriter
+from ufo_output_parser import UFOOutputParser
+from project_store import from_config as project_store_from_config
+from run_store import FINISHED, RunStore
+from action_trace import extract_actions, fingerprint, fingerprint_distance
+from metrics import MODEL, MODEL_FIRST_TOKEN, RUN, STEP, Span
 import base64
-import json
-from config import LLM, SYSTEM_PROMPT
-import pyautogui
-from PIL import Image
+import hashlib
+import sys
+import time
+from config import BATCH, GEMINI_CLIENT, LLM, PIPELINE, SCREENSHOT, STREAM, SYSTEM_PROMPT, TRACES, UPLOADS
+from gemini_client import from_config as gemini_client_from_config
+from screen_capture import Frame, ScreenshotRing, capture_from_config, encoder_pool
+from screen_diff import AnalysisReuse, ScreenChangeDetector
+from result_cache import content_key
+from image_prep import hash_file, normalize_image, prepare_image, settings_key
+from document_pages import PageError, iter_pages
 import io
-import os
+
+# Prepares the next step's UFO2 interpreter while the current step runs (PIPELINE)
+_prepare_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='eva-prepare')
+
+# Shortest generation a tokens/sec figure is computed over
+MIN_RATE_SECONDS = 0.05
+
+# What UFOMessenger prints when a worker did not finish a replay cleanly
+REPLAY_FAILURES = ("UFO2 Error", "An unexpected error occurred", "timed out")
+
+
+class _Run:
+    """What a workflow run carries from step to step (both step drivers)"""
+
+    def __init__(self, run_id):
+        self.run_id = run_id  # None when runs are not recorded
+        self.pending = None  # Future of the UFO2 interpreter being prepared for the next step
+        self.gaps = []  # Inter-step gaps, see _record_gaps
+        self.step_ended = None
+        self.outcome = 'interrupted'
+        self.unavailable = 0  # Steps UFO2 could not run
+        self.span = Span(RUN)
+
+    def completed(self):
+        """Every step was attempted: succeeded, unless UFO2 could not run some of them"""
+        self.outcome = 'unavailable' if self.unavailable else 'succeeded'
+
 
 class ChatEngine:
-    def __init__(self, prompt_logger=None):
-        self.messenger = UFOMessenger()
+    def __init__(self, prompt_logger=None, ufo_pool=None, project_store=None, model=None, session_id=None, capture=None, document_cache=None, run_store=None, trace_store=None):
+        self.messenger = UFOMessenger(pool=ufo_pool)
+        self.project_store = project_store or project_store_from_config()
         self.prompt_logger = prompt_logger
-        self.screenshot_history = []  # Keep track of multiple screenshots
-        self.clear_all_screenshots() # Clear any old screenshots on startup
-        
-        # Configure Gemini
+        self.session_id = session_id
+        self.document_cache = document_cache  # result_cache.ResultCache shared across sessions, or None
+        self.run_store = run_store  # run_store.RunStore shared across sessions, or None (runs are not recorded)
+        self.trace_store = trace_store  # action_trace.TraceStore shared across sessions, or None (TRACES off)
+        self.last_generation_stats = None
+        self.last_pipeline_stats = None
+        self.capture = capture or capture_from_config(SCREENSHOT)
+        self.screenshots = ScreenshotRing(SCREENSHOT['history'])  # Frames live in memory, never on disk
+        self.screen_diff = ScreenChangeDetector(tuple(SCREENSHOT['diff_grid']), SCREENSHOT['diff_threshold'])
+        self.screen_analysis = AnalysisReuse(self.screen_diff)
+
+        # Configure Gemini (sessions share one model instead of building their own)
+        self.model = model or self.create_model()
+
+    @staticmethod
+    def create_model():
+        """The configured model behind the rate-limited, retrying Gemini client.
+        The model (and the genai import) is built on the first call, not here."""
+        return gemini_client_from_config(ChatEngine._build_model, GEMINI_CLIENT, LLM)
+
+    @staticmethod
+    def _build_model():
+        if LLM.get('provider') == 'fake':
+            from fake_model import FakeModel
+            return FakeModel()
+        import google.generativeai as genai  # Slow to import; only needed once a request reaches Gemini
         genai.configure(api_key=LLM['api_key'])
-        self.model = genai.GenerativeModel(
+        return genai.GenerativeModel(
             model_name=LLM['model'],  # Use model from config.py as single source of truth
             generation_config={
                 'temperature': LLM['temperature'],
@@ -25,67 +87,56 @@ class ChatEngine:
             }
         )
 
+    def close(self):
+        """Release per-session resources (called when a session is evicted)"""
+        self.clear_all_screenshots()
+
     def log(self, prompt_type, content, metadata=None):
         if self.prompt_logger:
             self.prompt_logger(prompt_type, content, metadata)
 
     def take_screenshot(self):
-        """Take a screenshot and return as PIL Image"""
-        # Keep only the last 2 screenshots to avoid accumulation
-        # Delete the second-to-last screenshot if we have 2 or more
-        if len(self.screenshot_history) >= 2:
-            second_to_last = self.screenshot_history[-2]
-            if os.path.exists(second_to_last):
-                try:
-                    os.remove(second_to_last)
-                    self.log('SCREENSHOT_CLEANUP', f'Removed old screenshot: {second_to_last}')
-                except Exception as e:
-                    self.log('SCREENSHOT_CLEANUP_ERROR', f'Failed to remove {second_to_last}: {e}')
-            
+        """Capture the screen into the in-memory ring and return it as a PIL Image.
+        frame.change records what moved since the last capture. Nothing is
+        encoded here: consumers that need bytes call frame.encode()."""
         try:
-            screenshot = pyautogui.screenshot()
-            # Use timestamp to make filenames unique
-            import time
-            temp_path = f"temp_screenshot_{int(time.time())}.png"
-            screenshot.save(temp_path)
-            self.screenshot_history.append(temp_path)
-            # Keep only last 2 screenshots in history
-            if len(self.screenshot_history) > 2:
-                self.screenshot_history = self.screenshot_history[-2:]
-            return screenshot
+            frame = Frame(self.capture.grab(), SCREENSHOT['format'], SCREENSHOT['quality'],
+                          SCREENSHOT['max_edge'], pool=encoder_pool(SCREENSHOT['encode_workers']))
         except Exception as e:
             self.log('SCREENSHOT_ERROR', str(e))
             return None
+        frame.change = self.screen_diff.observe(frame.image)
+        self.screenshots.add(frame)
+        return frame.image
+
+    def latest_screenshot(self):
+        """Most recent Frame (call .encode() for bytes), or None"""
+        return self.screenshots.latest()
+
+    def analyze_screen(self, analyze):
+        """Run analyze(frame) on the latest screenshot, or return the previous
+        result if the screen has not changed since it was computed"""
+        frame = self.latest_screenshot()
+        if frame is None:
+            return None
+        return self.screen_analysis.analyze(frame, analyze)
+
+    def screen_stats(self):
+        frame = self.latest_screenshot()
+        stats = self.screen_analysis.stats()
+        stats['last_change'] = frame.change.to_dict() if frame and frame.change else None
+        return stats
 
     def clear_screenshot(self):
         """Clear only the oldest screenshot, keeping the most recent for experience saver"""
-        if len(self.screenshot_history) > 1:
-            # Remove oldest screenshot, keep the most recent
-            oldest = self.screenshot_history[0]
-            if os.path.exists(oldest):
-                try:
-                    os.remove(oldest)
-                    self.screenshot_history.remove(oldest)
-                    self.log('SCREENSHOT_CLEANUP', f'Cleared oldest screenshot: {oldest}')
-                except Exception as e:
-                    self.log('SCREENSHOT_CLEANUP_ERROR', f'Failed to clear {oldest}: {e}')
-    
+        if len(self.screenshots) > 1:
+            self.screenshots.drop_oldest()
+            self.log('SCREENSHOT_CLEANUP', 'Cleared oldest screenshot')
+
     def clear_all_screenshots(self):
-        """Clear all screenshots (used on startup)"""
-        for screenshot_path in self.screenshot_history:
-            if os.path.exists(screenshot_path):
-                try:
-                    os.remove(screenshot_path)
-                except:
-                    pass
-        self.screenshot_history = []
-        # Also clean up any orphaned temp screenshots
-        import glob
-        for temp_file in glob.glob("temp_screenshot*.png"):
-            try:
-                os.remove(temp_file)
-            except:
-                pass
+        self.screenshots.clear()
+        self.screen_diff.reset()
+        self.screen_analysis.reset()
 
     def _extract_command_from_response(self, data):
         if isinstance(data, str):
@@ -96,85 +147,616 @@ class ChatEngine:
             return self._extract_command_from_response(data.get('command', ''))
         return ""
 
-    def process_streaming(self, message, project, chat_history):
+    def _load_project(self, project):
         # --- Direct Project Reload (Debugging Step) ---
         project_name_from_frontend = project.get('name') if project else None
         reloaded_project = None
         if project_name_from_frontend:
-            with open('projects.json', 'r') as f:
-                all_projects = json.load(f)
-            for p in all_projects:
-                if p.get('name') == project_name_from_frontend:
-                    reloaded_project = p
-                    break
-        current_project_data = reloaded_project or project
+            # Indexed and refreshed from disk only when projects.json changes
+            reloaded_project = self.project_store.get(project_name_from_frontend)
         # --- End of Direct Project Reload ---
+        return reloaded_project or project
+
+    def _new_writer(self):
+        """Coalesces UFO2 lines into SSE frames (see STREAM in config.py)"""
+        return CoalescingWriter(STREAM['flush_interval'], STREAM['flush_bytes'])
+
+    def _step_started(self, i, command):
+        """Events announcing a step, before any UFO2 output"""
+        events = [{'type': 'assistant_response', 'content': {'thinking': f'Executing step {i+1}', 'working_on_step': f'Step {i+1}', 'instructions_to_eva2': command}}]
+        if self.messenger.available:
+            self.log('UFO2_COMMAND', command)
+            events.append({'type': 'debug_output', 'content': f"Sending to EVA2: {command}"})
+        else:
+            self.log('UFO2_UNAVAILABLE', 'UFO2 is not available.')
+        return events
+
+    def _step_output(self, run, writer, parser, text):
+        """Events for one chunk of UFO2 output: coalesced frames, then whatever the parser recognised"""
+        if text and run.step_ended is not None:
+            run.gaps.append(time.perf_counter() - run.step_ended)
+            run.step_ended = None
+        frame = writer.write(text)
+        parsed = parser.feed(text)
+        if (parsed or parser.completed) and frame is None:
+            # Flush early so the output precedes the event it explains
+            frame = writer.flush()
+        events = [{'type': 'ufo_output', 'content': frame}] if frame else []
+        return events + parsed
+
+    @staticmethod
+    def _commands(steps, start):
+        """(index, instructions) of the steps from `start` that have any"""
+        for i, step in enumerate(steps[start:], start):
+            command = step.get('instructions')
+            if command:
+                yield i, command
+
+    def _step_available(self, run, i):
+        """False (and the step recorded as unavailable) if UFO2 cannot run it"""
+        if self.messenger.available:
+            return True
+        run.unavailable += 1
+        self._checkpoint_unavailable(run.run_id, i)
+        return False
+
+    def _step_begin(self, run, project, steps, i, command):
+        """Once the step has its interpreter: start preparing the next step's,
+        checkpoint this one and look for a trace to replay. Returns
+        (started, trace or None, fingerprint of the screen before or None)"""
+        run.pending = self._prepare_next(steps, i)
+        started = self._checkpoint_started(run.run_id, i, command)
+        trace, before = self._trace_for(project, command)
+        return started, trace, before
+
+    def _replay_started(self, i, trace):
+        return [{'type': 'debug_output', 'content': f"Replaying {len(trace['actions'])} recorded actions for step {i+1}"}]
+
+    def _command_finished(self, run, project, i, command, before, writer, parser, started):
+        """Evaluate, checkpoint and (if it passed) record a step UFO2 planned.
+        Returns (events, failed); a failed step ends the run."""
+        events, failed = self._step_finished(i, writer, parser)
+        self._checkpoint_finished(run.run_id, i, writer, parser, failed, started)
+        self._record_trace(project, command, before, writer, parser, failed)
+        run.step_ended = time.perf_counter()
+        if failed:
+            run.outcome = 'failed'
+        return events, failed
+
+    def _step_finished(self, i, writer, parser):
+        """Evaluate a finished step. Returns (events, failed)"""
+        frame = writer.flush()
+        events, failed = parser.finish()
+        if frame:
+            events.insert(0, {'type': 'ufo_output', 'content': frame})
+
+        stats = writer.stats()
+        self.log('UFO2_STREAM_STATS', f"Step {i+1}: {stats['lines']} lines in {stats['frames']} frames, {stats['bytes']} bytes", stats)
+        if parser.cost is not None:
+            self.log('UFO2_COST', f"Step {i+1}: ${parser.cost}")
+        if parser.errored and not parser.evaluated:
+            self.log('UFO2_ERROR', writer.getvalue())
+        return events, failed
+
+    def _prepare_next(self, steps, i):
+        """Start getting a UFO2 interpreter ready for the next runnable step after
+        step i. Returns a Future of messenger.prepare(), or None."""
+        if not PIPELINE['enabled'] or not self.messenger.can_prepare() or \
+                not any(step.get('instructions') for step in steps[i + 1:]):
+            return None
+        return _prepare_pool.submit(self.messenger.prepare)
+
+    def _take_prepared(self, pending):
+        """The interpreter prepared for this step (waiting for it to finish starting
+        is usually sooner than a cold start), or None. After PIPELINE["prepare_wait"]
+        the step spawns its own and the late interpreter is discarded when ready."""
+        if pending is None:
+            return None
+        try:
+            return pending.result(timeout=PIPELINE['prepare_wait'])
+        except FutureTimeout:
+            self._prepare_timed_out(pending)
+        except Exception as e:
+            self.log('PIPELINE_ERROR', str(e))
+        return None
+
+    async def _take_prepared_async(self, pending):
+        """asyncio twin of _take_prepared"""
+        if pending is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(pending)), PIPELINE['prepare_wait'])
+        except asyncio.TimeoutError:
+            self._prepare_timed_out(pending)
+        except Exception as e:
+            self.log('PIPELINE_ERROR', str(e))
+        return None
+
+    def _prepare_timed_out(self, pending):
+        self.log('PIPELINE_ERROR', f"Prepared UFO2 interpreter not ready after {PIPELINE['prepare_wait']}s, starting one for this step")
+        self._discard_prepared(pending)
+
+    def _discard_prepared(self, pending):
+        """The step this was prepared for will not run (a step failed or the client left)"""
+        if pending is None or pending.cancel():
+            return
+        pending.add_done_callback(lambda f: f.exception() is None and self.messenger.discard(f.result()))
+
+    def _record_gaps(self, gaps):
+        """Inter-step gaps: end of one step to the first UFO2 output of the next"""
+        if not gaps:
+            return
+        self.last_pipeline_stats = {
+            'pipelined': PIPELINE['enabled'],
+            'gaps_ms': [round(gap * 1000, 1) for gap in gaps],
+            'mean_gap_ms': round(sum(gaps) / len(gaps) * 1000, 1)
+        }
+        self.log('PIPELINE_STATS', f"{len(gaps)} inter-step gaps, mean {self.last_pipeline_stats['mean_gap_ms']}ms", self.last_pipeline_stats)
+
+    def process_streaming(self, message, project, chat_history):
+        current_project_data = self._load_project(project)
 
         if not current_project_data or not current_project_data.get('steps'):
             yield {'type': 'error', 'content': 'No project or steps found.'}
             return
 
-        steps = current_project_data.get('steps', [])
+        yield from self._run_steps(current_project_data)
 
-        for i, step in enumerate(steps):
-            command = step.get('instructions')
-            if not command:
-                continue
+    def resume_streaming(self, run_id, from_step=None):
+        """Run a recorded run again from step `from_step` (default: its first step
+        that did not succeed). Earlier steps are not re-executed: their recorded
+        results are copied into the new run and sent to the client."""
+        project, source, start, error = self._plan_resume(run_id, from_step)
+        if error:
+            yield {'type': 'error', 'content': error}
+            return
+        yield from self._run_steps(project, start, source)
+
+    def _run_steps(self, project, start=0, source=None):
+        steps = project.get('steps', [])
+        run, restored = self._begin_run(project, steps, start, source)
+        yield from restored
 
-            yield {'type': 'assistant_response', 'content': {'thinking': f'Executing step {i+1}', 'working_on_step': f'Step {i+1}', 'instructions_to_eva2': command}}
-
-            if self.messenger.available:
-                self.log('UFO2_COMMAND', command)
-                yield {'type': 'debug_output', 'content': f"Sending to EVA2: {command}"}
-                
-                full_output = ""
-                line_buffer = ""
-                for char in self.messenger.send_command(command):
-                    yield {'type': 'ufo_output', 'content': char}
-                    full_output += char
-                    line_buffer += char
-                    # Check for newline to process line-based status checks
-                    if char == '\n':
-                        line_buffer = ""
-
-                if "EVALUATION_AGENT" in full_output:
-                    if "succeeded" in full_output.lower():
-                        yield {'type': 'eva2_conclusion', 'content': f"Step {i+1} evaluated as successful."}
-                    else:
-                        yield {'type': 'error', 'content': f"Step {i+1} evaluated as failed."}
+        try:
+            for i, command in self._commands(steps, start):
+                yield from self._step_started(i, command)
+                if not self._step_available(run, i):
+                    continue
+
+                # Take this step's interpreter before preparing the next one, so the
+                # background preparation cannot claim the idle pool worker first
+                worker = self._take_prepared(run.pending) or self.messenger.acquire()
+                try:
+                    started, trace, before = self._step_begin(run, project, steps, i, command)
+                except BaseException:
+                    self.messenger.discard(worker)
+                    raise
+                worker = worker or (self.messenger.prepare() if trace else None)
+                if trace and worker:
+                    yield from self._replay_started(i, trace)
+                    writer, parser = self._new_writer(), UFOOutputParser(i)
+                    for text in self.messenger.replay(trace['actions'], worker, tick=writer.flush_interval):
+                        yield from self._step_output(run, writer, parser, text)
+                    events, replayed = self._replay_finished(run, project, i, command, trace, writer, parser, started)
+                    yield from events
+                    if replayed:
+                        continue
+                    worker = self.messenger.acquire()
+
+                writer, parser = self._new_writer(), UFOOutputParser(i)
+                for text in self.messenger.send_command(command, tick=writer.flush_interval, worker=worker):
+                    yield from self._step_output(run, writer, parser, text)
+                    if parser.completed:
+                        # UFO2 has reported its session cost: the step is over
                         break
-                elif "UFO2 Error" in full_output:
-                    self.log('UFO2_ERROR', full_output)
-                else:
-                    observations = ""
-                    status = ""
-                    if "Observations👀:" in full_output:
-                        observations = full_output.split("Observations👀:")[-1].split("\n")[0].strip()
-                    if "Status📊:" in full_output:
-                        status = full_output.split("Status📊:")[-1].split("\n")[0].strip()
-                    
-                    context_message = f"EVA2 Observation: {observations}\nEVA2 Status: {status}"
-                    yield {'type': 'eva2_context', 'content': context_message}
+
+                events, failed = self._command_finished(run, project, i, command, before, writer, parser, started)
+                yield from events
+                if failed:
+                    break
             else:
-                self.log('UFO2_UNAVAILABLE', 'UFO2 is not available.')
+                run.completed()
+        finally:
+            self._end_run(run)
 
-    def analyze_document_streaming(self, message, file_data, system_prompt):
-        self.log('OCR_PROMPT', system_prompt)
-        self.log('OCR_MESSAGE', message)
-        
+    async def process_streaming_async(self, message, project, chat_history):
+        """asyncio twin of process_streaming for the ASGI server"""
+        current_project_data = await asyncio.to_thread(self._load_project, project)
+
+        if not current_project_data or not current_project_data.get('steps'):
+            yield {'type': 'error', 'content': 'No project or steps found.'}
+            return
+
+        async for event in self._run_steps_async(current_project_data):
+            yield event
+
+    async def resume_streaming_async(self, run_id, from_step=None):
+        """asyncio twin of resume_streaming"""
+        project, source, start, error = await asyncio.to_thread(self._plan_resume, run_id, from_step)
+        if error:
+            yield {'type': 'error', 'content': error}
+            return
+        async for event in self._run_steps_async(project, start, source):
+            yield event
+
+    async def _run_steps_async(self, project, start=0, source=None):
+        """asyncio twin of _run_steps; run store, trace and screenshot work runs on a thread"""
+        steps = project.get('steps', [])
+        run, restored = await asyncio.to_thread(self._begin_run, project, steps, start, source)
+        for event in restored:
+            yield event
+
+        try:
+            for i, command in self._commands(steps, start):
+                for event in self._step_started(i, command):
+                    yield event
+                if not await asyncio.to_thread(self._step_available, run, i):
+                    continue
+
+                worker = await self._take_prepared_async(run.pending) or self.messenger.acquire()
+                try:
+                    started, trace, before = await asyncio.to_thread(self._step_begin, run, project, steps, i, command)
+                except BaseException:
+                    # Also on cancellation: the interpreter must not outlive the step
+                    self.messenger.discard(worker)
+                    raise
+                if trace and not worker:
+                    worker = await asyncio.to_thread(self.messenger.prepare)
+                if trace and worker:
+                    for event in self._replay_started(i, trace):
+                        yield event
+                    writer, parser = self._new_writer(), UFOOutputParser(i)
+                    async for text in self.messenger.replay_async(trace['actions'], worker, tick=writer.flush_interval):
+                        for event in self._step_output(run, writer, parser, text):
+                            yield event
+                    events, replayed = await asyncio.to_thread(self._replay_finished, run, project, i, command,
+                                                               trace, writer, parser, started)
+                    for event in events:
+                        yield event
+                    if replayed:
+                        continue
+                    worker = self.messenger.acquire()
+
+                writer, parser = self._new_writer(), UFOOutputParser(i)
+                async for text in self.messenger.send_command_async(command, tick=writer.flush_interval, worker=worker):
+                    for event in self._step_output(run, writer, parser, text):
+                        yield event
+                    if parser.completed:
+                        # UFO2 has reported its session cost: the step is over
+                        break
+
+                events, failed = await asyncio.to_thread(self._command_finished, run, project, i, command,
+                                                         before, writer, parser, started)
+                for event in events:
+                    yield event
+                if failed:
+                    break
+            else:
+                run.completed()
+        finally:
+            # Shielded: a client that disconnects must not leave the run record open
+            await asyncio.shield(asyncio.to_thread(self._end_run, run))
+
+    def _plan_resume(self, run_id, from_step):
+        """(project, source run, 0-based first step, None) or (None, None, None, error)"""
+        run = self.run_store.get(run_id) if self.run_store else None
+        if run is None:
+            return None, None, None, 'Run not found.'
+        # The project as it is now (its instructions may have been fixed since the
+        # failure), or the commands the run recorded if the project is gone
+        project = self._load_project({'name': run['project']}) if run['project'] else None
+        if not project or not project.get('steps'):
+            project = {'name': run['project'], 'steps': [{'instructions': s['command']} for s in run['steps']]}
+        step = from_step or RunStore.resume_point(run)
+        if step is None:
+            return None, None, None, 'Every step of this run succeeded; pass from_step to run part of it again.'
+        last = min(len(project['steps']), len(run['steps']))
+        if not 1 <= step <= last:
+            return None, None, None, f"from_step must be between 1 and {last}."
+        unfinished = RunStore.resume_point(run)
+        if unfinished is not None and step > unfinished:
+            # Steps before from_step are reused, and step `unfinished` has no result to reuse
+            return None, None, None, f"Step {unfinished} of this run did not finish; from_step can be at most {unfinished}."
+        # Results are reused only for steps whose instructions have not changed since the run
+        for prior in run['steps'][:step - 1]:
+            if prior['command'] != (project['steps'][prior['step'] - 1].get('instructions') or None):
+                self.log('RUN_RESUME', f"Step {prior['step']} changed since run {run_id}; running again from there",
+                         {'run_id': run_id, 'from_step': step, 'changed_step': prior['step']})
+                step = prior['step']
+                break
+        return project, run, step - 1, None
+
+    def _begin_run(self, project, steps, start, source):
+        """Open the run record. Returns (_Run, events for the client), where the
+        events replay the results reused from the source run."""
+        if not self.run_store:
+            return _Run(None), []
+        commands = [step.get('instructions') or None for step in steps]
+        run_id = self.run_store.start(project.get('name'), commands, source['run_id'] if source else None, start + 1)
+        events = [{'type': 'run_started', 'run_id': run_id, 'from_step': start + 1,
+                   'source': source['run_id'] if source else None}]
+        for prior in (source['steps'][:start] if source else []):
+            if not prior.get('command') or prior['status'] not in FINISHED:
+                continue
+            i = prior['step'] - 1
+            self.run_store.step_finished(run_id, i, 'reused', prior.get('output', ''), prior.get('observations', ''),
+                                         prior.get('ufo_status', ''), prior.get('cost'), prior.get('duration_ms'),
+                                         source=prior.get('source') or source['run_id'])
+            events.append({
+                'type': 'step_restored',
+                'content': f"Step {i+1} reused from run {source['run_id']} ({prior['status']}). EVA2 Observation: {prior.get('observations', '')}",
+                'step': i + 1,
+                'status': prior['status'],
+                'observations': prior.get('observations', ''),
+                'ufo_status': prior.get('ufo_status', '')
+            })
+        self.log('RUN_STARTED', f"Run {run_id} from step {start + 1}", {'run_id': run_id, 'source': events[0]['source']})
+        return _Run(run_id), events
+
+    def _checkpoint_started(self, run_id, i, command):
+        if run_id:
+            self.run_store.step_started(run_id, i, command)
+        return time.perf_counter()
+
+    def _checkpoint_unavailable(self, run_id, i):
+        if run_id:
+            self.run_store.step_finished(run_id, i, 'unavailable')
+
+    def _checkpoint_finished(self, run_id, i, writer, parser, failed, started):
+        status = 'failed' if failed else 'succeeded' if parser.evaluated and parser.succeeded else 'completed'
+        STEP.observe(time.perf_counter() - started, status=status)
+        if not run_id:
+            return
+        self.run_store.step_finished(run_id, i, status, writer.getvalue(), parser.observations, parser.status,
+                                     parser.cost, round((time.perf_counter() - started) * 1000))
+
+    def _screen_fingerprint(self):
+        image = self.take_screenshot()
+        return fingerprint(image) if image is not None else None
+
+    def _trace_for(self, project, command):
+        """(recorded trace to replay or None, fingerprint of the screen before the
+        step or None). A trace is replayed only from the screen it was recorded on."""
+        if not self.trace_store or TRACES['mode'] == 'off':
+            return None, None
+        before = self._screen_fingerprint()
+        if TRACES['mode'] != 'replay' or before is None:
+            return None, before
+        trace = self.trace_store.get(project.get('name'), command)
+        if trace and fingerprint_distance(trace['before'], before) <= TRACES['fingerprint_distance']:
+            return trace, before
+        return None, before
+
+    def _replay_finished(self, run, project, i, command, trace, writer, parser, started):
+        """A replay counts only if it ran cleanly and the screen now matches the one
+        recorded after the step. Returns (events, replayed); if not replayed the
+        step falls back to UFO2 planning."""
+        frame = writer.flush()
+        events = [{'type': 'ufo_output', 'content': frame}] if frame else []
+        output = writer.getvalue()
+        clean = not parser.errored and not any(failure in output for failure in REPLAY_FAILURES)
+        after = self._screen_fingerprint() if clean else None
+        replayed = after is not None and fingerprint_distance(trace['after'], after) <= TRACES['fingerprint_distance']
+        self.trace_store.replayed(project.get('name'), command, replayed)
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        if not replayed:
+            self.log('TRACE_FALLBACK', f"Step {i+1}: replay {'did not reach the recorded screen' if clean else 'failed'}")
+            events.append({'type': 'debug_output', 'content': f"Replay of step {i+1} did not reach the recorded screen; planning it with EVA2"})
+            return events, False
+
+        STEP.observe(duration_ms / 1000, status='replayed')
+        observations = f"Replayed {len(trace['actions'])} recorded actions"
+        if run.run_id:
+            self.run_store.step_finished(run.run_id, i, 'replayed', output, observations, 'FINISH', 0.0, duration_ms)
+        run.step_ended = time.perf_counter()
+        self.log('TRACE_REPLAYED', f"Step {i+1}: {len(trace['actions'])} actions in {duration_ms}ms")
+        events.append({
+            'type': 'eva2_conclusion',
+            'content': f"Step {i+1} replayed from a recorded trace ({len(trace['actions'])} actions, {duration_ms}ms).",
+            'step': i + 1,
+            'replayed': True
+        })
+        return events, True
+
+    def _record_trace(self, project, command, before, writer, parser, failed):
+        """Record the actions of a step UFO2 planned and the evaluator passed"""
+        if before is None or failed or not (parser.evaluated and parser.succeeded):
+            return
+        actions = extract_actions(writer.getvalue())
+        if not actions:
+            return
+        after = self._screen_fingerprint()
+        if after is not None:
+            self.trace_store.record(project.get('name'), command, before, after, actions)
+            self.log('TRACE_RECORDED', f"{len(actions)} actions for: {command}")
+
+    def _end_run(self, run):
+        self._discard_prepared(run.pending)
+        self._record_gaps(run.gaps)
+        if run.run_id:
+            self.run_store.finish(run.run_id, run.outcome)
+            self.log('RUN_FINISHED', f"Run {run.run_id} {run.outcome}", {'run_id': run.run_id})
+        run.span.end(outcome=run.outcome)
+
+    def analyze_document_streaming(self, message, file_data, system_prompt, cancelled=None):
+        """Analyze a base64 data URL (the JSON /api/analyze_document body)"""
         try:
             # Extract base64 image data
             image_data = file_data.split(',')[1]
             image_bytes = base64.b64decode(image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-            
-            # Use Gemini to analyze the document
+        except Exception as e:
+            self.log('OCR_ERROR', str(e))
+            yield {'type': 'error', 'content': f"Error processing document: {str(e)}"}
+            return
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        yield from self.analyze_upload_streaming(message, io.BytesIO(image_bytes), system_prompt, cancelled,
+                                                 digest=digest, size=len(image_bytes))
+
+    def analyze_upload_streaming(self, message, upload, system_prompt, cancelled=None, digest=None, size=None):
+        """Analyze an image file object (e.g. a spooled upload).
+
+        Yields a payload event (bytes before/after normalization), then
+        message_chunk events as Gemini generates and one message event with the
+        full text. Stops early (without caching) once `cancelled`, a
+        threading.Event, is set or the consumer closes the generator."""
+        self.log('OCR_PROMPT', system_prompt)
+        self.log('OCR_MESSAGE', message)
+        
+        try:
+            if digest is None:
+                digest, size = hash_file(upload)
             prompt = f"{system_prompt}\n\n{message}"
-            response = self.model.generate_content([prompt, image])
+
+            # Same document, prompt, model and normalization as before: reuse the earlier answer
+            cache_key = (content_key(bytes.fromhex(digest), prompt, LLM['model'], settings_key(UPLOADS))
+                         if self.document_cache else None)
+            if cache_key:
+                cached = self.document_cache.get(cache_key, input_bytes=size)
+                if cached is not None:
+                    self.log('OCR_CACHE_HIT', cached['text'][:200], {'key': cache_key})
+                    yield {'type': 'message', 'content': cached['text'], 'cached': True}
+                    return
+
+            # Decode and shrink once; the model gets the recompressed bytes
+            prepared = normalize_image(upload, UPLOADS, bytes_in=size)
+            payload = prepared.stats()
+            self.log('OCR_PAYLOAD', f"{payload['bytes_in']} -> {payload['bytes_out']} bytes", payload)
+            yield {'type': 'payload', **payload}
             
-            self.log('OCR_RESULT', response.text)
-            yield {'type': 'message', 'content': response.text}
+            # Use Gemini to analyze the document, streaming text as it is generated
+            started = time.perf_counter()
+            first_token_at = None
+            chunks, usage = [], None
+            completed = False
+            try:
+                for chunk in self.model.generate_content([prompt, prepared.blob()], stream=True):
+                    if cancelled is not None and cancelled.is_set():
+                        break
+                    usage = getattr(chunk, 'usage_metadata', None) or usage
+                    text = chunk.text
+                    if not text:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    chunks.append(text)
+                    yield {'type': 'message_chunk', 'content': text}
+                else:
+                    completed = True
+            finally:
+                # Not completed and no error in flight: the client went away (cancelled or generator closed)
+                stats = self._generation_stats(started, first_token_at, ''.join(chunks), usage)
+                stats['cancelled'] = not completed and sys.exc_info()[0] in (None, GeneratorExit)
+                if first_token_at is not None:
+                    MODEL_FIRST_TOKEN.observe(first_token_at - started, call='stream')
+                if completed:
+                    MODEL.observe(stats['total_ms'] / 1000, call='stream')
+                self.last_generation_stats = stats
+                self.log('OCR_STREAM_STATS', f"ttft={stats['ttft_ms']}ms {stats['tokens_per_sec']} tok/s", stats)
+                if stats['cancelled']:
+                    self.log('OCR_CANCELLED', 'Client went away; generation stopped')
+
+            if not completed:
+                return
+            text = ''.join(chunks)
+            self.log('OCR_RESULT', text)
+            if cache_key:
+                self.document_cache.put(cache_key, {'text': text})
+            yield {'type': 'message', 'content': text, 'stats': stats}
             
         except Exception as e:
             self.log('OCR_ERROR', str(e))
             yield {'type': 'error', 'content': f"Error processing document: {str(e)}"}
+
+    def analyze_batch_streaming(self, message, documents, system_prompt, cancelled=None):
+        """Analyze several files and/or multi-page PDF/TIFF documents at once.
+
+        `documents` is a list of (name, file object). Pages are split lazily and
+        analyzed on a pool of BATCH['workers'] threads, with at most two pages
+        per worker decoded ahead. A page_result (or page_error) event with its
+        page index is yielded as each page finishes, in completion order, then
+        one batch_result with every page's text in page order."""
+        self.log('OCR_PROMPT', system_prompt)
+        self.log('OCR_MESSAGE', f"{message} ({len(documents)} files)")
+        prompt = f"{system_prompt}\n\n{message}"
+        started = time.perf_counter()
+        results, errors = {}, []
+        pending = {}  # future -> (page index, source name)
+        window = BATCH['workers'] * 2
+        executor = ThreadPoolExecutor(max_workers=BATCH['workers'], thread_name_prefix='eva-batch')
+
+        def collect(done):
+            for future in done:
+                page, source = pending.pop(future)
+                try:
+                    results[page] = future.result()
+                    yield {'type': 'page_result', 'page': page, 'source': source, 'content': results[page]}
+                except Exception as e:
+                    errors.append({'page': page, 'source': source, 'error': str(e)})
+                    yield {'type': 'page_error', 'page': page, 'source': source, 'content': str(e)}
+
+        try:
+            page = 0
+            for source, fileobj in documents:
+                try:
+                    for image in iter_pages(fileobj, BATCH['pdf_dpi']):
+                        if page >= BATCH['max_pages']:
+                            raise PageError(f"Batch is limited to {BATCH['max_pages']} pages")
+                        while len(pending) >= window:
+                            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                            yield from collect(done)
+                        if cancelled is not None and cancelled.is_set():
+                            return
+                        pending[executor.submit(self._analyze_page, prompt, image)] = (page, source)
+                        page += 1
+                except (PageError, OSError) as e:  # OSError covers Pillow's UnidentifiedImageError
+                    errors.append({'page': None, 'source': source, 'error': str(e)})
+                    yield {'type': 'page_error', 'page': None, 'source': source, 'content': str(e)}
+                    if page >= BATCH['max_pages']:
+                        break
+            while pending:
+                if cancelled is not None and cancelled.is_set():
+                    return
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                yield from collect(done)
+
+            elapsed_ms = round((time.perf_counter() - started) * 1000)
+            self.log('OCR_BATCH_STATS', f"{page} pages in {elapsed_ms}ms, {len(errors)} errors",
+                     {'pages': page, 'elapsed_ms': elapsed_ms, 'workers': BATCH['workers']})
+            yield {
+                'type': 'batch_result',
+                'pages': page,
+                'content': '\n\n'.join(results[i] for i in sorted(results)),
+                'errors': errors,
+                'elapsed_ms': elapsed_ms
+            }
+        finally:
+            # Client gone or batch done: drop pages that have not started
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _analyze_page(self, prompt, image):
+        prepared = prepare_image(image, UPLOADS)
+        cache_key = (content_key(prepared.data, prompt, LLM['model'], settings_key(UPLOADS))
+                     if self.document_cache else None)
+        if cache_key:
+            cached = self.document_cache.get(cache_key, input_bytes=len(prepared.data))
+            if cached is not None:
+                return cached['text']
+        with Span(MODEL, call='page'):
+            text = self.model.generate_content([prompt, prepared.blob()]).text
+        if cache_key:
+            self.document_cache.put(cache_key, {'text': text})
+        return text
+
+    @staticmethod
+    def _generation_stats(started, first_token_at, text, usage):
+        """Time to first token and output tokens/sec (estimated at 4 chars/token without usage metadata)"""
+        finished = time.perf_counter()
+        tokens = getattr(usage, 'candidates_token_count', None) or (max(1, len(text) // 4) if text else 0)
+        generating = finished - (first_token_at or finished)
+        return {
+            'ttft_ms': round((first_token_at - started) * 1000) if first_token_at else None,
+            'total_ms': round((finished - started) * 1000),
+            'output_tokens': tokens,
+            # Too short to measure when (nearly) all the text came in one chunk
+            'tokens_per_sec': round(tokens / generating, 1) if generating >= MIN_RATE_SECONDS else None
+        }
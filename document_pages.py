@@ -0,0 +1,40 @@
+# Eva Document Pages - split uploads (images, multi-page TIFF, PDF) into pages lazily
+
+class PageError(Exception):
+    """A document that cannot be split into pages"""
+
+
+def iter_pages(fileobj, pdf_dpi=150):
+    """Yield one PIL image per page, decoding each page only when asked for it.
+
+    PDFs need the optional pypdfium2 package; TIFF (and other multi-frame
+    images) are split with Pillow."""
+    from PIL import Image, ImageOps, ImageSequence  # Imported on first use to keep startup fast
+    head = fileobj.read(5)
+    fileobj.seek(0)
+    if head.startswith(b'%PDF'):
+        yield from _pdf_pages(fileobj, pdf_dpi)
+        return
+    image = Image.open(fileobj)
+    if getattr(image, 'n_frames', 1) == 1:
+        yield ImageOps.exif_transpose(image)
+        return
+    for frame in ImageSequence.Iterator(image):
+        yield frame.copy()  # The iterator reuses one image object
+
+
+def _pdf_pages(fileobj, dpi):
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        raise PageError('PDF support needs pypdfium2 (pip install pypdfium2)')
+    pdf = pdfium.PdfDocument(fileobj.read())
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                yield page.render(scale=dpi / 72).to_pil()
+            finally:
+                page.close()
+    finally:
+        pdf.close()
@@ -0,0 +1,102 @@
+# Eva Fake Model - offline stand-in for genai.GenerativeModel (LLM["provider"] = "fake")
+import random
+import threading
+import time
+from collections import deque
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeAPIError(Exception):
+    """Shaped like google.api_core errors: the HTTP status is in `.code`"""
+
+    def __init__(self, code, message):
+        super().__init__(f'{code} {message}')
+        self.code = code
+
+
+class FakeResponse:
+    """Quacks like a GenerateContentResponse (or one streamed chunk of it)"""
+
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+class FakeModel:
+    """Generates `tokens` words after `ttft` seconds at `tokens_per_sec`.
+
+    generate_content(parts) blocks for the whole generation like the real
+    client; generate_content(parts, stream=True) yields chunks of
+    `chunk_tokens` words as they are "generated", the last one carrying
+    usage_metadata. `text` overrides the canned reply. `calls` counts requests.
+
+    Faults, for exercising gemini_client: `fail_429` / `fail_500` are the
+    chances that a call fails outright, and `quota` rejects with 429 any call
+    beyond `quota` requests per `quota_window` seconds, like the real API.
+    """
+
+    def __init__(self, text=None, tokens=400, ttft=0.3, tokens_per_sec=200.0, chunk_tokens=8,
+                 fail_429=0.0, fail_500=0.0, quota=None, quota_window=60.0):
+        self.text = text
+        self.tokens = tokens
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.chunk_tokens = chunk_tokens
+        self.fail_429 = fail_429
+        self.fail_500 = fail_500
+        self.quota = quota
+        self.quota_window = quota_window
+        self.calls = 0
+        self.rejected = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _check_faults(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > self.quota_window:
+                self._recent.popleft()
+            over_quota = self.quota is not None and len(self._recent) >= self.quota
+            if not over_quota:
+                self._recent.append(now)
+            roll = random.random()
+            if over_quota or roll < self.fail_429:
+                self.rejected += 1
+                raise FakeAPIError(429, 'Resource has been exhausted (e.g. check quota).')
+            if roll < self.fail_429 + self.fail_500:
+                self.rejected += 1
+                raise FakeAPIError(500, 'An internal error has occurred.')
+
+    def _words(self, parts):
+        if self.text is not None:
+            return self.text.split(' ')
+        prompt = next((p for p in parts if isinstance(p, str)), '')
+        seed = (prompt.split() or ['document'])[-1]
+        return [f'{seed}-{i}' for i in range(self.tokens)]
+
+    def _prompt_tokens(self, parts):
+        return sum(len(p.split()) if isinstance(p, str) else 258 for p in parts)  # 258 = one image for Gemini
+
+    def generate_content(self, parts, stream=False, **kwargs):
+        self._check_faults()
+        words = self._words(parts)
+        usage = _Usage(self._prompt_tokens(parts), len(words))
+        if stream:
+            return self._stream(words, usage)
+        time.sleep(self.ttft + len(words) / self.tokens_per_sec)
+        return FakeResponse(' '.join(words), usage)
+
+    def _stream(self, words, usage):
+        time.sleep(self.ttft)
+        for start in range(0, len(words), self.chunk_tokens):
+            chunk = words[start:start + self.chunk_tokens]
+            if start:
+                time.sleep(len(chunk) / self.tokens_per_sec)
+            last = start + self.chunk_tokens >= len(words)
+            yield FakeResponse((' ' if start else '') + ' '.join(chunk), usage if last else None)
@@ -0,0 +1,231 @@
+# Eva Gemini Client - rate limiting, retries, deadlines and single-flight around the model
+import hashlib
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+def retryable(error):
+    """Quota and server errors are worth retrying; bad requests are not.
+    google.api_core exceptions carry the HTTP status as `.code`."""
+    code = getattr(error, 'code', None)
+    code = getattr(code, 'value', code)  # grpc.StatusCode-style enums
+    if isinstance(code, int):
+        return code in RETRYABLE_CODES
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call could not finish (including waiting and retries) before its deadline"""
+
+
+class TokenBucket:
+    """Refills `rate` units per second up to `capacity`. take() blocks until the
+    units are available; a take larger than capacity drains the bucket into
+    debt so oversized requests still go through, just later."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._level = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, amount, deadline=None):
+        """Seconds spent waiting; raises DeadlineExceeded if the wait would pass `deadline`"""
+        waited = 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            needed = min(amount, self.capacity)
+            if self._level < needed:
+                waited = (needed - self._level) / self.rate
+                if deadline is not None and now + waited > deadline:
+                    raise DeadlineExceeded('Rate limit wait exceeds the deadline')
+            self._level -= amount  # Reserve now so waiting callers queue up in order
+        if waited:
+            time.sleep(waited)
+        return waited
+
+    def adjust(self, amount):
+        """Correct an earlier estimate once the real cost is known (positive = charge more)"""
+        with self._lock:
+            self._level -= amount
+
+
+class GeminiClient:
+    """Wraps a genai.GenerativeModel (or fake_model.FakeModel) with the same
+    generate_content() interface, so it can stand in for ChatEngine.model.
+    `model` may also be a zero-argument factory, called on first use.
+
+    - requests/tokens per minute: token buckets, input tokens estimated up
+      front and corrected from usage_metadata afterwards
+    - max_in_flight: semaphore on concurrent calls
+    - retries: 429/5xx/timeouts with full-jitter exponential backoff
+    - deadlines: each attempt gets request_options timeout = min(timeout,
+      time left), and no call runs past its overall deadline
+    - single-flight: identical non-streaming requests in flight at the same
+      time share one model call
+    """
+
+    def __init__(self, model, rpm=60, tpm=1000000, max_in_flight=8, max_retries=4,
+                 base_delay=1.0, max_delay=20.0, timeout=30, deadline=120, stream_timeout=300, burst=5.0):
+        self._model = None if callable(model) and not hasattr(model, 'generate_content') else model
+        self._factory = model
+        self._model_lock = threading.Lock()
+        # Buckets hold `burst` seconds of quota, so short idle gaps can be caught up
+        self.requests = TokenBucket(rpm / 60.0, max(1, rpm / 60.0 * burst))
+        self.tokens = TokenBucket(tpm / 60.0, max(1, tpm / 60.0 * burst))
+        self.slots = threading.BoundedSemaphore(max_in_flight)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.deadline = deadline
+        self.stream_timeout = stream_timeout
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'calls': 0, 'model_calls': 0, 'retries': 0, 'coalesced': 0, 'failures': 0, 'throttled_s': 0.0}
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self._factory()
+        return self._model
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.model, name)  # model_name etc. still reachable
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    @staticmethod
+    def estimate_tokens(parts):
+        """Rough input size: 4 characters per token, 258 tokens per image"""
+        return sum(len(p) // 4 + 1 if isinstance(p, str) else 258 for p in parts)
+
+    @staticmethod
+    def request_key(parts, kwargs):
+        """Hash of the request, or None if a part cannot be hashed cheaply (e.g. a PIL image)"""
+        digest = hashlib.sha256(repr(sorted(kwargs.items())).encode())
+        for part in parts:
+            if isinstance(part, str):
+                digest.update(b's' + part.encode())
+            elif isinstance(part, dict) and isinstance(part.get('data'), bytes):
+                digest.update(b'b' + part.get('mime_type', '').encode() + part['data'])
+            else:
+                return None
+        return digest.hexdigest()
+
+    def generate_content(self, parts, stream=False, **kwargs):
+        self._count('calls')
+        if stream:
+            return self._stream(parts, kwargs)
+        key = self.request_key(parts, kwargs)
+        if key is None:
+            return self._call(parts, kwargs)
+
+        with self._lock:
+            leader = self._in_flight.get(key)
+            if leader is None:
+                future = self._in_flight[key] = Future()
+        if leader is not None:
+            self._count('coalesced')
+            return leader.result()
+        try:
+            response = self._call(parts, kwargs)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _admit(self, parts, deadline):
+        """Wait for quota and a slot; returns the token estimate charged"""
+        estimate = self.estimate_tokens(parts)
+        throttled = self.requests.take(1, deadline) + self.tokens.take(estimate, deadline)
+        if throttled:
+            self._count('throttled_s', throttled)
+        if not self.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            raise DeadlineExceeded('No free model slot before the deadline')
+        return estimate
+
+    def _settle(self, estimate, response):
+        usage = getattr(response, 'usage_metadata', None)
+        total = getattr(usage, 'total_token_count', None)
+        if total:
+            self.tokens.adjust(total - estimate)
+
+    def _backoff(self, attempt, error, deadline):
+        if attempt >= self.max_retries or not retryable(error):
+            self._count('failures')
+            raise error
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))  # Full jitter
+        if time.monotonic() + delay > deadline:
+            self._count('failures')
+            raise error
+        self._count('retries')
+        time.sleep(delay)
+
+    def _call(self, parts, kwargs):
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            estimate = self._admit(parts, deadline)
+            try:
+                self._count('model_calls')
+                timeout = min(self.timeout, max(1.0, deadline - time.monotonic()))
+                response = self.model.generate_content(parts, request_options={'timeout': timeout}, **kwargs)
+                self._settle(estimate, response)
+                return response
+            except Exception as e:
+                error = e
+            finally:
+                self.slots.release()
+            self._backoff(attempt, error, deadline)
+
+    def _stream(self, parts, kwargs):
+        """Retries only until the first chunk arrives; after that, text has been
+        sent to the client and an error has to surface"""
+        deadline = time.monotonic() + self.deadline
+        for attempt in range(self.max_retries + 1):
+            estimate = self._admit(parts, deadline)
+            started, last = False, None
+            try:
+                self._count('model_calls')
+                for chunk in self.model.generate_content(parts, stream=True,
+                                                         request_options={'timeout': self.stream_timeout}, **kwargs):
+                    started, last = True, chunk
+                    yield chunk
+                self._settle(estimate, last)
+                return
+            except Exception as e:
+                if started:
+                    self._count('failures')
+                    raise
+                error = e
+            finally:
+                self.slots.release()
+            self._backoff(attempt, error, deadline)
+
+def from_config(model, settings, llm):
+    """Wrap `model` as configured by GEMINI_CLIENT in config.py; LLM['timeout']
+    is the per-attempt timeout. Returns the bare model when disabled.
+    `model` may be a factory, which is then called on first use."""
+    if not settings.get('enabled', True):
+        return model() if callable(model) and not hasattr(model, 'generate_content') else model
+    options = {k: v for k, v in settings.items() if k != 'enabled'}
+    return GeminiClient(model, timeout=llm.get('timeout', 30), **options)
@@ -0,0 +1,116 @@
+# Eva Image Prep - spool uploads to disk and normalize images once before the model call
+import hashlib
+import io
+import tempfile
+# Pillow is imported where used: spool_upload runs in the request thread and does not need it
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+class UploadTooLarge(Exception):
+    """The upload is bigger than UPLOADS['max_bytes']"""
+
+
+def spool_upload(stream, max_bytes, max_memory=1024 * 1024, chunk_size=64 * 1024):
+    """Copy a request body into a SpooledTemporaryFile (in memory up to
+    max_memory, then on disk), hashing it on the way.
+
+    Returns (file positioned at 0, sha256 hex digest, size in bytes)."""
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f'Upload exceeds {max_bytes} bytes')
+            digest.update(chunk)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool, digest.hexdigest(), size
+
+
+def hash_file(fileobj, chunk_size=64 * 1024):
+    """(sha256 hex digest, size) of a seekable file, leaving it at position 0"""
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+class PreparedImage:
+    """The bytes actually sent to the model, and what normalization saved"""
+
+    def __init__(self, data, format, size_in, size_out, bytes_in):
+        self.data = data
+        self.format = format
+        self.size_in = size_in
+        self.size_out = size_out
+        self.bytes_in = bytes_in
+
+    @property
+    def mime_type(self):
+        return MIME_TYPES[self.format]
+
+    def blob(self):
+        """Inline part for generate_content"""
+        return {'mime_type': self.mime_type, 'data': self.data}
+
+    def stats(self):
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_out': len(self.data),
+            'size_in': list(self.size_in),
+            'size_out': list(self.size_out)
+        }
+
+
+def settings_key(settings):
+    """Normalization settings as a string, so cached results are tied to them"""
+    return f"{settings['format']}:{settings['quality']}:{settings['max_edge']}:{int(bool(settings['grayscale']))}"
+
+
+def normalize_image(fileobj, settings, bytes_in=None):
+    """Decode once, fix EXIF rotation, optionally grayscale, downscale so the
+    longer edge is at most settings['max_edge'], and recompress.
+
+    JPEGs are decoded with draft() so the decoder itself scales down by up to
+    8x; a 12 MP phone photo never exists at full size in memory."""
+    from PIL import Image, ImageOps
+    image = Image.open(fileobj)
+    size_in = image.size
+    max_edge = settings.get('max_edge')
+    if max_edge and image.format == 'JPEG':
+        image.draft('RGB', (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    if bytes_in is None:
+        fileobj.seek(0, io.SEEK_END)
+        bytes_in = fileobj.tell()
+    return prepare_image(image, settings, size_in, bytes_in)
+
+
+def prepare_image(image, settings, size_in=None, bytes_in=0):
+    """Grayscale/downscale/recompress an already decoded image (e.g. a PDF or TIFF page)"""
+    from PIL import Image
+    size_in = size_in or image.size
+    max_edge = settings.get('max_edge')
+    if settings.get('grayscale'):
+        image = image.convert('L')
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    if max_edge and max(image.size) > max_edge:
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    format = settings.get('format', 'JPEG').upper()
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **({} if format == 'PNG' else {'quality': settings.get('quality', 85)}))
+    return PreparedImage(buffer.getvalue(), format, size_in, image.size, bytes_in)
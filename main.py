@@ -1,17 +1,25 @@
 # Eva - Lean Async Flask Implementation
 import json
 import os
-from datetime import datetime
 from flask import Flask, render_template, request, jsonify, Response
 from chat_engine import ChatEngine
 from workflow_manager import WorkflowManager
+from prompt_log import PromptLog
+from session_pool import DEFAULT_SESSION, Session, SessionLimitError, SessionPool, valid_session_id
+from config import BATCH, DOCUMENT_CACHE, SESSIONS, UPLOADS
+from ufo_pool import from_config as ufo_pool_from_config
+from result_cache import from_config as document_cache_from_config
+from run_store import from_config as run_store_from_config, valid_run_id
+from action_trace import from_config as trace_store_from_config
+from image_prep import UploadTooLarge, spool_upload
+import metrics
 
 app = Flask(__name__)
 workflow_mgr = WorkflowManager()
 
 # Global prompt logging storage
-prompt_logs = []
 MAX_PROMPT_LOGS = 1000
+prompt_log = PromptLog(capacity=MAX_PROMPT_LOGS)
 
 PROMPTS_FILE = 'prompts.json'
 
@@ -30,22 +38,51 @@ def save_prompts(prompts):
 
 def log_prompt(prompt_type, content, metadata=None):
     """Log prompts with timestamp and type"""
-    global prompt_logs
-    
-    log_entry = {
-        'timestamp': datetime.now().strftime('%H:%M:%S'),
-        'type': prompt_type,
-        'content': content[:66000] if len(content) > 66000 else content,  # Truncate very long content
-        'metadata': metadata or {}
-    }
-    
-    prompt_logs.append(log_entry)
-    
-    if len(prompt_logs) > MAX_PROMPT_LOGS:
-        prompt_logs = prompt_logs[-MAX_PROMPT_LOGS:]
+    prompt_log.log(prompt_type, content, metadata)
+
+def clear_prompt_logs(session):
+    session.prompt_log.clear()
+    session.prompt_log.log('SYSTEM', 'New request received, logs cleared.')
+
+ufo_pool = ufo_pool_from_config(logger=log_prompt)
+shared_model = ChatEngine.create_model()
+document_cache = document_cache_from_config(DOCUMENT_CACHE)
+run_store = run_store_from_config()
+trace_store = trace_store_from_config(logger=log_prompt)
+
+def create_session(session_id):
+    """Each client session gets its own engine (screenshots, messenger) and prompt log"""
+    if session_id == DEFAULT_SESSION:
+        log, engine_session_id = prompt_log, None
+    else:
+        log, engine_session_id = PromptLog(capacity=MAX_PROMPT_LOGS), session_id
+    # Pass the logger to the chat engine
+    engine = ChatEngine(prompt_logger=log.log, ufo_pool=ufo_pool, project_store=workflow_mgr.store,
+                        model=shared_model, session_id=engine_session_id,
+                        document_cache=document_cache, run_store=run_store, trace_store=trace_store)
+    return Session(session_id, engine, log)
 
-# Pass the logger to the chat engine
-chat_engine = ChatEngine(prompt_logger=log_prompt)
+session_pool = SessionPool(create_session, max_sessions=SESSIONS['max_sessions'], idle_timeout=SESSIONS['idle_timeout'])
+chat_engine = session_pool.get(DEFAULT_SESSION).engine  # Used by clients that send no session id
+
+def request_session(data=None, create=True, hold=False):
+    """(session, None) for the request's X-Session-ID header, ?session_id= or JSON
+    session_id (default session if none), or (None, error response). A held
+    session stays busy until release_on_close() lets go of it."""
+    session_id = request.headers.get('X-Session-ID') or request.args.get('session_id') or (data or {}).get('session_id')
+    if not valid_session_id(session_id):
+        return None, (jsonify({'error': 'Invalid session id'}), 400)
+    try:
+        return session_pool.get(session_id, create=create, hold=hold), None
+    except SessionLimitError as e:
+        return None, (jsonify({'error': str(e)}), 503)
+
+NO_SESSION_STREAM = "retry: 5000\n\n"  # EventSource reconnects after 5s
+
+def release_on_close(session, response):
+    """Release a held session once the streamed response is closed (finished or disconnected)"""
+    response.call_on_close(lambda: session_pool.release(session))
+    return response
 
 @app.route('/')
 def index():
@@ -61,8 +98,7 @@ def save_project():
     if not data or not data.get('name'):
         return jsonify({'error': 'Invalid data'}), 400
 
-    existing_projects = workflow_mgr.get_projects()
-    is_new = not any(p['name'] == data['name'] for p in existing_projects)
+    is_new = workflow_mgr.get_project(data['name']) is None
 
     if is_new and data.get('use_custom_prompt') is False:
         prompts = get_prompts()
@@ -87,28 +123,90 @@ def chat_stream():
     if not message:
         return jsonify({'error': 'No message'}), 400
 
-    global prompt_logs
-    prompt_logs = []
-    log_prompt('SYSTEM', 'New request received, logs cleared.')
+    session, error = request_session(data, hold=True)
+    if error:
+        return error
+    clear_prompt_logs(session)
+
+    stream = metrics.StreamMeter('chat_stream')
 
     def generate():
-        try:
-            log_prompt('USER_MESSAGE', message, {'project': project.get('name') if project else 'None'})
-            for response_chunk in chat_engine.process_streaming(message, project, chat_history):
-                yield f"data: {json.dumps(response_chunk)}\n\n"
-        except Exception as e:
-            log_prompt('ERROR', str(e))
-            yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+        with stream:
+            try:
+                session.prompt_log.log('USER_MESSAGE', message, {'project': project.get('name') if project else 'None', 'trace_id': stream.trace_id})
+                for response_chunk in session.engine.process_streaming(message, project, chat_history):
+                    yield stream.event(response_chunk)
+            except Exception as e:
+                session.prompt_log.log('ERROR', str(e))
+                yield stream.event({'type': 'error', 'content': str(e)})
 
-    return Response(
+    return release_on_close(session, Response(
         generate(), 
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'X-Trace-Id': stream.trace_id,
             'X-Accel-Buffering': 'no',  # Disable Nginx buffering
             'Connection': 'keep-alive'
         }
-    )
+    ))
+
+@app.route('/api/runs', methods=['GET'])
+def get_runs():
+    if not run_store:
+        return jsonify([])
+    return jsonify(run_store.list(project=request.args.get('project'), limit=request.args.get('limit', 50, type=int)))
+
+@app.route('/api/runs/<run_id>', methods=['GET'])
+def get_run(run_id):
+    run = run_store.get(run_id) if run_store else None
+    if run is None:
+        return jsonify({'error': 'Run not found'}), 404
+    return jsonify(run)
+
+def resume_error(run_id, from_step):
+    """(message, status) if a resume request cannot be served, else None"""
+    if not run_store or not valid_run_id(run_id) or run_store.get(run_id) is None:
+        return 'Run not found', 404
+    if from_step is not None and (not isinstance(from_step, int) or isinstance(from_step, bool) or from_step < 1):
+        return 'from_step must be a step number (1 or more)', 400
+    return None
+
+@app.route('/api/runs/<run_id>/resume', methods=['POST'])
+def resume_run(run_id):
+    """Continue a recorded run from `from_step` (default: its first step that did not succeed)"""
+    data = request.get_json(silent=True) or {}
+    from_step = data.get('from_step')
+    invalid = resume_error(run_id, from_step)
+    if invalid:
+        return jsonify({'error': invalid[0]}), invalid[1]
+    session, error = request_session(data, hold=True)
+    if error:
+        return error
+    clear_prompt_logs(session)
+
+    stream = metrics.StreamMeter('resume')
+
+    def generate():
+        with stream:
+            try:
+                session.prompt_log.log('USER_MESSAGE', f'Resume run {run_id}', {'from_step': from_step, 'trace_id': stream.trace_id})
+                for response_chunk in session.engine.resume_streaming(run_id, from_step):
+                    yield stream.event(response_chunk)
+            except Exception as e:
+                session.prompt_log.log('ERROR', str(e))
+                yield stream.event({'type': 'error', 'content': str(e)})
+
+    return release_on_close(session, Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'X-Trace-Id': stream.trace_id,
+            'X-Accel-Buffering': 'no',  # Disable Nginx buffering
+            'Connection': 'keep-alive'
+        }
+    ))
 
 @app.route('/api/analyze_document', methods=['POST'])
 def analyze_document():
@@ -120,37 +218,204 @@ def analyze_document():
         
         if not file_data:
             return jsonify({'error': 'No file data provided'}), 400
-        
+
+        session, error = request_session(data, hold=True)
+        if error:
+            return error
+
+        stream = metrics.StreamMeter('analyze_document')
+
         def generate():
-            try:
-                for update in chat_engine.analyze_document_streaming(message, file_data, system_prompt):
-                    response_data = f"data: {json.dumps(update)}\n\n"
-                    yield response_data
-                
-                yield f"data: [DONE]\n\n"
-                
-            except Exception as e:
-                yield f"data: {json.dumps({'type': 'error', 'content': str(e)})}\n\n"
+            with stream:
+                try:
+                    for update in session.engine.analyze_document_streaming(message, file_data, system_prompt):
+                        yield stream.event(update)
+
+                    yield stream.raw("data: [DONE]\n\n")
+
+                except Exception as e:
+                    yield stream.event({'type': 'error', 'content': str(e)})
         
-        return Response(
+        return release_on_close(session, Response(
             generate(),
             mimetype='text/event-stream',
             headers={
                 'Cache-Control': 'no-cache, no-store, must-revalidate',
+                'X-Trace-Id': stream.trace_id,
                 'Connection': 'keep-alive',
                 'X-Accel-Buffering': 'no',
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST',
                 'Access-Control-Allow-Headers': 'Content-Type'
             }
-        )
+        ))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/analyze_document/upload', methods=['POST'])
+def analyze_document_upload():
+    """Binary upload: multipart/form-data (file, message, systemPrompt) or a raw
+    image body with message/systemPrompt in the query string. The bytes are
+    spooled to a temp file and never base64-encoded."""
+    try:
+        if request.files:
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({'error': 'No file provided'}), 400
+            # Werkzeug closes its own temp file when the view returns, before the stream runs
+            source, fields = upload.stream, request.form
+        else:
+            source, fields = request.stream, request.args
+        fileobj, digest, size = spool_upload(source, UPLOADS['max_bytes'], UPLOADS['spool_memory'])
+        if not size:
+            fileobj.close()
+            return jsonify({'error': 'No file data provided'}), 400
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+
+    message = fields.get('message', '')
+    system_prompt = fields.get('systemPrompt', '')
+    session, error = request_session(fields, hold=True)
+    if error:
+        fileobj.close()
+        return error
+
+    stream = metrics.StreamMeter('analyze_document_upload')
+
+    def generate():
+        with fileobj, stream:
+            try:
+                updates = session.engine.analyze_upload_streaming(message, fileobj, system_prompt,
+                                                                  digest=digest, size=size)
+                for update in updates:
+                    yield stream.event(update)
+
+                yield stream.raw("data: [DONE]\n\n")
+
+            except Exception as e:
+                yield stream.event({'type': 'error', 'content': str(e)})
+
+    return release_on_close(session, Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'X-Trace-Id': stream.trace_id,
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    ))
+
+@app.route('/api/analyze_document/batch', methods=['POST'])
+def analyze_document_batch():
+    """Multipart upload of several `file` parts (images, multi-page TIFF or PDF).
+    Streams page_result events as pages finish, then a batch_result."""
+    uploads = request.files.getlist('file')
+    if not uploads:
+        return jsonify({'error': 'No files provided'}), 400
+    if len(uploads) > BATCH['max_files']:
+        return jsonify({'error': f"At most {BATCH['max_files']} files per batch"}), 400
+
+    documents = []
+    try:
+        for upload in uploads:
+            fileobj, _, _ = spool_upload(upload.stream, UPLOADS['max_bytes'], UPLOADS['spool_memory'])
+            documents.append((upload.filename or f'file{len(documents) + 1}', fileobj))
+    except UploadTooLarge as e:
+        for _, fileobj in documents:
+            fileobj.close()
+        return jsonify({'error': str(e)}), 413
+
+    message = request.form.get('message', '')
+    system_prompt = request.form.get('systemPrompt', '')
+    session, error = request_session(request.form, hold=True)
+    if error:
+        for _, fileobj in documents:
+            fileobj.close()
+        return error
+
+    stream = metrics.StreamMeter('analyze_document_batch')
+
+    def generate():
+        with stream:
+            try:
+                for update in session.engine.analyze_batch_streaming(message, documents, system_prompt):
+                    yield stream.event(update)
+
+                yield stream.raw("data: [DONE]\n\n")
+
+            except Exception as e:
+                yield stream.event({'type': 'error', 'content': str(e)})
+            finally:
+                for _, fileobj in documents:
+                    fileobj.close()
+
+    return release_on_close(session, Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'X-Trace-Id': stream.trace_id,
+            'Connection': 'keep-alive',
+            'X-Accel-Buffering': 'no',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': 'GET, POST',
+            'Access-Control-Allow-Headers': 'Content-Type'
+        }
+    ))
+
 @app.route('/api/prompt_logs', methods=['GET'])
 def get_prompt_logs():
-    return jsonify({'logs': prompt_logs})
+    # ?since=<seq> returns only entries logged after that sequence id
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', None, type=int)
+    session, error = request_session(create=False)
+    if error:
+        return error
+    if session is None:
+        return jsonify({'logs': [], 'last_seq': 0})
+    log = session.prompt_log
+    return jsonify({'logs': log.since(since, limit), 'last_seq': log.last_seq})
+
+@app.route('/api/prompt_logs/stream', methods=['GET'])
+def stream_prompt_logs():
+    # Live tail; browsers resume from Last-Event-ID after a reconnect
+    since = request.headers.get('Last-Event-ID', type=int) or request.args.get('since', 0, type=int)
+    session, error = request_session(create=False)
+    if error:
+        return error
+    if session is None:
+        # Watching logs does not create a session; the browser retries until a request does
+        return Response(NO_SESSION_STREAM, mimetype='text/event-stream')
+    log = session.prompt_log
+    stream = metrics.StreamMeter('prompt_logs')
+
+    def generate():
+        seq = since
+        with stream:
+            while True:
+                entries = log.wait(seq, timeout=15)
+                if not entries:
+                    yield ": keepalive\n\n"  # SSE comment, not an event
+                    continue
+                for entry in entries:
+                    yield stream.event(entry, id=entry['seq'])
+                seq = entries[-1]['seq']
+
+    return Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache, no-store, must-revalidate',
+            'X-Trace-Id': stream.trace_id,
+            'X-Accel-Buffering': 'no',
+            'Connection': 'keep-alive'
+        }
+    )
 
 @app.route('/api/prompts', methods=['GET'])
 def api_get_prompts():
@@ -165,18 +430,42 @@ def api_save_prompts():
 
     general_system_prompt = prompts.get('system_prompt', '')
     projects = workflow_mgr.get_projects()
-    for p in projects:
-        if not p.get('use_custom_prompt'):
-            p['system_prompt'] = general_system_prompt
-            workflow_mgr.save_project(p)
+    with workflow_mgr.batch():
+        for p in projects:
+            if not p.get('use_custom_prompt'):
+                p['system_prompt'] = general_system_prompt
+                workflow_mgr.save_project(p)
 
     return jsonify({'success': True})
 
 @app.route('/api/clear_screenshot', methods=['POST'])
 def clear_screenshot():
-    chat_engine.clear_screenshot()
+    session, error = request_session(request.get_json(silent=True), create=False)
+    if error:
+        return error
+    if session:
+        session.engine.clear_screenshot()
     return jsonify({'success': True})
 
+@app.route('/api/screen_stats', methods=['GET'])
+def screen_stats():
+    session, error = request_session(create=False)
+    if error:
+        return error
+    return jsonify(session.engine.screen_stats() if session else {})
+
+@app.route('/api/document_cache', methods=['GET'])
+def document_cache_stats():
+    return jsonify(document_cache.stats() if document_cache else {'enabled': False})
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/sessions', methods=['GET'])
+def get_sessions():
+    return jsonify(session_pool.stats())
+
 if __name__ == '__main__':
     # Disabled reloader to prevent infinite restart loop caused by watchdog
     # monitoring site-packages. Set use_reloader=False.
@@ -0,0 +1,188 @@
+# Eva Metrics - span timings and stream counters, exported as Prometheus text on /metrics
+import json
+import secrets
+import threading
+import time
+from bisect import bisect_left
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+BYTES = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+EVENTS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values)) + '}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per combination of label values"""
+
+    def __init__(self, name, help, labels=(), buckets=SECONDS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            series[bisect_left(self.buckets, value)] += 1  # Bucket bounds are inclusive (le)
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), key + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, key)} {values[-1]:.6f}')
+            lines.append(f'{self.name}_count{_labels(self.labels, key)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            series = dict(self._series)
+        for key, value in sorted(series.items()):
+            lines.append(f'{self.name}{_labels(self.labels, key)} {value}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def histogram(self, name, help, labels=(), buckets=SECONDS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# UFO2 (ufo_messenger.py, ufo_pool.py). mode: process (a `python -m ufo` per command),
+# worker (a warm pool or standby interpreter), standby / pool (interpreter start-up to READY)
+UFO_SPAWN = REGISTRY.histogram('eva_ufo_spawn_seconds', 'Starting a UFO2 interpreter', ('mode',))
+UFO_FIRST_OUTPUT = REGISTRY.histogram('eva_ufo_first_output_seconds', 'Command sent to first UFO2 output line', ('mode',))
+UFO_COMMAND = REGISTRY.histogram('eva_ufo_command_seconds', 'Command sent to end of UFO2 output', ('mode',))
+# Workflow steps and runs (chat_engine.py). status: as recorded by run_store
+STEP = REGISTRY.histogram('eva_step_seconds', 'Workflow step duration', ('status',))
+RUN = REGISTRY.histogram('eva_run_seconds', 'Workflow run duration', ('outcome',))
+# Gemini (chat_engine.py). call: stream (document analysis) or page (batch page)
+MODEL_FIRST_TOKEN = REGISTRY.histogram('eva_model_first_token_seconds', 'Model request to first streamed token', ('call',))
+MODEL = REGISTRY.histogram('eva_model_seconds', 'Model request to last token', ('call',))
+# SSE responses (main.py, asgi_app.py)
+SSE_STREAM = REGISTRY.histogram('eva_sse_stream_seconds', 'SSE response duration', ('endpoint',))
+SSE_FIRST_EVENT = REGISTRY.histogram('eva_sse_first_event_seconds', 'SSE response start to first event', ('endpoint',))
+SSE_STREAM_BYTES = REGISTRY.histogram('eva_sse_stream_bytes', 'Bytes per SSE response', ('endpoint',), BYTES)
+SSE_STREAM_EVENTS = REGISTRY.histogram('eva_sse_stream_events', 'Events per SSE response', ('endpoint',), EVENTS)
+SSE_BYTES = REGISTRY.counter('eva_sse_bytes_total', 'Bytes streamed over SSE', ('endpoint',))
+SSE_EVENTS = REGISTRY.counter('eva_sse_events_total', 'Events streamed over SSE', ('endpoint',))
+
+
+def render():
+    return REGISTRY.render()
+
+
+def new_trace_id():
+    return secrets.token_hex(8)
+
+
+class Span:
+    """Times one stage into a histogram. end() may be called early (with the
+    labels known by then); otherwise leaving the `with` block ends it."""
+
+    def __init__(self, histogram, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = time.perf_counter()
+        self.ended = False
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def end(self, **labels):
+        if not self.ended:
+            self.ended = True
+            self.histogram.observe(self.elapsed(), **{**self.labels, **labels})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+
+
+class StreamMeter:
+    """One SSE response: formats its events with the response's trace_id and
+    records duration, time to first event, bytes and events for `endpoint`."""
+
+    def __init__(self, endpoint, trace_id=None):
+        self.endpoint = endpoint
+        self.trace_id = trace_id or new_trace_id()
+        self.events = 0
+        self.bytes = 0
+        self._span = None
+
+    def event(self, event, id=None):
+        """`id` becomes the SSE id: line, which browsers send back as Last-Event-ID"""
+        frame = f"data: {json.dumps({**event, 'trace_id': self.trace_id})}\n\n"
+        return self.raw(frame if id is None else f"id: {id}\n{frame}")
+
+    def raw(self, frame):
+        """A frame that is not an event dict, e.g. `data: [DONE]`"""
+        if self.events == 0 and self._span is not None:
+            SSE_FIRST_EVENT.observe(self._span.elapsed(), endpoint=self.endpoint)
+        size = len(frame.encode('utf-8'))
+        self.events += 1
+        self.bytes += size
+        # Counted per frame: the prompt log stream never ends, and /metrics should see it live
+        SSE_BYTES.inc(size, endpoint=self.endpoint)
+        SSE_EVENTS.inc(endpoint=self.endpoint)
+        return frame
+
+    def __enter__(self):
+        self._span = Span(SSE_STREAM, endpoint=self.endpoint)
+        return self
+
+    def __exit__(self, *exc):
+        self._span.end()
+        SSE_STREAM_BYTES.observe(self.bytes, endpoint=self.endpoint)
+        SSE_STREAM_EVENTS.observe(self.events, endpoint=self.endpoint)
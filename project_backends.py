@@ -0,0 +1,103 @@
+# Eva Project Backends - how ProjectStore persists projects
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+class JsonFileBackend:
+    """The classic projects.json, written atomically (temp file + rename)"""
+
+    def __init__(self, path='projects.json', indent=4):
+        self.path = path
+        self.indent = indent
+
+    def signature(self):
+        """Changes whenever the file is replaced; None if it does not exist"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r') as f:
+            return json.load(f)
+
+    def save(self, projects, changed):
+        """Write all projects; a crash leaves either the old or the new file, never half of one"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(prefix='.projects-', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(projects, f, indent=self.indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+
+class SqliteBackend:
+    """One row per project, so saving touches only the projects that changed.
+
+    On first use an empty database is seeded from `import_json` if that file exists.
+    """
+
+    def __init__(self, path='projects.db', import_json=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS projects ('
+            'name TEXT PRIMARY KEY, position INTEGER NOT NULL, data TEXT NOT NULL)'
+        )
+        if import_json and os.path.exists(import_json) and not self.load():
+            projects = JsonFileBackend(import_json).load()
+            self.save(projects, {p.get('name') for p in projects})
+
+    def signature(self):
+        """PRAGMA data_version moves only when another connection commits"""
+        with self._lock:
+            return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self):
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM projects ORDER BY position').fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def save(self, projects, changed):
+        rows = [
+            (p.get('name'), position, json.dumps(p))
+            for position, p in enumerate(projects) if p.get('name') in changed
+        ]
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(
+                    'INSERT INTO projects (name, position, data) VALUES (?, ?, ?) '
+                    'ON CONFLICT(name) DO UPDATE SET position=excluded.position, data=excluded.data',
+                    rows
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def from_config(storage, projects_path):
+    """Backend described by STORAGE in config.py"""
+    if storage.get('backend') == 'sqlite':
+        return SqliteBackend(storage['sqlite_path'], import_json=projects_path)
+    return JsonFileBackend(projects_path, indent=storage.get('json_indent', 4))
@@ -0,0 +1,181 @@
+# Eva Project Store - one shared, indexed, self-refreshing view of the projects
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+from config import PATHS, STORAGE
+from project_backends import JsonFileBackend, from_config as backend_from_config
+
+class ProjectStore:
+    """Projects held in memory with a by-name index.
+
+    Readers never take the lock: they read a (list, index) snapshot that
+    writers and reloads swap in whole. A batch() copies the snapshot on its
+    first write and then updates that copy in place (a project is appended
+    before it is indexed), so a batch of N puts costs one copy, not N. The
+    backend is re-read only when its signature changes, and that check runs
+    at most once per check_interval seconds, so lookups are O(1) with no disk
+    I/O in the common case.
+
+    Writes are write-behind: put() updates memory at once and a background
+    flush persists every change made within flush_delay seconds in one go.
+    The flush saves a snapshot outside the lock, so readers, writers and
+    refreshes do not wait for the disk. flush_delay=0 writes through on every put().
+    """
+
+    def __init__(self, path='projects.json', check_interval=1.0, backend=None, flush_delay=0.25):
+        self.backend = backend or JsonFileBackend(path)
+        self.path = self.backend.path
+        self.check_interval = check_interval
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # One save at a time; not held by readers or writers
+        self._snapshot = ([], {})
+        self._shared = True  # The snapshot may be held by readers or a flush: copy before changing it
+        self._signature = None
+        self._checked_at = None
+        self._dirty = set()
+        self._flushing = set()
+        self._batch_depth = 0
+        self._flush_due = None
+        self._flusher = None
+        self.reloads = 0
+        self.flushes = 0
+
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            if self._dirty or self._flushing:
+                return  # Unflushed local changes win over the copy on disk
+            signature = self.backend.signature()
+            if signature == self._signature:
+                return
+            self._set(self.backend.load())
+            self._signature = signature
+            self.reloads += 1
+
+    def _set(self, projects):
+        index = {}
+        for i, p in enumerate(projects):
+            index.setdefault(p.get('name'), i)  # First match wins, as a linear scan would
+        self._snapshot = (projects, index)
+        self._shared = True
+
+    def all(self):
+        self._refresh()
+        return self._snapshot[0]
+
+    def get(self, name):
+        self._refresh()
+        projects, index = self._snapshot
+        position = index.get(name)
+        return projects[position] if position is not None else None
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def put(self, project):
+        """Insert or replace a project by name; persisted by the next flush"""
+        return self.put_many([project])
+
+    def put_many(self, updates):
+        with self._lock:
+            self._refresh(force=True)
+            projects, index = self._snapshot
+            if self._shared:
+                projects, index = list(projects), dict(index)
+                self._shared = False
+            for project in updates:
+                position = index.get(project['name'])
+                if position is None:
+                    projects.append(project)
+                    index[project['name']] = len(projects) - 1
+                else:
+                    projects[position] = project
+                self._dirty.add(project['name'])
+            self._snapshot = (projects, index)
+            # Outside a batch each call is its own batch; inside, the copy is reused until it exits
+            self._shared = not self._batch_depth
+            write_through = self._schedule_flush()
+        if write_through:
+            self.flush()
+        return True
+
+    @contextmanager
+    def batch(self):
+        """Defer flushing until the outermost batch exits, then flush once"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self._shared = True
+                write_through = self._schedule_flush()
+            if write_through:
+                self.flush()
+
+    def _schedule_flush(self):
+        """With the lock held. True if the caller should flush() once it has released it"""
+        if not self._dirty or self._batch_depth:
+            return False
+        if not self.flush_delay:
+            return True
+        if self._flush_due is None:
+            self._flush_due = time.monotonic() + self.flush_delay
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+        self._wakeup.notify()
+        return False
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                while self._flush_due is None or self._flush_due > time.monotonic():
+                    self._wakeup.wait(None if self._flush_due is None else self._flush_due - time.monotonic())
+            try:
+                self.flush()
+            except Exception:
+                # Keep the changes in memory and try again shortly
+                with self._lock:
+                    self._flush_due = time.monotonic() + max(self.flush_delay, 1.0)
+
+    def flush(self):
+        """Persist all pending changes now"""
+        with self._flush_lock:
+            with self._lock:
+                self._flush_due = None
+                if not self._dirty:
+                    return
+                projects = self._snapshot[0]
+                self._shared = True  # Writes from here on go to a copy, not the list being saved
+                self._flushing, self._dirty = self._dirty, set()
+            try:
+                self.backend.save(projects, self._flushing)
+                signature = self.backend.signature()
+            except Exception:
+                with self._lock:
+                    self._dirty |= self._flushing
+                    self._flushing = set()
+                raise
+            with self._lock:
+                self._signature = signature
+                self._flushing = set()
+                self.flushes += 1
+
+
+def from_config(projects_file=None):
+    """Store configured by STORAGE in config.py (projects_file forces a JSON file)"""
+    if projects_file:
+        backend = JsonFileBackend(projects_file, STORAGE['json_indent'])
+    else:
+        backend = backend_from_config(STORAGE, PATHS['projects'])
+    return ProjectStore(backend=backend, flush_delay=STORAGE['flush_delay'])
@@ -0,0 +1,83 @@
+# Eva Prompt Log - fixed-size ring of prompt/debug entries with sequence ids
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+class PromptLog:
+    """Ring buffer of log entries. Every entry gets a monotonically increasing
+    `seq`, so clients can fetch only what they have not seen (since()) or block
+    until something new arrives (wait() / tail_async())."""
+
+    def __init__(self, capacity=1000, max_content=66000):
+        self.max_content = max_content
+        self._entries = deque(maxlen=capacity)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._wakers = set()
+
+    @property
+    def last_seq(self):
+        return self._seq
+
+    def log(self, prompt_type, content, metadata=None):
+        with self._cond:
+            self._seq += 1
+            self._entries.append({
+                'seq': self._seq,
+                'timestamp': datetime.now().strftime('%H:%M:%S'),
+                'type': prompt_type,
+                'content': content[:self.max_content] if len(content) > self.max_content else content,  # Truncate very long content
+                'metadata': metadata or {}
+            })
+            self._cond.notify_all()
+        for wake in list(self._wakers):
+            wake()
+
+    def clear(self):
+        """Drop buffered entries; sequence ids keep counting up"""
+        with self._cond:
+            self._entries.clear()
+
+    def since(self, seq=0, limit=None):
+        """Entries with seq greater than `seq`, oldest first"""
+        with self._cond:
+            if not self._entries or seq >= self._seq:
+                return []
+            first = self._entries[0]['seq']
+            entries = list(islice(self._entries, max(0, seq - first + 1), None))
+        return entries[:limit] if limit else entries
+
+    def wait(self, seq, timeout):
+        """Block up to `timeout` seconds for entries newer than `seq`"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > seq, timeout)
+        return self.since(seq)
+
+    async def tail_async(self, seq, keepalive=15):
+        """Yield batches of new entries as they are logged; [] every `keepalive` idle seconds"""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+        self._wakers.add(wake)
+        try:
+            while True:
+                event.clear()
+                entries = self.since(seq)
+                if entries:
+                    seq = entries[-1]['seq']
+                    yield entries
+                    continue
+                try:
+                    await asyncio.wait_for(event.wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield []
+        finally:
+            self._wakers.discard(wake)
@@ -0,0 +1,144 @@
+# Eva Result Cache - content-addressed memory + disk cache for model results
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+def content_key(data, *parts):
+    """SHA-256 over the raw bytes and each text part (length-prefixed so parts cannot run together)"""
+    digest = hashlib.sha256(data)
+    for part in parts:
+        encoded = str(part).encode('utf-8')
+        digest.update(len(encoded).to_bytes(8, 'big'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two tiers: an in-memory LRU of `memory_items` results, backed by one JSON
+    file per key under `disk_path`, capped at `disk_max_bytes` (oldest files
+    are evicted first). disk_path=None keeps the cache memory-only.
+
+    Counters: memory/disk hits, misses, and bytes_saved (input bytes that did
+    not have to be sent to the model again).
+    """
+
+    def __init__(self, memory_items=256, disk_path=None, disk_max_bytes=50 * 1024 * 1024):
+        self.memory_items = memory_items
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = OrderedDict()  # key -> file size, oldest first
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+            self._scan_disk()
+
+    def _file(self, key):
+        return os.path.join(self.disk_path, f'{key}.json')
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_path):
+            if name.endswith('.json'):
+                st = os.stat(os.path.join(self.disk_path, name))
+                entries.append((st.st_mtime, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+
+    def get(self, key, input_bytes=0):
+        """Cached value or None; input_bytes is credited to bytes_saved on a hit"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.bytes_saved += input_bytes
+                return self._memory[key]
+            on_disk = key in self._disk
+        value = self._read(key) if on_disk else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self.bytes_saved += input_bytes
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, value)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.disk_path:
+            self._write(key, value)
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _read(self, key):
+        try:
+            with open(self._file(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self._disk.pop(key, None)
+            return None
+
+    def _write(self, key, value):
+        fd, temp_path = tempfile.mkstemp(prefix='.cache-', suffix='.tmp', dir=self.disk_path)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(value, f)
+            size = os.path.getsize(temp_path)
+            os.replace(temp_path, self._file(key))
+        except (OSError, TypeError, ValueError):  # Disk full, or a value JSON cannot hold
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return  # A failed disk write only costs a future miss
+        with self._lock:
+            self._disk.pop(key, None)
+            self._disk[key] = size
+            self._evict_disk()
+
+    def _evict_disk(self):
+        total = sum(self._disk.values())
+        while total > self.disk_max_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            total -= size
+            try:
+                os.remove(self._file(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_items': len(self._memory),
+                'disk_items': len(self._disk),
+                'disk_bytes': sum(self._disk.values()),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved
+            }
+
+
+def from_config(settings):
+    """Cache configured by DOCUMENT_CACHE in config.py, or None when disabled"""
+    if not settings.get('enabled'):
+        return None
+    return ResultCache(settings['memory_items'], settings.get('disk_path'), settings['disk_max_bytes'])
@@ -0,0 +1,165 @@
+# Eva Run Store - checkpointed workflow runs, one append-only JSON-lines file per run
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from config import RUNS
+
+RUN_ID_RE = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{6}$')
+# Step statuses with a result a resumed run can reuse
+FINISHED = ('succeeded', 'completed', 'replayed', 'reused')
+
+def valid_run_id(run_id):
+    return bool(run_id) and RUN_ID_RE.match(run_id) is not None
+
+
+class RunStore:
+    """Every workflow run is recorded as it happens: a header line when it
+    starts, one line when each step starts and finishes (status, UFO2 output,
+    parsed observations), and a closing line. A checkpoint is one small append,
+    never a rewrite, so a crash loses at most the step in flight.
+
+    get() rebuilds a run from its file; list() answers from an in-memory index.
+    Runs beyond max_runs are deleted oldest first. A run that has no closing
+    line and is not active in this process is reported as "interrupted".
+    """
+
+    def __init__(self, path='runs', max_runs=200, max_output_bytes=65536):
+        self.path = path
+        self.max_runs = max_runs
+        self.max_output_bytes = max_output_bytes
+        self._lock = threading.Lock()
+        self._index = {}  # run_id -> summary, oldest first
+        self._active = set()
+        os.makedirs(path, exist_ok=True)
+        self._scan()
+
+    def _file(self, run_id):
+        return os.path.join(self.path, f'{run_id}.jsonl')
+
+    def _scan(self):
+        for name in sorted(os.listdir(self.path)):
+            run_id = name[:-len('.jsonl')]
+            if name.endswith('.jsonl') and valid_run_id(run_id):
+                run = self.get(run_id)
+                if run:
+                    self._index[run_id] = self._summary(run)
+
+    def _append(self, run_id, entry):
+        entry['at'] = time.time()
+        with open(self._file(run_id), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def start(self, project, commands, source=None, from_step=0):
+        """Open a run of `commands` (one per project step, None for empty steps).
+        source/from_step record a resume of an earlier run."""
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(3)}"
+        self._append(run_id, {'event': 'run', 'run_id': run_id, 'project': project, 'commands': commands,
+                              'source': source, 'from_step': from_step})
+        with self._lock:
+            self._active.add(run_id)
+            self._index[run_id] = {'run_id': run_id, 'project': project, 'status': 'running', 'steps': len(commands),
+                                   'failed_step': None, 'source': source, 'started_at': time.time()}
+            expired = list(self._index)[:-self.max_runs] if len(self._index) > self.max_runs else []
+            for old in expired:
+                if old not in self._active:
+                    del self._index[old]
+        for old in expired:
+            try:
+                os.remove(self._file(old))
+            except OSError:
+                pass
+        return run_id
+
+    # Steps are numbered from 1 in records, as in the SSE events; `index` arguments are 0-based
+
+    def step_started(self, run_id, index, command):
+        self._append(run_id, {'event': 'step_started', 'step': index + 1, 'command': command})
+
+    def step_finished(self, run_id, index, status, output='', observations='', ufo_status='', cost=None,
+                      duration_ms=None, source=None):
+        """status: succeeded, completed (ran, not evaluated), replayed (from an action trace),
+        failed, unavailable or reused"""
+        if len(output) > self.max_output_bytes:
+            output = '...' + output[-self.max_output_bytes:]  # The end of the output explains the outcome
+        self._append(run_id, {'event': 'step_finished', 'step': index + 1, 'status': status, 'output': output,
+                              'observations': observations, 'ufo_status': ufo_status, 'cost': cost,
+                              'duration_ms': duration_ms, 'source': source})
+        if status == 'failed':
+            with self._lock:
+                if run_id in self._index:
+                    self._index[run_id]['failed_step'] = index + 1
+
+    def finish(self, run_id, status):
+        """status: succeeded, failed, unavailable (UFO2 could not run some steps) or interrupted"""
+        self._append(run_id, {'event': 'run_finished', 'status': status})
+        with self._lock:
+            self._active.discard(run_id)
+            if run_id in self._index:
+                self._index[run_id]['status'] = status
+
+    def get(self, run_id):
+        """The run as a dict with one entry per step, or None"""
+        if not valid_run_id(run_id):
+            return None
+        try:
+            with open(self._file(run_id), 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return None
+        run = None
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn last line after a crash
+            event = entry.pop('event', None)
+            at = entry.pop('at', None)
+            if event == 'run':
+                commands = entry.pop('commands')
+                run = {**entry, 'status': 'running', 'started_at': at, 'finished_at': None,
+                       'steps': [{'step': i + 1, 'command': c, 'status': 'pending'} for i, c in enumerate(commands)]}
+            elif run is None or not 0 < entry.get('step', 1) <= len(run['steps']):
+                continue
+            elif event == 'step_started':
+                run['steps'][entry['step'] - 1].update(status='running', started_at=at)
+            elif event == 'step_finished':
+                run['steps'][entry['step'] - 1].update(entry, finished_at=at)
+            elif event == 'run_finished':
+                run['status'] = entry['status']
+                run['finished_at'] = at
+        if run and run['status'] == 'running':
+            with self._lock:
+                if run_id not in self._active:
+                    run['status'] = 'interrupted'
+        return run
+
+    @staticmethod
+    def _summary(run):
+        failed = [s['step'] for s in run['steps'] if s['status'] == 'failed']
+        return {'run_id': run['run_id'], 'project': run['project'], 'status': run['status'], 'steps': len(run['steps']),
+                'failed_step': failed[0] if failed else None, 'source': run.get('source'),
+                'started_at': run['started_at']}
+
+    def list(self, project=None, limit=50):
+        """Newest first"""
+        with self._lock:
+            runs = [dict(s) for s in reversed(self._index.values()) if project is None or s['project'] == project]
+        return runs[:limit]
+
+    @staticmethod
+    def resume_point(run):
+        """Number of the first step of `run` that did not finish successfully, or None"""
+        for step in run['steps']:
+            if step['command'] and step['status'] not in FINISHED:
+                return step['step']
+        return None
+
+
+def from_config():
+    """Run store configured by RUNS in config.py, or None when disabled"""
+    if not RUNS.get('enabled'):
+        return None
+    return RunStore(RUNS['path'], RUNS['max_runs'], RUNS['max_output_bytes'])
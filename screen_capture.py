@@ -0,0 +1,161 @@
+# Eva Screen Capture - in-memory screenshot frames with lazy, off-thread encoding
+import io
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+# Pillow is imported where used, so importing this module (and main) stays cheap
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def encoder_pool(workers=2):
+    """Shared thread pool for frame encoding (Pillow releases the GIL while encoding)"""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            _encoder = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='eva-encode')
+        return _encoder
+
+
+class Frame:
+    """One captured screen, kept as a PIL image until someone asks for bytes.
+
+    encode() results are cached per (format, quality, max_edge), and
+    encode_async() starts that work on the encoder pool so it overlaps with
+    whatever the caller does next.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, image, format='JPEG', quality=80, max_edge=1568, pool=None):
+        self.image = image
+        self.id = next(self._ids)
+        self.captured_at = time.time()
+        self.format = format
+        self.quality = quality
+        self.max_edge = max_edge
+        self._pool = pool
+        self.change = None  # screen_diff.ScreenChange vs the previous frame, when computed
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return self.image.size
+
+    def _key(self, format, quality, max_edge):
+        return ((format or self.format).upper(), quality or self.quality, max_edge or self.max_edge)
+
+    def encode_async(self, format=None, quality=None, max_edge=None):
+        """Future for the encoded bytes"""
+        key = self._key(format, quality, max_edge)
+        with self._lock:
+            future = self._encoded.get(key)
+            if future is None:
+                future = (self._pool or encoder_pool()).submit(self._encode, *key)
+                self._encoded[key] = future
+        return future
+
+    def encode(self, format=None, quality=None, max_edge=None):
+        return self.encode_async(format, quality, max_edge).result()
+
+    def mime_type(self, format=None):
+        return MIME_TYPES.get((format or self.format).upper(), 'application/octet-stream')
+
+    def _encode(self, format, quality, max_edge):
+        from PIL import Image
+        image = self.image
+        if max_edge and max(image.size) > max_edge:
+            scale = max_edge / max(image.size)
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))), Image.LANCZOS)
+        if format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        options = {} if format == 'PNG' else {'quality': quality}
+        image.save(buffer, format=format, **options)
+        return buffer.getvalue()
+
+
+class ScreenshotRing:
+    """The last `capacity` frames, newest last"""
+
+    def __init__(self, capacity=2):
+        self._frames = deque(maxlen=capacity)
+
+    def add(self, frame):
+        self._frames.append(frame)
+
+    def latest(self):
+        return self._frames[-1] if self._frames else None
+
+    def drop_oldest(self):
+        """Forget all but the most recent frame"""
+        while len(self._frames) > 1:
+            self._frames.popleft()
+
+    def clear(self):
+        self._frames.clear()
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __iter__(self):
+        return iter(list(self._frames))
+
+
+class PyAutoGUICapture:
+    """Real desktop capture (Windows / X display)"""
+
+    def grab(self):
+        import pyautogui  # Imported on first capture: it needs a display just to import
+        return pyautogui.screenshot()
+
+
+class FakeCapture:
+    """Headless capture. Cycles through the images in `source` (a directory or
+    file) if given, otherwise returns a plain frame of `size`."""
+
+    def __init__(self, size=(1920, 1080), source=None):
+        self.size = tuple(size)
+        self.paths = []
+        if source and os.path.isdir(source):
+            self.paths = sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp', '.bmp'))
+            )
+        elif source:
+            self.paths = [source]
+        self._next = itertools.cycle(self.paths) if self.paths else None
+
+    def grab(self):
+        from PIL import Image
+        if self._next:
+            with Image.open(next(self._next)) as image:
+                return image.convert('RGB')
+        return Image.new('RGB', self.size, (32, 32, 32))
+
+
+def headless():
+    """True when there is no screen to capture: EVA_HEADLESS=1, or Linux/BSD without a display"""
+    if os.environ.get('EVA_HEADLESS', '').lower() in ('1', 'true', 'yes'):
+        return True
+    if os.name == 'nt' or sys.platform == 'darwin':
+        return False
+    return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def capture_from_config(settings):
+    """Capture backend named by SCREENSHOT['backend'] in config.py; "auto"
+    falls back to the fake backend when running headless"""
+    backend = settings.get('backend', 'auto')
+    if backend == 'auto':
+        backend = 'fake' if headless() else 'pyautogui'
+    if backend == 'fake':
+        return FakeCapture(settings.get('fake_size', (1920, 1080)), settings.get('fake_source'))
+    return PyAutoGUICapture()
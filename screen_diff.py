@@ -0,0 +1,135 @@
+# Eva Screen Diff - perceptual hash and tile-level change detection between frames
+# numpy and Pillow load on the first frame compared, not at import time
+
+def dhash(image, hash_size=8):
+    """64-bit difference hash: compares neighbouring pixels of a (hash_size+1) x hash_size thumbnail"""
+    import numpy as np
+    from PIL import Image
+    small = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.BOX), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class ScreenChange:
+    """How a frame differs from the one before it"""
+
+    def __init__(self, hash, distance, dirty_tiles, dirty_boxes, first=False, snapshot=None):
+        self.hash = hash
+        self.distance = distance  # dHash hamming distance to the previous frame
+        self.dirty_tiles = dirty_tiles  # [(row, col), ...]
+        self.dirty_boxes = dirty_boxes  # [(left, top, right, bottom), ...] in frame pixels
+        self.first = first
+        self.snapshot = snapshot  # (hash, thumbnail, frame size) of this frame, for compare()
+
+    @property
+    def unchanged(self):
+        return not self.first and not self.dirty_tiles
+
+    def to_dict(self):
+        return {
+            'hash': f'{self.hash:016x}',
+            'distance': self.distance,
+            'unchanged': self.unchanged,
+            'dirty_boxes': self.dirty_boxes
+        }
+
+
+class ScreenChangeDetector:
+    """Compares each frame with the previous one (or, via compare(), with any earlier frame).
+
+    The dHash catches layout-level changes cheaply; the tile diff runs on a
+    small grayscale copy split into a rows x cols grid and flags tiles whose
+    mean absolute difference exceeds tile_threshold (0-255 scale), which also
+    catches small edits a 64-bit hash can miss. A frame is unchanged when no
+    tile is dirty.
+    """
+
+    def __init__(self, grid=(8, 8), tile_threshold=2.0, thumb_width=384):
+        self.rows, self.cols = grid
+        self.tile_threshold = tile_threshold
+        self.thumb_width = thumb_width
+        self._previous = None  # (hash, thumbnail, frame size)
+
+    def _thumbnail(self, image):
+        import numpy as np
+        from PIL import Image
+        width = min(self.thumb_width, image.width)
+        height = max(self.rows, round(image.height * width / image.width))
+        width = max(self.cols, width)
+        return np.asarray(image.convert('L').resize((width, height), Image.BOX), dtype=np.int16)
+
+    def snapshot(self, image):
+        """(hash, thumbnail, frame size): everything compare() needs from a frame"""
+        return dhash(image), self._thumbnail(image), image.size
+
+    def observe(self, image):
+        current = self.snapshot(image)
+        previous, self._previous = self._previous, current
+        return self.compare(previous, current)
+
+    def compare(self, reference, current):
+        """ScreenChange of the `current` snapshot against `reference` (any
+        earlier snapshot, not only the previous frame); first if there is none"""
+        import numpy as np
+        frame_hash, thumb, size = current
+        if reference is None or reference[1].shape != thumb.shape or reference[2] != size:
+            return ScreenChange(frame_hash, None, [], [], first=True, snapshot=current)
+
+        # Mean absolute difference per tile; np.add.reduceat sums each grid band in one pass
+        diff = np.abs(thumb - reference[1])
+        row_edges = np.linspace(0, thumb.shape[0], self.rows + 1).astype(int)
+        col_edges = np.linspace(0, thumb.shape[1], self.cols + 1).astype(int)
+        sums = np.add.reduceat(np.add.reduceat(diff, row_edges[:-1], axis=0), col_edges[:-1], axis=1)
+        areas = np.outer(np.diff(row_edges), np.diff(col_edges))
+        dirty = np.argwhere(sums / areas > self.tile_threshold)
+
+        scale_x = size[0] / thumb.shape[1]
+        scale_y = size[1] / thumb.shape[0]
+        tiles, boxes = [], []
+        for row, col in dirty.tolist():
+            tiles.append((row, col))
+            boxes.append((int(col_edges[col] * scale_x), int(row_edges[row] * scale_y),
+                          int(round(col_edges[col + 1] * scale_x)), int(round(row_edges[row + 1] * scale_y))))
+        return ScreenChange(frame_hash, hamming(frame_hash, reference[0]), tiles, boxes, snapshot=current)
+
+    def reset(self):
+        self._previous = None
+
+
+class AnalysisReuse:
+    """Remembers the last screen analysis until the screen changes, so an
+    unchanged screen is not sent to the vision model again.
+
+    Frames are compared with the frame that was analyzed, not with the one
+    captured just before, so a screen that drifts a little per frame still
+    invalidates the result once the drift adds up.
+    """
+
+    def __init__(self, detector):
+        self.detector = detector
+        self.result = None
+        self.basis = None  # Snapshot of the analyzed frame
+        self.hits = 0
+        self.misses = 0
+
+    def analyze(self, frame, analyze):
+        """analyze(frame) runs only if the screen changed since the last analysis;
+        frame.change.dirty_boxes holds the regions that changed since the previous capture"""
+        if self.result is not None and self.detector.compare(self.basis, frame.change.snapshot).unchanged:
+            self.hits += 1
+            return self.result
+        self.misses += 1
+        self.result = analyze(frame)
+        self.basis = frame.change.snapshot
+        return self.result
+
+    def reset(self):
+        self.result = None
+        self.basis = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': round(self.hits / total, 3) if total else 0.0}
@@ -0,0 +1,113 @@
+# Eva Session Pool - one ChatEngine (screenshots, logs, messenger) per client session
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_SESSION = 'default'
+SESSION_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+def valid_session_id(session_id):
+    """None (the default session) or a short id that is safe to use in file names"""
+    return session_id is None or bool(SESSION_ID_RE.match(session_id))
+
+class SessionLimitError(Exception):
+    """Every session slot is busy running a workflow"""
+
+
+class Session:
+    def __init__(self, session_id, engine, prompt_log):
+        self.session_id = session_id
+        self.engine = engine
+        self.prompt_log = prompt_log
+        self.active = 0
+        self.last_used = time.monotonic()
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class SessionPool:
+    """Creates sessions on first use and evicts them when idle.
+
+    `factory(session_id)` builds a Session. At most max_sessions live at once:
+    when full, the least recently used idle session is evicted, and if every
+    session is mid-workflow SessionLimitError is raised. The default session is
+    never evicted, so clients that send no session id keep the old behaviour.
+    """
+
+    def __init__(self, factory, max_sessions=16, idle_timeout=1800):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+
+    def get(self, session_id=None, create=True, hold=False):
+        """The session for session_id (created if `create`), or None. With hold=True
+        it is marked busy under the same lock that found it, so it cannot be
+        evicted before the caller uses it; the caller must release() it."""
+        session_id = session_id or DEFAULT_SESSION
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(session_id)
+            if session is None and create:
+                if len(self._sessions) >= self.max_sessions and not self._evict_lru():
+                    raise SessionLimitError(f'All {self.max_sessions} sessions are busy')
+                session = self.factory(session_id)
+                self._sessions[session_id] = session
+                self.created += 1
+            if session and hold:
+                session.active += 1
+        if session:
+            session.touch()
+        return session
+
+    def release(self, session):
+        """Undo one get(hold=True) or use()"""
+        with self._lock:
+            session.active -= 1
+        session.touch()
+
+    @contextmanager
+    def use(self, session):
+        """Mark a session busy (not evictable) for the duration of a workflow"""
+        with self._lock:
+            session.active += 1
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def _evictable(self, session):
+        return session.active == 0 and session.session_id != DEFAULT_SESSION
+
+    def _evict(self, session):
+        del self._sessions[session.session_id]
+        self.evicted += 1
+        session.engine.close()
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        for session in list(self._sessions.values()):
+            if self._evictable(session) and session.last_used < cutoff:
+                self._evict(session)
+
+    def _evict_lru(self):
+        candidates = [s for s in self._sessions.values() if self._evictable(s)]
+        if not candidates:
+            return False
+        self._evict(min(candidates, key=lambda s: s.last_used))
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'live': len(self._sessions),
+                'active': sum(1 for s in self._sessions.values() if s.active),
+                'max_sessions': self.max_sessions,
+                'created': self.created,
+                'evicted': self.evicted
+            }
@@ -0,0 +1,57 @@
+# Eva Stream Writer - coalesces UFO2 output into fewer, larger SSE frames
+import time
+
+class CoalescingWriter:
+    """Buffers output lines and releases them as one frame per time window or byte budget.
+
+    The full step output is kept as a list of parts and joined once, so a chatty
+    UFO2 run costs O(total bytes) instead of the O(n^2) of repeated `+=`.
+    """
+
+    def __init__(self, flush_interval=0.05, flush_bytes=8192, clock=time.monotonic):
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.clock = clock
+        self._pending = []
+        self._pending_bytes = 0
+        self._opened_at = None
+        self._output = []
+        self.frames = 0
+        self.lines = 0
+        self.bytes = 0
+
+    def write(self, text):
+        """Add text (may be '' as an idle tick). Returns a frame when one is due, else None."""
+        if text:
+            if not self._pending:
+                self._opened_at = self.clock()
+            self._pending.append(text)
+            self._pending_bytes += len(text)
+            self._output.append(text)
+            self.lines += 1
+        if not self._pending:
+            return None
+        if self._pending_bytes >= self.flush_bytes or self.clock() - self._opened_at >= self.flush_interval:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Release whatever is buffered as one frame (None if nothing is)"""
+        if not self._pending:
+            return None
+        frame = ''.join(self._pending)
+        self._pending = []
+        self._pending_bytes = 0
+        self._opened_at = None
+        self.frames += 1
+        self.bytes += len(frame)
+        return frame
+
+    def getvalue(self):
+        """Everything written so far, flushed or not"""
+        if len(self._output) > 1:
+            self._output = [''.join(self._output)]
+        return self._output[0] if self._output else ''
+
+    def stats(self):
+        return {'lines': self.lines, 'frames': self.frames, 'bytes': self.bytes}
@@ -1,70 +1,336 @@
 # Eva Eva2 Messenger - Lean Windows Implementation
+import asyncio
 import subprocess
 import os
+import queue
 import time
 import threading
-from config import PATHS
+from config import PATHS, PIPELINE, UFO_WORKERS
+from ufo_pool import UFOWorker, worker_env
+from metrics import UFO_COMMAND, UFO_FIRST_OUTPUT, UFO_SPAWN, Span
 
 class UFOMessenger:
-    def __init__(self):
+    def __init__(self, pool=None):
+        self.pool = pool  # Optional ufo_pool.UFOWorkerPool of warm UFO2 workers
         self.ufo_path = PATHS.get('ufo2')
+        self.python = PATHS.get('ufo2_python', 'python')
         self.available = self.ufo_path and os.path.exists(self.ufo_path)
+        self.timeout = 300  # 5 minutes without output
+        self.exit_grace = 10  # Seconds UFO2 may keep running (writing logs) after we stop reading
+        self._reapers = set()
+        self._standby = set()  # Workers started by prepare() outside the pool, one step each
 
-    def send_command(self, command):
+    def _build_command(self, command):
+        sanitized_command = command.replace('\n', ' ').replace('\r', ' ')
+        return [
+            self.python, "-m", "ufo",
+            "--task", "eva_task",
+            "-r", sanitized_command
+        ]
+
+    def _build_env(self):
+        env = os.environ.copy()
+        env['PYTHONUTF8'] = '1'
+        env['PYTHONIOENCODING'] = 'utf-8'
+        return env
+
+    def _pump(self, stream, lines):
+        """Reader thread: move subprocess output lines onto a queue, None marks EOF"""
+        try:
+            for line in iter(stream.readline, ''):
+                lines.put(line)
+        finally:
+            lines.put(None)
+
+    def _reap(self, process):
+        """Let an abandoned UFO2 process finish on its own, killing it after exit_grace"""
+        def wait():
+            try:
+                process.wait(timeout=self.exit_grace)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        threading.Thread(target=wait, daemon=True).start()
+
+    def _reap_async(self, process):
+        async def wait():
+            try:
+                await asyncio.wait_for(process.wait(), timeout=self.exit_grace)
+            except asyncio.TimeoutError:
+                process.kill()
+        task = asyncio.get_running_loop().create_task(wait())
+        self._reapers.add(task)
+        task.add_done_callback(self._reapers.discard)
+
+    def _worker_line(self, line):
+        """Map one worker output line to (text to yield, exit code or None)"""
+        code = UFOWorker.done_code(line)
+        if code is not None:
+            return (f"\n\nUFO2 Error (Code {code})\n" if code != 0 else None), code
+        if "snapshot capture failed" in line.lower():
+            return None, None
+        return line, None
+
+    def acquire(self):
+        """An idle warm pool worker, or None"""
+        return self.pool.acquire() if self.pool else None
+
+    def can_prepare(self):
+        """Whether prepare() can ever return an interpreter: it needs a warm pool or
+        PIPELINE["standby_worker"]; otherwise every step spawns its own process"""
+        return self.available and (self.pool is not None or bool(PIPELINE.get('standby_worker')))
+
+    def prepare(self):
+        """Get a UFO2 interpreter ready for a later command (blocks; call it in the
+        background). Returns an idle pool worker if there is one, otherwise, with
+        PIPELINE["standby_worker"], a fresh interpreter that has finished
+        starting up and will run exactly one step. None if neither is possible.
+        Pass the result to send_command(worker=...) or give it back with discard()."""
         if not self.available:
-            yield "UFO2 not available"
+            return None
+        worker = self.acquire()
+        if worker or not PIPELINE.get('standby_worker'):
+            return worker
+        spawn = Span(UFO_SPAWN, mode='standby')
+        try:
+            worker = UFOWorker(self.python, self.ufo_path, worker_env())
+        except OSError:
+            return None
+        if not worker.wait_for('READY', UFO_WORKERS['ready_timeout']):
+            worker.stop()
+            return None
+        spawn.end()
+        self._standby.add(worker)
+        return worker
+
+    def discard(self, worker):
+        """Give back a prepared worker that will not be used"""
+        if worker is None:
+            return
+        if worker in self._standby:
+            self._standby.discard(worker)
+            threading.Thread(target=worker.stop, daemon=True).start()
+        else:
+            self.pool.release(worker, clean=True)
+
+    def _release(self, worker, clean):
+        """After a step: pool workers go back to the pool, standby workers are stopped"""
+        if worker not in self._standby:
+            self.pool.release(worker, clean=clean)
             return
+        self._standby.discard(worker)
 
+        def retire():
+            if not clean:
+                # Like a spawned `python -m ufo`, UFO2 may finish writing its logs
+                worker.wait_for('DONE', self.exit_grace)
+            worker.stop()
+        threading.Thread(target=retire, daemon=True).start()
+
+    def _send_to_worker(self, worker, command, tick, actions=None):
+        """send_command over a warm worker's pipe instead of a fresh interpreter"""
+        done = False
+        mode = 'worker' if actions is None else 'replay'
+        command_span, first_output = Span(UFO_COMMAND, mode=mode), Span(UFO_FIRST_OUTPUT, mode=mode)
+        try:
+            if actions is None:
+                worker.submit(command)
+            else:
+                worker.submit_replay(actions)
+            last_output = time.monotonic()
+            while True:
+                try:
+                    line = worker.lines.get(timeout=tick or self.timeout)
+                except queue.Empty:
+                    if time.monotonic() - last_output > self.timeout:
+                        yield "\n\nUFO2 command timed out after 5 minutes.\n"
+                        break
+                    yield ''
+                    continue
+                if line is None:
+                    yield "\n\nUFO2 Error (worker exited)\n"
+                    break
+                last_output = time.monotonic()
+                text, code = self._worker_line(line)
+                if text:
+                    first_output.end()
+                    yield text
+                if code is not None:
+                    done = True
+                    break
+        except Exception as e:
+            yield f"\n\nAn unexpected error occurred: {e}\n"
+        finally:
+            command_span.end()
+            self._release(worker, clean=done)
+
+    async def _send_to_worker_async(self, worker, command, tick, actions=None):
+        done = False
+        mode = 'worker' if actions is None else 'replay'
+        command_span, first_output = Span(UFO_COMMAND, mode=mode), Span(UFO_FIRST_OUTPUT, mode=mode)
         try:
-            sanitized_command = command.replace('\n', ' ').replace('\r', ' ')
-            env = os.environ.copy()
-            env['PYTHONUTF8'] = '1'
-            env['PYTHONIOENCODING'] = 'utf-8'
+            if actions is None:
+                worker.submit(command)
+            else:
+                worker.submit_replay(actions)
+            last_output = time.monotonic()
+            while True:
+                try:
+                    # Pools are small, so parking one thread per busy worker is cheap
+                    line = await asyncio.to_thread(worker.lines.get, True, tick or self.timeout)
+                except queue.Empty:
+                    if time.monotonic() - last_output > self.timeout:
+                        yield "\n\nUFO2 command timed out after 5 minutes.\n"
+                        break
+                    yield ''
+                    continue
+                if line is None:
+                    yield "\n\nUFO2 Error (worker exited)\n"
+                    break
+                last_output = time.monotonic()
+                text, code = self._worker_line(line)
+                if text:
+                    first_output.end()
+                    yield text
+                if code is not None:
+                    done = True
+                    break
+        except Exception as e:
+            yield f"\n\nAn unexpected error occurred: {e}\n"
+        finally:
+            command_span.end()
+            self._release(worker, clean=done)
+
+    def replay(self, actions, worker, tick=None):
+        """Run actions recorded by action_trace on `worker` (from prepare()),
+        with no planning. Streams output like send_command."""
+        yield from self._send_to_worker(worker, None, tick, actions)
+
+    async def replay_async(self, actions, worker, tick=None):
+        async for line in self._send_to_worker_async(worker, None, tick, actions):
+            yield line
+
+    def send_command(self, command, tick=None, worker=None):
+        """Stream UFO2 output lines. With `tick` set, '' is yielded every `tick`
+        seconds of silence so callers can flush buffered output. `worker` is an
+        interpreter from prepare() to run the command on."""
+        if not self.available:
+            yield "UFO2 not available"
+            return
 
-            cmd_list = [
-                "python", "-m", "ufo",
-                "--task", "eva_task",
-                "-r", sanitized_command
-            ]
+        worker = worker or self.acquire()
+        if worker:
+            yield from self._send_to_worker(worker, command, tick)
+            return
 
+        process = None
+        command_span, first_output = Span(UFO_COMMAND, mode='process'), Span(UFO_FIRST_OUTPUT, mode='process')
+        spawn = Span(UFO_SPAWN, mode='process')
+        try:
             process = subprocess.Popen(
-                cmd_list,
+                self._build_command(command),
                 cwd=self.ufo_path,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
                 text=True,
                 encoding='utf-8',
                 errors='replace',
-                env=env,
+                env=self._build_env(),
                 bufsize=0  # Unbuffered for real-time output
             )
+            spawn.end()
+
+            lines = queue.Queue()
+            threading.Thread(target=self._pump, args=(process.stdout, lines), daemon=True).start()
 
-            # Set up timeout monitoring
-            timeout = 300  # 5 minutes timeout
-            start_time = time.time()
+            # Timeout is measured from the last line of output
+            last_output = time.monotonic()
 
             # Read output line by line for real-time streaming
-            for line in iter(process.stdout.readline, ''):
-                # Check for timeout
-                if time.time() - start_time > timeout:
-                    process.terminate()
-                    yield "\n\nUFO2 command timed out after 5 minutes.\n"
+            while True:
+                try:
+                    line = lines.get(timeout=tick or self.timeout)
+                except queue.Empty:
+                    if time.monotonic() - last_output > self.timeout:
+                        process.terminate()
+                        yield "\n\nUFO2 command timed out after 5 minutes.\n"
+                        break
+                    yield ''
+                    continue
+                if line is None:
+                    break
+
+                if "snapshot capture failed" not in line.lower():
+                    first_output.end()
+                    yield line
+                last_output = time.monotonic()
+
+            return_code = process.wait()
+
+            if return_code != 0:
+                yield f"\n\nUFO2 Error (Code {return_code})\n"
+
+        except Exception as e:
+            yield f"\n\nAn unexpected error occurred: {e}\n"
+        finally:
+            command_span.end()
+            # Step finished early or the client went away: don't leave UFO2 running
+            if process is not None and process.poll() is None:
+                self._reap(process)
+
+    async def send_command_async(self, command, tick=None, worker=None):
+        """Same stream as send_command, but read on the event loop instead of a thread"""
+        if not self.available:
+            yield "UFO2 not available"
+            return
+
+        worker = worker or self.acquire()
+        if worker:
+            async for line in self._send_to_worker_async(worker, command, tick):
+                yield line
+            return
+
+        process = None
+        command_span, first_output = Span(UFO_COMMAND, mode='process'), Span(UFO_FIRST_OUTPUT, mode='process')
+        spawn = Span(UFO_SPAWN, mode='process')
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self._build_command(command),
+                cwd=self.ufo_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                env=self._build_env(),
+                limit=1024 * 1024  # UFO2 can print very long JSON lines
+            )
+            spawn.end()
+
+            last_output = time.monotonic()
+            while True:
+                try:
+                    raw = await asyncio.wait_for(process.stdout.readline(), timeout=tick or self.timeout)
+                except asyncio.TimeoutError:
+                    if time.monotonic() - last_output > self.timeout:
+                        process.terminate()
+                        yield "\n\nUFO2 command timed out after 5 minutes.\n"
+                        break
+                    yield ''
+                    continue
+                if not raw:
                     break
+                last_output = time.monotonic()
 
+                line = raw.decode('utf-8', errors='replace').replace('\r\n', '\n')
                 if "snapshot capture failed" not in line.lower():
+                    first_output.end()
                     yield line
-                
-                # Reset timeout on new output
-                start_time = time.time()
-            
-            process.stdout.close()
-            return_code = process.wait() if process.poll() is None else process.returncode
 
+            return_code = await process.wait()
             if return_code != 0:
                 yield f"\n\nUFO2 Error (Code {return_code})\n"
 
-        except subprocess.TimeoutExpired:
-            process.kill()
-            yield "\n\nUFO2 command timed out and was terminated.\n"
         except Exception as e:
             yield f"\n\nAn unexpected error occurred: {e}\n"
+        finally:
+            command_span.end()
+            # Step finished early or the client went away: don't leave UFO2 running
+            if process is not None and process.returncode is None:
+                self._reap_async(process)
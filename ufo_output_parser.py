@@ -0,0 +1,95 @@
+# Eva UFO2 Output Parser - incremental, line-driven step evaluation
+import re
+
+COST_RE = re.compile(r'\$?\s*([0-9]+(?:\.[0-9]+)?)')
+
+class UFOOutputParser:
+    """Parses one step's UFO2 output as it arrives.
+
+    Feed raw chunks with feed(); each complete line is inspected once, so the
+    cost is O(new bytes) no matter how long the step runs. The conclusion event
+    is returned as soon as its line is seen, and `completed` flips to True on the
+    session cost line UFO2 prints when it is done, so callers can stop reading
+    without waiting for the process to exit. As before, the context event (the
+    last observations and status) is sent once, by finish(), and only for a step
+    that was neither evaluated nor errored.
+    """
+
+    COMPLETION_MARKER = "Total request cost of the session"
+
+    def __init__(self, step_index):
+        self.step_index = step_index
+        self.evaluated = False
+        self.succeeded = False
+        self.errored = False
+        self.completed = False
+        self.observations = ""
+        self.status = ""
+        self.cost = None
+        self._partial = ""
+        self._conclusion_sent = False
+
+    def feed(self, text):
+        """Consume a chunk of output, returning any events it completes"""
+        if not text:
+            return []
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        events = []
+        for line in lines:
+            events.extend(self._parse_line(line))
+        return events
+
+    def _parse_line(self, line):
+        events = []
+        if "EVALUATION_AGENT" in line:
+            self.evaluated = True
+        if "succeeded" in line.lower():
+            self.succeeded = True
+        if "UFO2 Error" in line:
+            self.errored = True
+        if "Observations👀:" in line:
+            self.observations = line.split("Observations👀:")[-1].strip()
+        if "Status📊:" in line:
+            self.status = line.split("Status📊:")[-1].strip()
+        if self.COMPLETION_MARKER in line:
+            match = COST_RE.search(line.split(self.COMPLETION_MARKER)[-1])
+            self.cost = float(match.group(1)) if match else None
+            self.completed = True
+
+        if self.evaluated and self.succeeded and not self._conclusion_sent:
+            self._conclusion_sent = True
+            events.append(self._conclusion_event())
+        return events
+
+    def _context_event(self):
+        return {
+            'type': 'eva2_context',
+            'content': f"EVA2 Observation: {self.observations}\nEVA2 Status: {self.status}",
+            'step': self.step_index + 1,
+            'observations': self.observations,
+            'status': self.status
+        }
+
+    def _conclusion_event(self):
+        return {
+            'type': 'eva2_conclusion',
+            'content': f"Step {self.step_index+1} evaluated as successful.",
+            'step': self.step_index + 1
+        }
+
+    def finish(self):
+        """Flush the last partial line and decide the step. Returns (events, failed)"""
+        events = []
+        if self._partial:
+            events.extend(self._parse_line(self._partial))
+            self._partial = ""
+
+        if self.evaluated:
+            if self.succeeded:
+                return events, False
+            events.append({'type': 'error', 'content': f"Step {self.step_index+1} evaluated as failed.", 'step': self.step_index + 1})
+            return events, True
+        if not self.errored:
+            events.append(self._context_event())
+        return events, False
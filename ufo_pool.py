@@ -0,0 +1,265 @@
+# Eva UFO2 Worker Pool - resident, pre-warmed UFO2 interpreters
+import json
+import os
+import queue
+import subprocess
+import threading
+import time
+from config import PATHS, UFO_WORKERS
+from metrics import UFO_SPAWN, Span
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ufo_worker.py')
+MARKER = '\x1eEVA_WORKER '
+
+class UFOWorker:
+    """One resident UFO2 interpreter running ufo_worker.py"""
+
+    def __init__(self, python, ufo_path, env):
+        self.process = subprocess.Popen(
+            [python, WORKER_SCRIPT],
+            cwd=ufo_path,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding='utf-8',
+            errors='replace',
+            env=env,
+            bufsize=1
+        )
+        self.lines = queue.Queue()
+        self.started_at = time.monotonic()
+        self.tasks = 0
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        try:
+            for line in iter(self.process.stdout.readline, ''):
+                self.lines.put(line)
+        finally:
+            self.lines.put(None)
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def age(self):
+        return time.monotonic() - self.started_at
+
+    def _send(self, message):
+        self.process.stdin.write(json.dumps(message) + '\n')
+        self.process.stdin.flush()
+
+    def submit(self, command):
+        self.tasks += 1
+        self._send({'op': 'run', 'request': command.replace('\n', ' ').replace('\r', ' ')})
+
+    def submit_replay(self, actions):
+        self.tasks += 1
+        self._send({'op': 'replay', 'actions': actions})
+
+    def wait_for(self, event, timeout):
+        """Discard output until the `event` marker arrives. False on timeout or exit."""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                line = self.lines.get(timeout=remaining)
+            except queue.Empty:
+                return False
+            if line is None:
+                return False
+            if line.startswith(MARKER + event):
+                return True
+
+    def ping(self, timeout):
+        try:
+            self._send({'op': 'ping'})
+        except (OSError, ValueError):
+            return False
+        return self.wait_for('PONG', timeout)
+
+    @staticmethod
+    def done_code(line):
+        """Exit code if `line` is the end-of-request marker, else None"""
+        if line.startswith(MARKER + 'DONE'):
+            try:
+                return int(line.split()[-1])
+            except ValueError:
+                return 1
+        return None
+
+    def stop(self):
+        try:
+            self._send({'op': 'exit'})
+            self.process.wait(timeout=2)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class UFOWorkerPool:
+    """Keeps `size` warm UFO2 workers ready.
+
+    acquire() never blocks: it returns None when no warm worker is idle and the
+    caller falls back to spawning `python -m ufo`. Workers are recycled after
+    max_tasks requests or max_age seconds, and idle ones are pinged every
+    health_interval seconds.
+    """
+
+    def __init__(self, python, ufo_path, env, size=1, max_tasks=20, max_age=3600,
+                 health_interval=30, ready_timeout=120, drain_timeout=10, logger=None):
+        self.python = python
+        self.ufo_path = ufo_path
+        self.env = env
+        self.size = size
+        self.max_tasks = max_tasks
+        self.max_age = max_age
+        self.health_interval = health_interval
+        self.ready_timeout = ready_timeout
+        self.drain_timeout = drain_timeout
+        self.logger = logger
+        self.idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._live = 0
+        self._closed = False
+        self.spawned = 0
+        self.recycled = 0
+        self.fallbacks = 0
+
+    def log(self, prompt_type, content):
+        if self.logger:
+            self.logger(prompt_type, content)
+
+    def start(self):
+        """Warm up workers in the background and start the health monitor"""
+        self._top_up()
+        threading.Thread(target=self._monitor, daemon=True).start()
+        return self
+
+    def _top_up(self):
+        with self._lock:
+            missing = 0 if self._closed else self.size - self._live
+            self._live += missing
+        for _ in range(missing):
+            threading.Thread(target=self._spawn, daemon=True).start()
+
+    def _spawn(self):
+        spawn = Span(UFO_SPAWN, mode='pool')
+        try:
+            worker = UFOWorker(self.python, self.ufo_path, self.env)
+        except OSError as e:
+            self.log('UFO2_WORKER_ERROR', f'Failed to start worker: {e}')
+            with self._lock:
+                self._live -= 1
+            return
+        if worker.wait_for('READY', self.ready_timeout):
+            spawn.end()
+            self.spawned += 1
+            self.idle.put(worker)
+        else:
+            self.log('UFO2_WORKER_ERROR', 'Worker did not become ready; spawn mode stays in use')
+            self._retire(worker, replace=False)
+
+    def _retire(self, worker, replace=True):
+        worker.stop()
+        with self._lock:
+            self._live -= 1
+        self.recycled += 1
+        if replace:
+            self._top_up()
+
+    def _healthy(self, worker):
+        return worker.alive() and worker.tasks < self.max_tasks and worker.age() < self.max_age
+
+    def acquire(self):
+        """A warm worker, or None to use spawn mode"""
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                self.fallbacks += 1
+                return None
+            if worker.alive():
+                return worker
+            self._retire(worker)
+
+    def release(self, worker, clean):
+        """Return a worker after a request. `clean` is False if the caller stopped
+        reading before the DONE marker, in which case it is drained first."""
+        if not clean:
+            threading.Thread(target=self._drain, args=(worker,), daemon=True).start()
+            return
+        if self._healthy(worker) and not self._closed:
+            self.idle.put(worker)
+        else:
+            self._retire(worker)
+
+    def _drain(self, worker):
+        if worker.wait_for('DONE', self.drain_timeout):
+            self.release(worker, clean=True)
+        else:
+            self._retire(worker)
+
+    def _monitor(self):
+        while not self._closed:
+            time.sleep(self.health_interval)
+            checked = []
+            while True:
+                try:
+                    checked.append(self.idle.get_nowait())
+                except queue.Empty:
+                    break
+            for worker in checked:
+                if self._healthy(worker) and worker.ping(timeout=5):
+                    self.idle.put(worker)
+                else:
+                    self.log('UFO2_WORKER_RECYCLE', f'Recycling worker pid {worker.process.pid}')
+                    self._retire(worker)
+            self._top_up()
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': self.idle.qsize(),
+            'live': self._live,
+            'spawned': self.spawned,
+            'recycled': self.recycled,
+            'fallbacks': self.fallbacks
+        }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self.idle.get_nowait().stop()
+            except queue.Empty:
+                break
+
+
+def worker_env():
+    """Environment for ufo_worker.py interpreters (pool workers and standby workers)"""
+    env = os.environ.copy()
+    env['PYTHONUTF8'] = '1'
+    env['PYTHONIOENCODING'] = 'utf-8'
+    env['PYTHONUNBUFFERED'] = '1'
+    env['EVA_WORKER_PRELOAD'] = ','.join(UFO_WORKERS['preload'])
+    env['EVA_WORKER_FRESH'] = ','.join(UFO_WORKERS['fresh_modules'])
+    return env
+
+
+def from_config(logger=None):
+    """Start the pool described by UFO_WORKERS in config.py, or None if it is disabled"""
+    ufo_path = PATHS.get('ufo2')
+    if not UFO_WORKERS.get('enabled') or not ufo_path or not os.path.exists(ufo_path):
+        return None
+    return UFOWorkerPool(
+        PATHS.get('ufo2_python', 'python'), ufo_path, worker_env(),
+        size=UFO_WORKERS['size'],
+        max_tasks=UFO_WORKERS['max_tasks'],
+        max_age=UFO_WORKERS['max_age'],
+        health_interval=UFO_WORKERS['health_interval'],
+        ready_timeout=UFO_WORKERS['ready_timeout'],
+        drain_timeout=UFO_WORKERS['drain_timeout'],
+        logger=logger
+    ).start()
@@ -0,0 +1,138 @@
+# Eva UFO2 Worker - a resident UFO2 interpreter driven over stdin
+#
+# Started by ufo_pool.UFOWorkerPool with cwd set to the UFO2 install. It pays
+# for UFO2's import graph and config loading once, then runs one request per
+# JSON line read from stdin:
+#   {"op": "run", "request": "..."}   -> UFO2 output, then "\x1eEVA_WORKER DONE <code>"
+#   {"op": "replay", "actions": [...]} -> one line per action, then "\x1eEVA_WORKER DONE <code>"
+#   {"op": "ping"}                    -> "\x1eEVA_WORKER PONG"
+#   {"op": "exit"}
+# Each run re-executes only the entry modules listed in EVA_WORKER_FRESH (they
+# parse argv at import time); everything else stays warm.
+# A replay runs actions recorded by action_trace.py without any planning, each
+# through EVA_REPLAY_EXECUTOR ("module:function", default: pywinauto below).
+import importlib
+import io
+import json
+import os
+import runpy
+import sys
+import traceback
+
+MARKER = '\x1eEVA_WORKER'
+
+def emit(message):
+    sys.stdout.write(f"{MARKER} {message}\n")
+    sys.stdout.flush()
+
+def module_list(name, default):
+    return [m.strip() for m in os.environ.get(name, default).split(',') if m.strip()]
+
+def run(request, fresh_modules):
+    for name in fresh_modules:
+        sys.modules.pop(name, None)
+        # `from ufo import ufo` would otherwise find the stale package attribute
+        parent, _, child = name.rpartition('.')
+        if parent in sys.modules and hasattr(sys.modules[parent], child):
+            delattr(sys.modules[parent], child)
+    sys.argv = ['ufo', '--task', 'eva_task', '-r', request]
+    try:
+        runpy.run_module('ufo', run_name='__main__', alter_sys=True)
+        return 0
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        traceback.print_exc(file=sys.stdout)
+        return 1
+    finally:
+        sys.stdout.flush()
+
+def pywinauto_executor(action):
+    """Run one recorded UFO2 action on the foreground window"""
+    from pywinauto import Desktop, mouse
+
+    window = Desktop(backend='uia').window(active_only=True)
+    name, args, kwargs = action['action'], action.get('args', []), dict(action.get('kwargs', {}))
+    if name in ('click_on_coordinates', 'drag_on_coordinates'):
+        # UFO2 records these as fractions of the application window
+        rect = window.rectangle()
+        def point(x, y):
+            return (int(rect.left + float(x) * rect.width()), int(rect.top + float(y) * rect.height()))
+        button = kwargs.get('button', 'left')
+        if name == 'click_on_coordinates':
+            mouse.click(button=button, coords=point(kwargs['x'], kwargs['y']))
+            if kwargs.get('double'):
+                mouse.click(button=button, coords=point(kwargs['x'], kwargs['y']))
+        else:
+            start = point(kwargs['start_x'], kwargs['start_y'])
+            end = point(kwargs['end_x'], kwargs['end_y'])
+            mouse.press(button=button, coords=start)
+            mouse.move(coords=end)
+            mouse.release(button=button, coords=end)
+        return
+    target = window.child_window(title=action['control']) if action.get('control') else window
+    target = target.wrapper_object()
+    if name == 'keyboard_input':
+        if kwargs.pop('control_focus', True):
+            target.set_focus()
+        target.type_keys(kwargs.get('keys', args[0] if args else ''), with_spaces=True)
+    else:
+        getattr(target, name)(*args, **kwargs)
+
+def load_executor():
+    spec = os.environ.get('EVA_REPLAY_EXECUTOR')
+    if not spec:
+        return pywinauto_executor
+    module, _, function = spec.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+def replay(actions):
+    try:
+        execute = load_executor()
+        for i, action in enumerate(actions, 1):
+            print(f"Replaying⏩ {i}/{len(actions)}: {action.get('control') or 'window'} -> {action['action']}")
+            execute(action)
+        return 0
+    except BaseException:
+        traceback.print_exc(file=sys.stdout)
+        return 1
+    finally:
+        sys.stdout.flush()
+
+def main():
+    sys.path.insert(0, os.getcwd())
+    sys.stdout.reconfigure(line_buffering=True)
+    commands = sys.stdin
+    # UFO2 must never read our command pipe (e.g. a confirmation prompt)
+    sys.stdin = io.StringIO()
+
+    fresh_modules = module_list('EVA_WORKER_FRESH', 'ufo.ufo,ufo.__main__')
+    sys.argv = ['ufo']
+    for name in module_list('EVA_WORKER_PRELOAD', 'ufo.ufo'):
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"Eva worker: could not preload {name}: {e}")
+    emit('READY')
+
+    for raw in commands:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            continue
+        op = message.get('op')
+        if op == 'ping':
+            emit('PONG')
+        elif op == 'exit':
+            break
+        elif op == 'run':
+            code = run(message.get('request', ''), fresh_modules)
+            emit(f'DONE {code}')
+        elif op == 'replay':
+            code = replay(message.get('actions', []))
+            emit(f'DONE {code}')
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,30 @@
-import json
-import os
+from project_store import from_config as store_from_config
 
 class WorkflowManager:
-    def __init__(self, projects_file='projects.json'):
-        self.projects_file = projects_file
-        self.projects = self.load_projects()
+    def __init__(self, projects_file=None, store=None):
+        self.store = store or store_from_config(projects_file)
+        self.projects_file = self.store.path
 
-    def load_projects(self):
-        if os.path.exists(self.projects_file):
-            with open(self.projects_file, 'r') as f:
-                return json.load(f)
-        return []
+    @property
+    def projects(self):
+        return self.store.all()
 
-    def save_projects(self):
-        with open(self.projects_file, 'w') as f:
-            json.dump(self.projects, f, indent=4)
+    def load_projects(self):
+        return self.store.all()
 
     def get_projects(self):
-        return self.projects
+        return self.store.all()
+
+    def get_project(self, name):
+        return self.store.get(name)
 
     def save_project(self, project_data):
-        # Check if project exists
-        for i, p in enumerate(self.projects):
-            if p['name'] == project_data['name']:
-                self.projects[i] = project_data
-                self.save_projects()
-                return True
-        
-        # If not, add it
-        self.projects.append(project_data)
-        self.save_projects()
-        return True
+        # Insert or replace by name; written out by the store's next flush
+        return self.store.put(project_data)
+
+    def batch(self):
+        """Group several save_project calls into a single write"""
+        return self.store.batch()
+
+    def flush(self):
+        self.store.flush()